@@ -2,6 +2,24 @@ import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+TRUE_VALUES = {'true', 'yes', 'y', 't', '1'}
+FALSE_VALUES = {'false', 'no', 'n', 'f', '0'}
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    # parsed like the CLI's boolean flags, with an unset or empty variable taking the default
+    value = os.environ.get(name)
+    if not value:
+        return default
+
+    lower_value = value.lower()
+    if lower_value in TRUE_VALUES:
+        return True
+    elif lower_value in FALSE_VALUES:
+        return False
+    else:
+        raise ValueError(f'Environment variable {name}="{value}" does not represent a boolean value.')
+
 
 class Configuration:
     DEBUG = False
@@ -0,0 +1,67 @@
+from flask import request, jsonify
+from app.controller.signature_controller import map_signatures, parse_signature_parameters
+from app.service.job_service import JobService
+
+
+class JobController:
+    def __init__(self, job_service: JobService, max_wait: float = 30):
+        self.job_service = job_service
+        self.max_wait = max_wait
+
+    def create(self, request: request):
+        data = request.json
+
+        parameters = parse_signature_parameters(data)
+
+        priority = int(data.get('priority', 0))
+        if priority < -10:
+            priority = -10
+        elif priority > 10:
+            priority = 10
+
+        job = self.job_service.submit(parameters, priority)
+
+        return jsonify({
+            'jobId': job['id'],
+            'status': job['status'],
+            'priority': job['priority'],
+            'queueDepth': self.job_service.queue_depth()
+        }), 202, {'Location': f'/jobs/{job["id"]}'}
+
+    def get(self, request: request, job_id: str):
+        wait = float(request.args.get('wait', 0))
+        if wait < 0:
+            wait = 0
+        elif wait > self.max_wait:
+            wait = self.max_wait
+
+        job = self.job_service.get(job_id, wait)
+        if job is None:
+            return jsonify({'error': f'Unknown job {job_id}'}), 404
+
+        response = {
+            'jobId': job['id'],
+            'status': job['status'],
+            'priority': job['priority'],
+            'createdAt': job['created_at'],
+            'startedAt': job['started_at'],
+            'finishedAt': job['finished_at']
+        }
+
+        if job['started_at'] is not None:
+            response['waitSeconds'] = job['started_at'] - job['created_at']
+
+        if job['status'] == 'queued':
+            response['queueDepth'] = self.job_service.queue_depth()
+        elif job['status'] == 'done':
+            layer_dimensions, combined_velocity, color_mode, signatures = job['result']
+            response.update({
+                'layerDimensions': layer_dimensions,
+                'combinedVelocity': combined_velocity,
+                'strategy': color_mode,
+                'signatures': map_signatures(signatures)
+            })
+        elif job['status'] == 'failed':
+            response['error'] = job['error']
+
+        return jsonify(response), 200 if job['status'] in {'done', 'failed'} else 202
@@ -0,0 +1,10 @@
+from flask import request
+from app.metrics import StageMetrics
+
+
+class MetricsController:
+    def __init__(self, stage_metrics: StageMetrics):
+        self.stage_metrics = stage_metrics
+
+    def metrics(self, request: request):
+        return (self.stage_metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
@@ -1,58 +1,286 @@
-from flask import request, jsonify
-from app.service.signature_service import SignatureService
+import hmac
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from contextlib import ExitStack
+from flask import Response, request, jsonify
+from typing import Optional
+from app.model.architecture import ARCHITECTURE_MODES
+from app.model.particles import COLOR_MODES, PARTICLE_FORMATS
+from app.model.precision import PRECISIONS
+from app.service.admission_service import AdmissionRejected, AdmissionService
+from app.service.signature_service import RenderFailed, SignatureService
+
+
+def parse_signature_parameters(data: dict) -> dict:
+    particles = data.get('particles', [])
+
+    n_images = int(data.get('images', 1))
+    if n_images < 1:
+        n_images = 1
+    elif n_images > 5:
+        n_images = 5
+
+    image_height = int(data.get('height', 512))
+    if image_height < 64:
+        image_height = 64
+    elif image_height > 1920:
+        image_height = 1920
+
+    image_width = int(data.get('width', 512))
+    if image_width < 64:
+        image_width = 64
+    elif image_width > 2048:
+        image_width = 2048
+
+    symmetry = data.get('symmetry', False)
+    trig = data.get('trig', False)
+    alpha = data.get('alpha', False)
+    noise = data.get('noise', False)
+    save = data.get('save', True)
+
+    activation = data.get('activation', 'tanh')
+
+    precision = data.get('precision', 'float32')
+    if precision not in PRECISIONS:
+        precision = 'float32'
+
+    generator_seed = data.get('generatorSeed')
+    if generator_seed is not None:
+        generator_seed = int(generator_seed)
+
+    # None leaves the mapping of particles to layers to the server's configured mode
+    architecture = data.get('architecture')
+    if architecture not in ARCHITECTURE_MODES:
+        architecture = None
+
+    # as returned by /particles/summary, in place of the particles themselves
+    particle_summary = data.get('particleSummary')
+    if particle_summary is not None:
+        strategy = particle_summary.get('strategy')
+        particle_summary = (max(0, int(particle_summary.get('count', 0))), float(particle_summary.get('combinedVelocity', 0)),
+                            strategy if strategy in COLOR_MODES else 'rgb')
+
+    return {
+        'particles': particles,
+        'n_images': n_images,
+        'image_height': image_height,
+        'image_width': image_width,
+        'symmetry': symmetry,
+        'trig': trig,
+        'alpha': alpha,
+        'noise': noise,
+        'activation': activation,
+        'save': save,
+        'generator_seed': generator_seed,
+        'precision': precision,
+        'particle_summary': particle_summary,
+        'architecture': architecture
+    }
+
+
+def map_cost(cost: dict) -> dict:
+    return {
+        'layerDimensions': cost['layer_dimensions'],
+        'pixels': cost['pixels'],
+        'flops': cost['flops'],
+        'bytes': cost['bytes']
+    }
+
+
+def rejection_response(error: AdmissionRejected) -> tuple:
+    return jsonify({'error': str(error)}), 429, {'Retry-After': str(error.retry_after)}
+
+
+def map_signatures(signatures: list) -> list:
+    def split_signatures(signature_tuple):
+        seed, generator_seed, image = signature_tuple
+        return {
+            'seed': seed,
+            'generatorSeed': generator_seed,
+            'image': image
+        }
+
+    return list(map(split_signatures, signatures))
 
 
 class SignatureController:
-    def __init__(self, signature_service: SignatureService):
+    def __init__(self, signature_service: SignatureService, admission_service: AdmissionService, max_batch_events: int = 500,
+                 admin_token: Optional[str] = None):
         self.signature_service = signature_service
+        self.admission_service = admission_service
+        self.max_batch_events = max_batch_events
+        # administrative actions are disabled unless a token is configured
+        self.admin_token = admin_token
 
     def create(self, request: request):
         data = request.json
 
-        particles = data.get('particles', [])
+        parameters = parse_signature_parameters(data)
+        cost = self.signature_service.estimate_cost(parameters)
 
-        n_images = int(data.get('images', 1))
-        if n_images < 1:
-            n_images = 1
-        elif n_images > 5:
-            n_images = 5
+        progressive = data.get('progressive', False)
+        if progressive:
+            preview_size = int(data.get('previewSize', 128))
+            if preview_size < 16:
+                preview_size = 16
+            elif preview_size > 512:
+                preview_size = 512
 
-        image_height = int(data.get('height', 512))
-        if image_height < 64:
-            image_height = 64
-        elif image_height > 1920:
-            image_height = 1920
+            # the full render outlives the request, so its share of the budget is released once it finishes
+            admission = ExitStack()
+            try:
+                admission.enter_context(self.admission_service.admit(cost))
+            except AdmissionRejected as error:
+                return rejection_response(error)
 
-        image_width = int(data.get('width', 512))
-        if image_width < 64:
-            image_width = 64
-        elif image_width > 2048:
-            image_width = 2048
+            try:
+                layer_dimensions, combined_velocity, color_mode, render_id, previews = self.signature_service.create_progressive_signatures(
+                    **parameters, preview_size=preview_size, on_rendered=admission.close
+                )
+            except BaseException:
+                admission.close()
+                raise
 
-        symmetry = data.get('symmetry', False)
-        trig = data.get('trig', False)
-        alpha = data.get('alpha', False)
-        noise = data.get('noise', False)
-        save = data.get('save', True)
+            return jsonify({
+                'layerDimensions': layer_dimensions,
+                'combinedVelocity': combined_velocity,
+                'strategy': color_mode,
+                'renderId': render_id,
+                'cost': map_cost(cost),
+                'previews': [{'generatorSeed': preview_seed, 'image': image} for preview_seed, image in previews]
+            }), 202
 
-        activation = data.get('activation', 'tanh')
+        key = self.signature_service.result_key(parameters)
+        cached = self.signature_service.get_cached_signatures(key) if key else None
 
-        layer_dimensions, combined_velocity, color_mode, signatures = self.signature_service.create_signatures(
-            particles, n_images, image_height, image_width, symmetry, trig, alpha, noise, activation, save
-        )
+        if cached is not None:
+            etag, result = cached
+            headers = {'ETag': f'"{etag}"', 'X-Cache': 'HIT'}
 
-        def split_signatures(signature_tuple):
-            seed, image = signature_tuple
-            return {
-                'seed': seed,
-                'image': image
-            }
+            if request.if_none_match.contains_weak(etag):
+                return '', 304, headers
 
-        mapped_signatures = list(map(split_signatures, signatures))
+            status = 200
+        else:
+            try:
+                with self.admission_service.admit(cost):
+                    result = self.signature_service.create_signatures(**parameters)
+            except AdmissionRejected as error:
+                return rejection_response(error)
+
+            headers = {'X-Cache': 'MISS'}
+
+            if key:
+                headers['ETag'] = f'"{self.signature_service.cache_signatures(key, result)}"'
+
+            status = 201
+
+        if key:
+            headers['X-Cache-Key'] = key
+
+        layer_dimensions, combined_velocity, color_mode, signatures = result
 
         return jsonify({
             'layerDimensions': layer_dimensions,
             'combinedVelocity': combined_velocity,
             'strategy': color_mode,
-            'signatures': mapped_signatures
-        }), 201
+            'cost': map_cost(cost),
+            'signatures': map_signatures(signatures)
+        }), status, headers
+
+    def estimate(self, request: request):
+        parameters = parse_signature_parameters(request.json)
+
+        return jsonify(map_cost(self.signature_service.estimate_cost(parameters))), 200
+
+    def batch(self, request: request):
+        data = request.json
+
+        parameters = parse_signature_parameters(data)
+        del parameters['particles'], parameters['generator_seed'], parameters['particle_summary']
+
+        events = data.get('events', [])
+        if not events:
+            return jsonify({'error': 'At least one event is required'}), 400
+        if len(events) > self.max_batch_events:
+            return jsonify({'error': f'At most {self.max_batch_events} events are allowed per batch'}), 413
+
+        events = [{
+            'particles': event.get('particles', []),
+            'generator_seed': int(event['generatorSeed']) if event.get('generatorSeed') is not None else None
+        } for event in events]
+
+        # the whole batch is admitted up front, and keeps its share of the budget until the stream is closed
+        admission = ExitStack()
+        try:
+            admission.enter_context(self.admission_service.admit(self.signature_service.estimate_batch_cost(events, parameters)))
+        except AdmissionRejected as error:
+            return rejection_response(error)
+
+        try:
+            signatures = self.signature_service.create_signature_batch(events, **parameters)
+        except BaseException:
+            admission.close()
+            raise
+
+        # one line per signature as soon as it is uploaded, in completion order, then a summary line
+        response = Response((json.dumps(signature) + '\n' for signature in signatures), mimetype='application/x-ndjson')
+        response.call_on_close(admission.close)
+
+        return response
+
+    def summarize(self, request: request):
+        upload = request.files.get('file')
+        file_format = request.args.get('format') or (os.path.splitext(upload.filename)[1].lstrip('.').lower() if upload else '')
+        if file_format not in PARTICLE_FORMATS:
+            return jsonify({'error': f'The format must be one of {", ".join(PARTICLE_FORMATS)}'}), 400
+
+        # the upload is spooled to disk in chunks, so its size never has to fit in memory
+        with tempfile.TemporaryFile() as file:
+            shutil.copyfileobj(upload.stream if upload else request.stream, file, 1024 * 1024)
+            file.seek(0)
+
+            try:
+                count, combined_velocity, color_mode = self.signature_service.summarize_particles(file, file_format)
+            except (ValueError, KeyError, UnicodeDecodeError, zipfile.BadZipFile) as error:
+                return jsonify({'error': f'Invalid particle file: {error}'}), 400
+
+        return jsonify({
+            'count': count,
+            'combinedVelocity': combined_velocity,
+            'strategy': color_mode
+        }), 200
+
+    def invalidate(self, request: request):
+        if not self.admin_token:
+            return jsonify({'error': 'Cache invalidation is disabled'}), 403
+
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {self.admin_token}'):
+            return jsonify({'error': 'Unauthorized'}), 401
+
+        try:
+            invalidated = self.signature_service.invalidate_cached_signatures(request.args.get('key'))
+        except ValueError as error:
+            return jsonify({'error': str(error)}), 400
+
+        return jsonify({'invalidated': invalidated}), 200
+
+    def render(self, request: request, render_id: str):
+        try:
+            signatures = self.signature_service.get_progressive_signatures(render_id)
+        except KeyError:
+            return jsonify({'error': f'Unknown render {render_id}'}), 404
+        except RenderFailed as error:
+            return jsonify({'renderId': render_id, 'status': 'failed', 'error': str(error)}), 500
+
+        if signatures is None:
+            return jsonify({'renderId': render_id, 'status': 'pending'}), 202
+
+        return jsonify({
+            'renderId': render_id,
+            'status': 'done',
+            'signatures': map_signatures(signatures)
+        }), 200
@@ -1,18 +1,105 @@
-from app.repository.signature_repository import SignatureRepository
-from app.repository.bucket_repository import BucketRepository
-from app.service.signature_service import SignatureService
-from app.controller.signature_controller import SignatureController
+import os
+from typing import TYPE_CHECKING
+from app.configuration import env_bool
+from app.repository.job_repository import JobRepository
+from app.repository.local_job_repository import LocalJobRepository
+from app.repository.result_cache_repository import ResultCacheRepository
+from app.service.admission_service import AdmissionService
 from app.controller.heartbeat_controller import HeartbeatController
+from app.controller.metrics_controller import MetricsController
+from app.metrics import metrics
 
+# the rendering stack pulls in torch, cv2 and numpy, so it is only imported by the factories that build it
+if TYPE_CHECKING:
+    from app.service.signature_service import SignatureService
+    from app.controller.signature_controller import SignatureController
+    from app.controller.job_controller import JobController
 
-def signature_controller_factory() -> SignatureController:
-    signature_repository = SignatureRepository()
-    bucket_repository = BucketRepository()
 
-    signature_service = SignatureService(
-        signature_repository, bucket_repository)
-    return SignatureController(signature_service)
+def signature_service_factory() -> 'SignatureService':
+    from app.model.architecture import map_architecture
+    from app.model.compiled import compiled_networks
+    from app.model.encoder import ImageEncoder
+    from app.model.grid import grid_cache
+    from app.repository.signature_repository import SignatureRepository
+    from app.repository.bucket_repository import BucketRepository
+    from app.repository.local_bucket_repository import LocalBucketRepository
+    from app.service.signature_service import SignatureService
+
+    encoding_level = os.environ.get('SIGNATURE_ENCODING_LEVEL')
+    encoder = ImageEncoder(os.environ.get('SIGNATURE_ENCODING') or 'png',
+                           int(encoding_level) if encoding_level else None)
+    legacy_seed = env_bool('LEGACY_SIGNATURE_SEED', True)
+    architecture = os.environ.get('ARCHITECTURE_MODE') or 'bounded'
+    max_depth = int(os.environ.get('ARCHITECTURE_MAX_DEPTH') or 16)
+    max_width = int(os.environ.get('ARCHITECTURE_MAX_WIDTH') or 32)
+
+    network_cache = None
+    if env_bool('COMPILE_NETWORKS', True):
+        network_cache = compiled_networks
+        # the architectures of the smallest events, which are the most frequent
+        network_cache.warmup([map_architecture(n_particles, architecture, max_depth, max_width) for n_particles in range(int(os.environ.get('COMPILE_WARMUP_PARTICLES') or 5) + 1)],
+                             activations=(os.environ.get('COMPILE_WARMUP_ACTIVATIONS') or 'tanh').split(','))
+
+    metrics.register_gauges('grid_cache', grid_cache.stats)
+    metrics.register_gauges('compiled_networks', compiled_networks.stats)
+
+    fold_constants = env_bool('FOLD_CONSTANTS', True)
+    signature_repository = SignatureRepository(encoder=encoder, legacy_seed=legacy_seed, network_cache=network_cache,
+                                               fold_constants=fold_constants)
+
+    local_storage_path = os.environ.get('LOCAL_STORAGE_PATH')
+    if local_storage_path:
+        bucket_repository = LocalBucketRepository(local_storage_path)
+    else:
+        bucket_repository = BucketRepository()
+
+    result_cache = None
+    cache_unseeded = False
+    if env_bool('RESULT_CACHE', True):
+        result_cache = ResultCacheRepository(int(os.environ.get('RESULT_CACHE_MAX_BYTES') or 64 * 1024 * 1024),
+                                             os.environ.get('RESULT_CACHE_PATH') or None)
+        cache_unseeded = env_bool('RESULT_CACHE_UNSEEDED')
+        metrics.register_gauges('result_cache', result_cache.stats)
+
+    return SignatureService(signature_repository, bucket_repository, result_cache=result_cache, cache_unseeded=cache_unseeded,
+                            batch_workers=int(os.environ.get('BATCH_WORKERS') or 2),
+                            batch_chunk_size=int(os.environ.get('BATCH_CHUNK_SIZE') or 8),
+                            architecture=architecture, max_depth=max_depth, max_width=max_width)
+
+
+def signature_controller_factory(signature_service: 'SignatureService') -> 'SignatureController':
+    from app.controller.signature_controller import SignatureController
+
+    admission_service = AdmissionService(max_flops=float(os.environ.get('ADMISSION_MAX_FLOPS') or 1e11),
+                                         max_bytes=int(os.environ.get('ADMISSION_MAX_BYTES') or 2 * 1024 ** 3),
+                                         max_queued=int(os.environ.get('ADMISSION_MAX_QUEUED') or 16),
+                                         max_wait=float(os.environ.get('ADMISSION_MAX_WAIT') or 10))
+    metrics.register_gauges('admission', admission_service.stats)
+
+    return SignatureController(signature_service, admission_service, max_batch_events=int(os.environ.get('BATCH_MAX_EVENTS') or 500),
+                               admin_token=os.environ.get('ADMIN_TOKEN') or None)
+
+
+def job_controller_factory(signature_service: 'SignatureService') -> 'JobController':
+    from app.service.job_service import JobService
+    from app.controller.job_controller import JobController
+
+    job_storage_path = os.environ.get('JOB_STORAGE_PATH')
+    if job_storage_path:
+        job_repository = LocalJobRepository(job_storage_path)
+    else:
+        job_repository = JobRepository()
+
+    job_service = JobService(signature_service, job_repository, workers=int(os.environ.get('JOB_WORKERS') or 2))
+    metrics.register_gauges('render_jobs', job_service.stats)
+
+    return JobController(job_service)
 
 
 def heartbeat_controller_factory() -> HeartbeatController:
     return HeartbeatController()
+
+
+def metrics_controller_factory() -> MetricsController:
+    return MetricsController(metrics)
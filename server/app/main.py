@@ -1,21 +1,96 @@
+import importlib
+import logging
 import os
-from app.configuration import configuration_by_name
+import threading
+import time
+from app.configuration import configuration_by_name, env_bool
 from dotenv import load_dotenv
-from flask import Flask, request
+from flask import Flask, g, request
 from flask_cors import CORS
-from app.factory.controller_factory import signature_controller_factory, heartbeat_controller_factory
+from app.factory.controller_factory import signature_service_factory, signature_controller_factory, job_controller_factory, heartbeat_controller_factory, metrics_controller_factory
+from app.metrics import begin_request, end_request
+from app.profiling import RequestProfiler
 
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
 env = os.environ.get('ENV', 'production')
+logging.basicConfig(level=os.environ.get('LOG_LEVEL') or 'INFO')
 
 app = Flask(__name__)
 CORS(app)
 app.config.from_object(configuration_by_name[env])
 
-signature_controller = signature_controller_factory()
 heartbeat_controller = heartbeat_controller_factory()
+metrics_controller = metrics_controller_factory()
+
+# modules imported by a preloading parent process, so the workers it forks start with them loaded
+PRELOADED_MODULES = ['torch', 'cv2', 'numpy', 'app.model.generator', 'app.model.compiled', 'app.model.precision',
+                     'app.repository.signature_repository', 'app.service.signature_service', 'app.service.job_service',
+                     'app.controller.signature_controller', 'app.controller.job_controller']
+
+_rendering_controllers = None
+_rendering_controllers_lock = threading.Lock()
+
+profiler = RequestProfiler(enabled=env_bool('ENABLE_PROFILING'),
+                           output_dir=os.environ.get('PROFILE_DIR') or 'profiles')
+
+
+def rendering_controllers() -> tuple:
+    # the rendering stack is built on first use, so a new worker answers heartbeats while torch is still loading
+    global _rendering_controllers
+    if _rendering_controllers is None:
+        with _rendering_controllers_lock:
+            if _rendering_controllers is None:
+                signature_service = signature_service_factory()
+                _rendering_controllers = (signature_service, signature_controller_factory(signature_service),
+                                          job_controller_factory(signature_service))
+
+    return _rendering_controllers
+
+
+def warmup(render: bool = True):
+    start_time = time.perf_counter()
+    signature_service, _, _ = rendering_controllers()
+    if render:
+        signature_service.warmup()
+
+    logging.getLogger(__name__).info('warmup finished in %.3f s', time.perf_counter() - start_time)
+
+
+def preload():
+    # only imports, starting no thread and running no torch operation, which would not survive a fork
+    for module in PRELOADED_MODULES:
+        importlib.import_module(module)
+
+    if not os.environ.get('LOCAL_STORAGE_PATH'):
+        importlib.import_module('supabase')
+
+
+def start():
+    render = env_bool('WARMUP_RENDER', True)
+
+    # persisted jobs are resumed by the job service, so it is built right away when there are any
+    if render or os.environ.get('JOB_STORAGE_PATH'):
+        threading.Thread(target=warmup, args=(render,), name='warmup', daemon=True).start()
+
+
+@app.before_request
+def before_request():
+    begin_request()
+    g.profile = profiler.start(request)
+
+
+@app.after_request
+def after_request(response):
+    profiler.stop(g.pop('profile', None), request, response)
+
+    server_timing = end_request()
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+        response.headers['Timing-Allow-Origin'] = '*'
+
+    return response
 
 
 @app.route('/heartbeat', methods=['GET'])
@@ -23,9 +98,57 @@ def heartbeat():
     return heartbeat_controller.heartbeat(request=request)
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return metrics_controller.metrics(request=request)
+
+
 @app.route('/signatures/create', methods=['POST'])
 def create():
-    return signature_controller.create(request=request)
+    return rendering_controllers()[1].create(request=request)
+
+
+@app.route('/signatures/estimate', methods=['POST'])
+def estimate():
+    return rendering_controllers()[1].estimate(request=request)
+
+
+@app.route('/signatures/batch', methods=['POST'])
+def batch():
+    return rendering_controllers()[1].batch(request=request)
+
+
+@app.route('/particles/summary', methods=['POST'])
+def summarize_particles():
+    return rendering_controllers()[1].summarize(request=request)
+
+
+# internal only: disabled unless ADMIN_TOKEN is set, and then restricted to requests bearing it
+@app.route('/signatures/cache', methods=['DELETE'])
+def invalidate():
+    return rendering_controllers()[1].invalidate(request=request)
+
+
+@app.route('/signatures/renders/<render_id>', methods=['GET'])
+def render(render_id: str):
+    return rendering_controllers()[1].render(request=request, render_id=render_id)
+
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    return rendering_controllers()[2].create(request=request)
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job(job_id: str):
+    return rendering_controllers()[2].get(request=request, job_id=job_id)
+
+
+# a preloading parent only imports, and starts each forked worker from its post_fork hook (see gunicorn.conf.py)
+if env_bool('APP_PRELOADED'):
+    preload()
+else:
+    start()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,151 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+# upper bounds, in seconds, of the stage duration histogram buckets
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+_request_timings: ContextVar[Optional[List]] = ContextVar('request_timings', default=None)
+
+
+class Stage:
+    '''
+    A timed stage in progress. Pixels and bytes can be filled in once they are known.
+    '''
+
+    def __init__(self, name: str, pixels: int = 0, n_bytes: int = 0):
+        self.name = name
+        self.pixels = pixels
+        self.bytes = n_bytes
+
+
+class StageMetrics:
+    '''
+    Thread-safe per-stage aggregates of durations, pixel counts and bytes produced.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, dict] = {}
+        self._gauges: Dict[str, Callable[[], dict]] = {}
+
+    def observe(self, stage: Stage, seconds: float):
+        with self._lock:
+            metrics = self._stages.get(stage.name)
+            if metrics is None:
+                metrics = {'count': 0, 'seconds': 0.0, 'pixels': 0, 'bytes': 0, 'buckets': [0] * len(DURATION_BUCKETS)}
+                self._stages[stage.name] = metrics
+
+            metrics['count'] += 1
+            metrics['seconds'] += seconds
+            metrics['pixels'] += stage.pixels
+            metrics['bytes'] += stage.bytes
+
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    metrics['buckets'][i] += 1
+
+    def register_gauges(self, name: str, collect: Callable[[], dict]):
+        '''
+        Register a callable whose numeric values are exported as `<name>_<key>` gauges.
+        '''
+        with self._lock:
+            self._gauges[name] = collect
+
+    def render_prometheus(self) -> str:
+        '''
+        Render every metric in the Prometheus text exposition format.
+        '''
+        with self._lock:
+            stages = {name: dict(metrics, buckets=list(metrics['buckets'])) for name, metrics in self._stages.items()}
+            gauges = dict(self._gauges)
+
+        lines = ['# HELP signature_stage_seconds Duration of each stage of the signature pipeline.',
+                 '# TYPE signature_stage_seconds histogram']
+        for name, metrics in sorted(stages.items()):
+            for bound, count in zip(DURATION_BUCKETS, metrics['buckets']):
+                lines.append(f'signature_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'signature_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {metrics["count"]}')
+            lines.append(f'signature_stage_seconds_sum{{stage="{name}"}} {metrics["seconds"]}')
+            lines.append(f'signature_stage_seconds_count{{stage="{name}"}} {metrics["count"]}')
+
+        for metric, key, description in [('signature_stage_pixels_total', 'pixels', 'Pixels processed by each stage.'),
+                                         ('signature_stage_bytes_total', 'bytes', 'Bytes produced by each stage.')]:
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for name, metrics in sorted(stages.items()):
+                lines.append(f'{metric}{{stage="{name}"}} {metrics[key]}')
+
+        for name, collect in sorted(gauges.items()):
+            for key, value in collect().items():
+                if isinstance(value, (int, float)):
+                    lines.append(f'# TYPE {name}_{key} gauge')
+                    lines.append(f'{name}_{key} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = StageMetrics()
+
+
+@contextmanager
+def timed(name: str, pixels: int = 0, n_bytes: int = 0):
+    '''
+    Time a stage of the pipeline, recording it in the process metrics and in the current request's timings.
+
+    Parameters
+    ----------
+    name : str
+        The stage name.
+    pixels : int, optional
+        The number of pixels processed by the stage.
+    n_bytes : int, optional
+        The number of bytes produced by the stage. Can also be set through the yielded stage's `bytes`.
+
+    Yields
+    ------
+    Stage
+        The stage being timed.
+    '''
+    stage = Stage(name, pixels, n_bytes)
+    start_time = time.perf_counter()
+
+    try:
+        yield stage
+    finally:
+        seconds = time.perf_counter() - start_time
+        metrics.observe(stage, seconds)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, seconds))
+
+
+def begin_request():
+    '''
+    Start collecting stage timings for the current request.
+    '''
+    _request_timings.set([])
+
+
+def end_request() -> str:
+    '''
+    Stop collecting stage timings for the current request and render them as a Server-Timing header.
+
+    Durations of stages that ran several times (e.g. once per band or per image) are summed.
+
+    Returns
+    -------
+    str
+        The Server-Timing header value.
+    '''
+    timings = _request_timings.get() or []
+    _request_timings.set(None)
+
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+
+    return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in totals.items())
@@ -0,0 +1,77 @@
+import math
+from typing import List
+
+# 'legacy' builds a hidden layer per particle, 'bounded' caps the depth and widens the layers instead
+ARCHITECTURE_MODES = ['legacy', 'bounded']
+
+BASE_WIDTH = 10
+DEFAULT_MAX_DEPTH = 16
+DEFAULT_MAX_WIDTH = 32
+
+INPUT_FEATURES = 5
+
+
+def map_architecture(n_particles: int, mode: str = 'bounded', max_depth: int = DEFAULT_MAX_DEPTH,
+                     max_width: int = DEFAULT_MAX_WIDTH) -> List[int]:
+    '''
+    Map a number of particles to the hidden layer dimensions of a signature network.
+
+    In 'legacy' mode the network has `n_particles + 2` hidden layers of width `BASE_WIDTH`, so its cost
+    grows linearly with the particles. In 'bounded' mode the same layers are built up to `max_depth`;
+    past it, the compute of the layers that no longer fit is folded into the width of the kept ones,
+    which widen as far as the legacy network's hidden multiply-adds allow, up to `max_width`. Events that
+    fit within `max_depth` get exactly the legacy architecture, so their signatures do not change, and
+    every architecture costs at most `max_depth` layers of `max_width`.
+
+    Parameters
+    ----------
+    n_particles : int
+        The number of particles of the event.
+    mode : str, optional
+        The mapping, one of `ARCHITECTURE_MODES`. Default is 'bounded'.
+    max_depth : int, optional
+        The maximum number of hidden layers of a bounded architecture.
+    max_width : int, optional
+        The maximum width of the hidden layers of a bounded architecture.
+
+    Returns
+    -------
+    List[int]
+        The hidden layer dimensions.
+    '''
+    n_layers = n_particles + 2
+    if mode == 'legacy':
+        return [BASE_WIDTH] * n_layers
+
+    if mode not in ARCHITECTURE_MODES:
+        raise ValueError(f'Non-supported architecture mode {mode}')
+
+    depth = max(1, min(n_layers, max_depth))
+    if depth == n_layers:
+        return [BASE_WIDTH] * n_layers
+
+    # the widest layers whose products cost no more than the legacy network's
+    width = math.isqrt((n_layers - 1) * BASE_WIDTH ** 2 // (depth - 1)) if depth > 1 else max_width
+    width = max(BASE_WIDTH, min(max_width, width))
+
+    return [width] * depth
+
+
+def multiply_adds(layer_dimensions: List[int], out_nodes: int) -> int:
+    '''
+    Count the multiply-adds a network of the given hidden layers spends on each pixel.
+
+    Parameters
+    ----------
+    layer_dimensions : List[int]
+        The hidden layer dimensions.
+    out_nodes : int
+        The number of output nodes.
+
+    Returns
+    -------
+    int
+        The multiply-adds per pixel, from the input features to the output nodes.
+    '''
+    dimensions = [INPUT_FEATURES] + list(layer_dimensions) + [out_nodes]
+    return sum(a * b for a, b in zip(dimensions, dimensions[1:]))
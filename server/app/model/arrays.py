@@ -0,0 +1,151 @@
+import json
+import numpy as np
+import struct
+import torch
+from typing import Optional, Tuple
+
+# raw array formats and the dtype they store
+ARRAY_FORMATS = {
+    'npy': np.uint8,
+    'npy-float': np.float32
+}
+
+STACK_FORMATS = {
+    'stack': np.uint8,
+    'stack-float': np.float32
+}
+
+STACK_MAGIC = b'CPPNSTK\x01'
+# the array data starts on a boundary of this many bytes, after the magic, header length and JSON header
+STACK_ALIGNMENT = 64
+
+
+def open_array(filename: str, shape: Tuple[int, ...], dtype: np.dtype) -> torch.Tensor:
+    '''
+    Create a `.npy` file and return a tensor backed by its memory map.
+
+    Whatever is written into the tensor lands in the file through the shared mapping, so an image can be
+    rendered straight into it without ever being held whole in memory.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the `.npy` file.
+    shape : Tuple[int, ...]
+        The shape of the array.
+    dtype : np.dtype
+        The dtype of the array.
+
+    Returns
+    -------
+    torch.Tensor
+        The tensor mapped to the file's data.
+    '''
+    return torch.from_numpy(np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape))
+
+
+def write_array(image: torch.Tensor, out: torch.Tensor) -> torch.Tensor:
+    '''
+    Write an image into an array of another dtype: uint8 arrays get the quantized image, floating point
+    arrays get the image in [0, 1].
+
+    Parameters
+    ----------
+    image : torch.Tensor
+        The image tensor, either floating point in [0, 1] or already quantized to uint8.
+    out : torch.Tensor
+        The uint8 or floating point array to write into, such as one returned by `open_array`.
+
+    Returns
+    -------
+    torch.Tensor
+        The `out` array.
+    '''
+    if out.dtype == torch.uint8:
+        if image.dtype == torch.uint8:
+            return out.copy_(image)
+
+        return out.copy_(image.clamp(0, 1).mul_(255))
+
+    if image.dtype == torch.uint8:
+        return torch.div(image, 255, out=out)
+
+    return torch.clamp(image, 0, 1, out=out)
+
+
+def _stack_offset(header_length: int) -> int:
+    end = len(STACK_MAGIC) + 4 + header_length
+    return -(-end // STACK_ALIGNMENT) * STACK_ALIGNMENT
+
+
+def create_image_stack(filename: str, n_images: int, image_height: int, image_width: int, n_channels: int,
+                       dtype: np.dtype, metadata: Optional[dict] = None) -> np.memmap:
+    '''
+    Create a file holding a stack of images behind a small JSON header, and map its data.
+
+    The file starts with `STACK_MAGIC`, the little-endian uint32 length of the JSON header and the header
+    itself, which records the dtype and shape of the stack along with any metadata. The C-ordered
+    (n_images, image_height, image_width, n_channels) array follows at the next multiple of
+    `STACK_ALIGNMENT` bytes.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the stack file.
+    n_images : int
+        The number of images.
+    image_height : int
+        The height of the images.
+    image_width : int
+        The width of the images.
+    n_channels : int
+        The number of channels of the images.
+    dtype : np.dtype
+        The dtype of the images.
+    metadata : dict, optional
+        Extra JSON-serializable entries of the header, e.g. the generation parameters.
+
+    Returns
+    -------
+    np.memmap
+        The writable memory map of the stack.
+    '''
+    shape = (n_images, image_height, image_width, n_channels)
+    header = json.dumps(dict(metadata or {}, dtype=np.dtype(dtype).str, shape=list(shape))).encode('utf-8')
+    offset = _stack_offset(len(header))
+
+    with open(filename, 'wb') as f:
+        f.write(STACK_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.truncate(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+
+    return np.memmap(filename, dtype=dtype, mode='r+', offset=offset, shape=shape)
+
+
+def open_image_stack(filename: str, mode: str = 'r') -> Tuple[np.memmap, dict]:
+    '''
+    Map a stack file created by `create_image_stack`, without reading its data.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the stack file.
+    mode : str, optional
+        The memory map mode, 'r' to read or 'r+' to write into the images. Default is 'r'.
+
+    Returns
+    -------
+    Tuple[np.memmap, dict]
+        The (n_images, image_height, image_width, n_channels) memory map and the JSON header.
+    '''
+    with open(filename, 'rb') as f:
+        if f.read(len(STACK_MAGIC)) != STACK_MAGIC:
+            raise ValueError(f'{filename} is not an image stack')
+
+        header_length, = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_length))
+
+    stack = np.memmap(filename, dtype=np.dtype(header['dtype']), mode=mode, offset=_stack_offset(header_length),
+                      shape=tuple(header['shape']))
+    return (stack, header)
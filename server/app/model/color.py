@@ -0,0 +1,249 @@
+import torch
+from typing import Optional, Sequence
+
+# per-sector indices into the stacked (v, q, p, t) candidates, following the
+# classic hsv sector table: r = [v, q, p, p, t, v], g = [t, v, v, q, p, p], b = [p, p, t, v, v, q]
+HSV_SECTOR_TABLE = [[0, 3, 2], [1, 0, 2], [2, 0, 3], [2, 1, 0], [3, 2, 0], [0, 2, 1]]
+
+# per-sector indices into the stacked (c + m, x + m, m) candidates
+HSL_SECTOR_TABLE = [[0, 1, 2], [1, 0, 2], [2, 0, 1], [2, 1, 0], [1, 2, 0], [0, 2, 1]]
+HSL_SECTOR_BOUNDARIES = [1/6, 1/3, 1/2, 2/3, 5/6]
+
+# positions of the red, green, blue and alpha channels in an output buffer, None for a dropped channel
+RGBA_CHANNELS = (0, 1, 2, 3)
+BGRA_CHANNELS = (2, 1, 0, 3)
+BGR_CHANNELS = (2, 1, 0, None)
+
+
+def _select_sector(candidates: torch.Tensor, sector: torch.Tensor, table: list) -> torch.Tensor:
+    '''
+    Pick the red, green and blue values of every pixel from its sector candidates.
+
+    Parameters
+    ----------
+    candidates : torch.Tensor
+        A (..., k) tensor with the candidate channel values of each pixel.
+    sector : torch.Tensor
+        A (...) integer tensor with the color wheel sector (0 to 5) of each pixel.
+    table : list
+        A 6 x 3 lookup table mapping each sector to candidate indices.
+
+    Returns
+    -------
+    torch.Tensor
+        A (..., 3) tensor with the selected RGB values.
+    '''
+    lookup = torch.tensor(table, dtype=torch.long, device=candidates.device)
+    return candidates.gather(-1, lookup[sector])
+
+
+def hsv_to_rgb(h: torch.Tensor, s: torch.Tensor, v: torch.Tensor) -> torch.Tensor:
+    '''
+    Convert HSV channels to RGB with branchless tensor operations.
+
+    Parameters
+    ----------
+    h : torch.Tensor
+        Hue values.
+    s : torch.Tensor
+        Saturation values.
+    v : torch.Tensor
+        Value values.
+
+    Returns
+    -------
+    torch.Tensor
+        A tensor with a trailing RGB dimension, on the same device and dtype as the input.
+    '''
+    h = 6 * h
+    i = torch.floor(h)
+    f = h - i
+    p = v * (1 - s)
+    q = v * (1 - f * s)
+    t = v * (1 - (1 - f) * s)
+
+    sector = torch.remainder(i, 6).long()
+    return _select_sector(torch.stack([v, q, p, t], dim=-1), sector, HSV_SECTOR_TABLE)
+
+
+def hsl_to_rgb(h: torch.Tensor, s: torch.Tensor, l: torch.Tensor) -> torch.Tensor:
+    '''
+    Convert HSL channels to RGB with branchless tensor operations.
+
+    Hues outside of [0, 1) are mapped to black, as in the original masked implementation.
+
+    Parameters
+    ----------
+    h : torch.Tensor
+        Hue values.
+    s : torch.Tensor
+        Saturation values.
+    l : torch.Tensor
+        Lightness values.
+
+    Returns
+    -------
+    torch.Tensor
+        A tensor with a trailing RGB dimension, on the same device and dtype as the input.
+    '''
+    c = (1 - torch.abs(2 * l - 1)) * s
+    x = c * (1 - torch.abs((h * 6) % 2 - 1))
+    m = l - c / 2
+
+    boundaries = torch.tensor(HSL_SECTOR_BOUNDARIES, dtype=h.dtype, device=h.device)
+    # the hue is usually a strided channel view, which bucketize would otherwise copy with a warning on every call
+    sector = torch.bucketize(h.contiguous(), boundaries, right=True)
+    rgb = _select_sector(torch.stack([c + m, x + m, m], dim=-1), sector, HSL_SECTOR_TABLE)
+
+    in_range = ((h >= 0) & (h < 1)).unsqueeze(-1)
+    return torch.where(in_range, rgb, torch.zeros((), dtype=rgb.dtype, device=rgb.device))
+
+
+def cmyk_to_rgb(c: torch.Tensor, m: torch.Tensor, y: torch.Tensor, k: torch.Tensor) -> torch.Tensor:
+    '''
+    Convert CMYK channels to RGB.
+
+    Parameters
+    ----------
+    c : torch.Tensor
+        Cyan values.
+    m : torch.Tensor
+        Magenta values.
+    y : torch.Tensor
+        Yellow values.
+    k : torch.Tensor
+        Key values.
+
+    Returns
+    -------
+    torch.Tensor
+        A tensor with a trailing RGB dimension, on the same device and dtype as the input.
+    '''
+    return (1 - torch.stack([c, m, y], dim=-1)) * k.unsqueeze(-1)
+
+
+def alpha_channel(image: torch.Tensor, alpha: bool) -> torch.Tensor:
+    '''
+    Compute the alpha channel of a network output.
+
+    Parameters
+    ----------
+    image : torch.Tensor
+        The (..., channels) network output.
+    alpha : bool
+        Shape the last channel into an alpha channel if True, otherwise return a fully opaque channel.
+
+    Returns
+    -------
+    torch.Tensor
+        A (..., 1) alpha tensor.
+    '''
+    if not alpha:
+        return torch.ones(image.shape[:-1] + (1,), dtype=image.dtype, device=image.device)
+
+    alpha_value = 1 - torch.abs(2 * image[..., -1:] - 1)
+    return 0.25 + 0.75 * alpha_value
+
+
+def transform_colors(image: torch.Tensor, color_mode: str, alpha: bool) -> torch.Tensor:
+    '''
+    Transform the colors of an image based on the specified color mode and alpha channel inclusion.
+
+    Every mode is computed with tensor operations only, so the result stays on the input's device and dtype.
+
+    Parameters
+    ----------
+    image : torch.Tensor
+        The (..., channels) image tensor to transform.
+    color_mode : str
+        The color mode to use for transformation ('rgb', 'bw', 'cmyk', 'hsv', 'hsl').
+    alpha : bool
+        Include an alpha channel in the output if True.
+
+    Returns
+    -------
+    torch.Tensor
+        The color-transformed (..., 4) RGBA image tensor.
+    '''
+    if color_mode == 'rgb':
+        processed_image = image[..., 0:3]
+    elif color_mode == 'bw':
+        processed_image = image[..., 0:1].expand(image.shape[:-1] + (3,))
+    elif color_mode == 'cmyk':
+        processed_image = cmyk_to_rgb(image[..., 0], image[..., 1], image[..., 2], image[..., 3])
+    elif color_mode == 'hsv':
+        processed_image = hsv_to_rgb(image[..., 0], image[..., 1], image[..., 2])
+    elif color_mode == 'hsl':
+        processed_image = hsl_to_rgb(image[..., 0], image[..., 1], image[..., 2])
+    else:
+        raise ValueError(f'Non-supported color mode {color_mode}')
+
+    return torch.cat([processed_image, alpha_channel(image, alpha)], dim=-1)
+
+
+def quantize_colors(image: torch.Tensor, color_mode: str, alpha: bool, out: torch.Tensor,
+                    channels: Sequence[Optional[int]] = RGBA_CHANNELS) -> torch.Tensor:
+    '''
+    Transform the colors of an image, clip, scale and quantize them to 8 bits straight into a uint8 buffer.
+
+    Fuses `transform_colors` and `quantize_image`, with the same result: each channel is computed in a
+    single channel-sized scratch tensor and written to its position in `out`, so no full RGBA float image
+    is ever assembled and the buffer can be laid out in the order its encoder expects.
+
+    Parameters
+    ----------
+    image : torch.Tensor
+        The (..., channels) network output.
+    color_mode : str
+        The color mode to use for transformation ('rgb', 'bw', 'cmyk', 'hsv', 'hsl').
+    alpha : bool
+        Shape the last network channel into an alpha channel if True, otherwise make the image fully opaque.
+    out : torch.Tensor
+        The (..., n_channels) uint8 buffer to write into.
+    channels : Sequence[Optional[int]], optional
+        The positions of the red, green, blue and alpha channels in `out`, None to drop a channel.
+        Default is `RGBA_CHANNELS`.
+
+    Returns
+    -------
+    torch.Tensor
+        The `out` buffer.
+    '''
+    if color_mode == 'rgb':
+        rgb = [image[..., 0], image[..., 1], image[..., 2]]
+    elif color_mode == 'bw':
+        rgb = [image[..., 0]] * 3
+    elif color_mode == 'cmyk':
+        rgb = cmyk_to_rgb(image[..., 0], image[..., 1], image[..., 2], image[..., 3]).unbind(-1)
+    elif color_mode == 'hsv':
+        rgb = hsv_to_rgb(image[..., 0], image[..., 1], image[..., 2]).unbind(-1)
+    elif color_mode == 'hsl':
+        rgb = hsl_to_rgb(image[..., 0], image[..., 1], image[..., 2]).unbind(-1)
+    else:
+        raise ValueError(f'Non-supported color mode {color_mode}')
+
+    scratch = torch.empty(image.shape[:-1], dtype=image.dtype, device=image.device)
+
+    written = {}
+    for channel, position in zip(rgb, channels[:3]):
+        if position is None:
+            continue
+
+        # grayscale channels are quantized once and copied
+        if id(channel) in written:
+            out[..., position].copy_(out[..., written[id(channel)]])
+            continue
+
+        torch.clamp(channel, 0, 1, out=scratch).mul_(255)
+        out[..., position].copy_(scratch)
+        written[id(channel)] = position
+
+    if channels[3] is not None:
+        if alpha:
+            # the operations of `alpha_channel` and `quantize_image`, in place
+            torch.mul(image[..., -1], 2, out=scratch).sub_(1).abs_().neg_().add_(1).mul_(0.75).add_(0.25).clamp_(0, 1).mul_(255)
+            out[..., channels[3]].copy_(scratch)
+        else:
+            out[..., channels[3]].fill_(255)
+
+    return out
@@ -0,0 +1,289 @@
+import os
+import threading
+import time
+import torch
+import torch.nn.functional as F
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional, Union
+from app.model.neural_network import ACTIVATION_FUNCTIONS, DEFAULT_CHUNK_ROWS, BatchedFeedForwardNetwork, FeedForwardNetwork
+
+DEFAULT_MAX_ENTRIES = 256
+
+ACTIVATIONS = {
+    'tanh': torch.tanh,
+    'sigmoid': torch.sigmoid,
+    'relu': torch.relu,
+    'softsign': F.softsign,
+    'sin': torch.sin,
+    'cos': torch.cos
+}
+
+
+def unrolled_forward(activation: str, n_layers: int, batched: bool) -> Callable:
+    '''
+    Build a forward pass with the layer loop unrolled, taking the weights as arguments.
+
+    Parameters
+    ----------
+    activation : str
+        The name of the activation function between layers.
+    n_layers : int
+        The number of linear layers.
+    batched : bool
+        Whether the weights are stacked for several networks, as in `BatchedFeedForwardNetwork`.
+
+    Returns
+    -------
+    Callable
+        A function of the input, the tuple of transposed weights and the tuple of biases.
+    '''
+    activation_function = ACTIVATIONS[activation]
+    linear = torch.baddbmm if batched else torch.addmm
+
+    def forward(x: torch.Tensor, weights: tuple, biases: tuple) -> torch.Tensor:
+        out = x
+        for i in range(n_layers):
+            out = linear(biases[i], out, weights[i])
+            out = activation_function(out) if i < n_layers - 1 else torch.sigmoid(out)
+
+        return out
+
+    return forward
+
+
+class CompiledNetwork:
+    '''
+    A network evaluated through a compiled graph shared by every network of the same architecture.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork or BatchedFeedForwardNetwork
+        The network whose weights are fed to the graph.
+    graph : Callable
+        The compiled graph of the network's architecture.
+
+    Attributes
+    ----------
+    seed : int, optional
+        The generation seed of the wrapped network, if it has one.
+    '''
+
+    def __init__(self, network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork], graph: Callable):
+        self.network = network
+        self.graph = graph
+        self.seed = getattr(network, 'seed', None)
+        self.batched = isinstance(network, BatchedFeedForwardNetwork)
+
+        if self.batched:
+            self.weights = tuple(weight.detach() for weight in network.weights)
+            self.biases = tuple(bias.detach() for bias in network.biases)
+        else:
+            self.weights = tuple(layer.weight.detach().t() for layer in network.layers)
+            self.biases = tuple(layer.bias.detach() for layer in network.layers)
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        return self.inference(x)
+
+    def inference(self, x: torch.Tensor, chunk_rows: int = DEFAULT_CHUNK_ROWS, out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        '''
+        Evaluate the network in chunks of pixels, so the working set of the graph stays in cache.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            The input tensor, shaped as for the wrapped network's `inference`.
+        chunk_rows : int, optional
+            The number of pixels evaluated by one call of the graph.
+        out : torch.Tensor, optional
+            A preallocated output tensor.
+
+        Returns
+        -------
+        torch.Tensor
+            The output of the network.
+        '''
+        if self.batched and x.dim() == 2:
+            x = x.unsqueeze(0).expand(self.network.n_networks, -1, -1)
+
+        pixel_dimension = 1 if self.batched else 0
+        n_pixels = x.size(pixel_dimension)
+
+        with torch.no_grad():
+            if n_pixels <= chunk_rows and out is None:
+                return self.graph(x, self.weights, self.biases)
+
+            if out is None:
+                shape = list(x.shape)
+                shape[-1] = self.weights[-1].size(-1)
+                out = torch.empty(shape, dtype=x.dtype, device=x.device)
+
+            for start in range(0, n_pixels, chunk_rows):
+                end = min(start + chunk_rows, n_pixels)
+                out.narrow(pixel_dimension, start, end - start).copy_(
+                    self.graph(x.narrow(pixel_dimension, start, end - start), self.weights, self.biases))
+
+        return out
+
+
+class CompiledNetworkCache:
+    '''
+    A process-wide LRU cache of compiled forward graphs, keyed by network architecture.
+
+    Only a handful of architectures occur in practice, so the graphs are traced once per layer shapes,
+    activation function and batching, with the layer loop unrolled. The weights are inputs of the
+    graph, which lets every network of an architecture reuse it without recompiling.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        The maximum number of cached graphs.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups that compiled a new graph.
+    compile_seconds : float
+        Total time spent compiling graphs.
+    '''
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compile_seconds = 0.0
+
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def wrap(self, network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork]) -> CompiledNetwork:
+        '''
+        Wrap a network so it is evaluated through the compiled graph of its architecture.
+
+        Parameters
+        ----------
+        network : FeedForwardNetwork or BatchedFeedForwardNetwork
+            The network to wrap.
+
+        Returns
+        -------
+        CompiledNetwork
+            The wrapped network, compiling its graph on a cache miss.
+        '''
+        if isinstance(network, BatchedFeedForwardNetwork):
+            shapes = tuple(tuple(weight.shape[1:]) for weight in network.weights)
+            batched = True
+        else:
+            shapes = tuple(tuple(layer.weight.shape[::-1]) for layer in network.layers)
+            batched = False
+
+        return CompiledNetwork(network, self._get(shapes, network.activation_name, batched))
+
+    def warmup(self, layers_dimensions: Iterable[List[int]], activations: Iterable[str] = ACTIVATION_FUNCTIONS,
+               out_nodes: Iterable[int] = (1, 2, 3, 4, 5), in_features: Iterable[int] = (5, 3), batched: bool = True) -> int:
+        '''
+        Compile the graphs of the given architectures ahead of the first request.
+
+        Parameters
+        ----------
+        layers_dimensions : Iterable[List[int]]
+            The hidden layer dimensions of each architecture.
+        activations : Iterable[str], optional
+            The activation functions to compile each architecture with.
+        out_nodes : Iterable[int], optional
+            The output widths to compile each architecture with.
+        in_features : Iterable[int], optional
+            The input widths to compile each architecture with. Defaults to the full input and the input
+            without the z1 and z2 columns, which are folded into the first layer when trig is disabled.
+        batched : bool, optional
+            Compile the graphs of batched networks if True, of single networks otherwise. Default is True.
+
+        Returns
+        -------
+        int
+            The number of graphs compiled.
+        '''
+        misses = self.misses
+        activations = list(activations)
+        out_nodes = list(out_nodes)
+        in_features = list(in_features)
+
+        for dimensions in layers_dimensions:
+            for features in in_features:
+                layer_dimensions = [features] + list(dimensions)
+                for nodes in out_nodes:
+                    shapes = tuple(zip(layer_dimensions, layer_dimensions[1:] + [nodes]))
+                    for activation in activations:
+                        self._get(shapes, activation, batched)
+
+        return self.misses - misses
+
+    def clear(self):
+        '''
+        Drop every cached graph. The counters are kept.
+        '''
+        with self._lock:
+            self._graphs.clear()
+
+    def stats(self) -> dict:
+        '''
+        Report the cache counters and current size.
+
+        Returns
+        -------
+        dict
+            The hits, misses, evictions, number of entries, hit rate and total compile time of the cache.
+        '''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._graphs),
+                'max_entries': self.max_entries,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'compile_seconds': self.compile_seconds
+            }
+
+    def _get(self, shapes: tuple, activation: str, batched: bool) -> Callable:
+        key = (shapes, activation, batched)
+
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return graph
+
+            self.misses += 1
+
+        start_time = time.perf_counter()
+        graph = self._compile(shapes, activation, batched)
+        compile_seconds = time.perf_counter() - start_time
+
+        with self._lock:
+            self.compile_seconds += compile_seconds
+            self._graphs[key] = graph
+
+            while len(self._graphs) > self.max_entries:
+                self._graphs.popitem(last=False)
+                self.evictions += 1
+
+        return graph
+
+    def _compile(self, shapes: tuple, activation: str, batched: bool) -> Callable:
+        # the traced graph only records the operations, so it accepts any number of pixels and networks
+        batch = (2,) if batched else ()
+        example_input = torch.zeros(batch + (8, shapes[0][0]))
+        example_weights = tuple(torch.zeros(batch + shape) for shape in shapes)
+        example_biases = tuple(torch.zeros(batch + ((1,) if batched else ()) + (shape[1],)) for shape in shapes)
+
+        with torch.no_grad():
+            return torch.jit.trace(unrolled_forward(activation, len(shapes), batched),
+                                   (example_input, example_weights, example_biases), check_trace=False)
+
+
+compiled_networks = CompiledNetworkCache(int(os.environ.get('COMPILED_NETWORK_CACHE_SIZE') or DEFAULT_MAX_ENTRIES))
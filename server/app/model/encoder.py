@@ -0,0 +1,149 @@
+import cv2
+import math
+import numpy as np
+import threading
+import torch
+from typing import List, Optional
+from app.model.generator import quantize_image
+
+# file extension, content type, quality/compression flag and alpha support of each supported encoding
+ENCODINGS = {
+    'png': ('.png', 'image/png', cv2.IMWRITE_PNG_COMPRESSION, True),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY, True),
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY, False)
+}
+
+# buffers larger than a 1024x1024 RGBA image are freed after use rather than kept by every rendering thread
+DEFAULT_MAX_RETAINED_BYTES = 4 * 1024 ** 2
+
+
+class ImageEncoder:
+    '''
+    Quantize rendered images once into reusable uint8 buffers and encode them once.
+
+    Encodings without an alpha channel (JPEG) get images with alpha flattened over black, i.e. each
+    color scaled by its alpha, rather than the alpha channel silently dropped.
+
+    Parameters
+    ----------
+    file_format : str, optional
+        The encoding to use ('png', 'webp', 'jpeg'). Default is 'png'.
+    level : int, optional
+        The PNG compression level (0 to 9) or the WebP/JPEG quality (0 to 100). Uses the OpenCV default if None.
+    max_retained_bytes : int, optional
+        The largest total size of the buffers a thread keeps for reuse. Larger buffers are allocated for a
+        single use.
+
+    Attributes
+    ----------
+    extension : str
+        The file extension of encoded images, including the dot.
+    content_type : str
+        The MIME type of encoded images.
+    supports_alpha : bool
+        Whether encoded images keep their alpha channel.
+    '''
+
+    def __init__(self, file_format: str = 'png', level: Optional[int] = None, max_retained_bytes: int = DEFAULT_MAX_RETAINED_BYTES):
+        file_format = file_format.lower()
+        if file_format not in ENCODINGS:
+            raise ValueError(f'Non-supported encoding {file_format}')
+
+        self.file_format = file_format
+        self.extension, self.content_type, level_flag, self.supports_alpha = ENCODINGS[file_format]
+        self.parameters = [level_flag, int(level)] if level is not None else []
+        self.max_retained_bytes = max_retained_bytes
+
+        self._local = threading.local()
+
+    def buffers(self, count: int, shape: tuple) -> List[torch.Tensor]:
+        '''
+        Return uint8 buffers owned by the calling thread, reallocating them only when the shape changes.
+
+        A buffer is reused by the next render of the same thread, so its contents must be encoded before then.
+        Buffers totalling more than `max_retained_bytes` are not kept, so a thread never holds on to the
+        memory of its largest render.
+
+        Parameters
+        ----------
+        count : int
+            The number of buffers needed.
+        shape : tuple
+            The shape of each buffer.
+
+        Returns
+        -------
+        List[torch.Tensor]
+            The uint8 buffers.
+        '''
+        buffers = getattr(self._local, 'buffers', [])
+        if len(buffers) < count or (buffers and tuple(buffers[0].shape) != tuple(shape)):
+            buffers = [torch.empty(shape, dtype=torch.uint8) for _ in range(count)]
+            if count * math.prod(shape) > self.max_retained_bytes:
+                return buffers
+
+            self._local.buffers = buffers
+
+        return buffers[:count]
+
+    def quantize(self, image: torch.Tensor) -> np.ndarray:
+        '''
+        Quantize an image to 8 bits per channel, reusing a thread-local buffer for floating point images.
+
+        Parameters
+        ----------
+        image : torch.Tensor
+            The image tensor, either floating point in [0, 1] or already quantized to uint8.
+
+        Returns
+        -------
+        np.ndarray
+            The uint8 image array.
+        '''
+        if image.dtype != torch.uint8:
+            image = quantize_image(image, out=self.buffers(1, tuple(image.shape))[0])
+
+        return image.numpy()
+
+    def encode(self, image: torch.Tensor) -> np.ndarray:
+        '''
+        Encode an image.
+
+        Parameters
+        ----------
+        image : torch.Tensor
+            The image tensor, either floating point in [0, 1] or already quantized to uint8.
+
+        Returns
+        -------
+        np.ndarray
+            The encoded image as a one-dimensional uint8 array.
+        '''
+        image = self.quantize(image)
+        if not self.supports_alpha and image.ndim == 3 and image.shape[2] == 4:
+            image = flatten_alpha(image)
+
+        _, buffer = cv2.imencode(self.extension, image, self.parameters)
+        return buffer
+
+
+def flatten_alpha(image: np.ndarray) -> np.ndarray:
+    '''
+    Composite a 4-channel uint8 image over black, scaling each color by its alpha with rounding.
+
+    Parameters
+    ----------
+    image : np.ndarray
+        The (height, width, 4) uint8 image, with the alpha channel last.
+
+    Returns
+    -------
+    np.ndarray
+        The (height, width, 3) uint8 image.
+    '''
+    color = image[..., :3].astype(np.uint16)
+    color *= image[..., 3:]
+    color += 127
+    color //= 255
+
+    return color.astype(np.uint8)
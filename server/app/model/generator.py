@@ -1,8 +1,15 @@
 import cv2
 import numpy as np
 import torch
-from app.model.neural_network import FeedForwardNetwork
-from app.model.helper import hsl_to_rgb_torch, hsv_to_rgb_torch
+from typing import List, Optional, Sequence, Union
+from app.model.neural_network import BatchedFeedForwardNetwork, FeedForwardNetwork
+from app.model.arrays import ARRAY_FORMATS, open_array, write_array
+from app.model.color import RGBA_CHANNELS, quantize_colors, transform_colors
+from app.model.compiled import CompiledNetworkCache
+from app.model.precision import precision_error, reduced_precision
+from app.model.grid import INPUT_COLUMNS, constant_columns, grid_cache
+from app.model.helper import NOISE_STREAM, create_generator
+from app.metrics import timed
 
 
 def process_xy_meshgrid(x_values: np.ndarray, y_values: np.ndarray, symmetry: bool, trig: bool, z1: float, z2: float) -> torch.Tensor:
@@ -51,9 +58,42 @@ def process_xy_meshgrid(x_values: np.ndarray, y_values: np.ndarray, symmetry: bo
     return torch.from_numpy(np.concatenate([_x, _y, _radius, _z1, _z2], axis=1)).float()
 
 
-def init_data(image_height: int = 512, image_width: int = 512, symmetry: bool = False, trig: bool = True, z1: float = -0.618, z2: float = 0.618, noise: bool = False, noise_std: float = 0.01):
+def gaussian_noise(rows: int, columns: int, channels: int, noise_std: float, generator: Optional[torch.Generator] = None) -> torch.Tensor:
     '''
-    Initialize data for the neural network by creating a meshgrid and processing it.
+    Draw Gaussian noise for a band of image rows.
+
+    The noise is drawn one row at a time, so the values of a row only depend on the generator state
+    and not on how many rows are drawn together.
+
+    Parameters
+    ----------
+    rows : int
+        The number of image rows.
+    columns : int
+        The number of pixels per row.
+    channels : int
+        The number of values per pixel.
+    noise_std : float
+        Standard deviation of the Gaussian noise.
+    generator : torch.Generator, optional
+        The generator to draw the noise from. Uses the global torch generator if None.
+
+    Returns
+    -------
+    torch.Tensor
+        A (rows * columns, channels) noise tensor.
+    '''
+    noise = torch.empty(rows, columns, channels)
+    for row in noise:
+        row.normal_(0.0, noise_std, generator=generator)
+
+    return noise.view(rows * columns, channels)
+
+
+def init_data(image_height: int = 512, image_width: int = 512, symmetry: bool = False, trig: bool = True, z1: float = -0.618, z2: float = 0.618, noise: bool = False, noise_std: float = 0.01,
+              generator: Optional[torch.Generator] = None, row_start: int = 0, row_end: Optional[int] = None, columns: Sequence[int] = INPUT_COLUMNS):
+    '''
+    Initialize data for the neural network from the cached coordinate grid.
 
     Parameters
     ----------
@@ -73,74 +113,377 @@ def init_data(image_height: int = 512, image_width: int = 512, symmetry: bool =
         Add Gaussian noise if True.
     noise_std : float, optional
         Standard deviation of the Gaussian noise.
+    generator : torch.Generator, optional
+        The generator to draw the noise from. Uses the global torch generator if None.
+    row_start : int, optional
+        The first image row to initialize. Default is 0.
+    row_end : int, optional
+        The image row to stop at (exclusive). Defaults to the image height.
+    columns : Sequence[int], optional
+        The input columns to initialize, in order. Defaults to all five.
 
     Returns
     -------
     torch.Tensor
-        The initialized data as a tensor.
+        The initialized data as a tensor, with one line per pixel of the requested rows. Without noise,
+        the tensor is shared through the grid cache and must not be modified in place.
     '''
-    factor = min(image_height, image_width)
-
-    x = [(i / factor - 0.5) * 2 for i in range(image_height)]
-    y = [(j / factor - 0.5) * 2 for j in range(image_width)]
+    if row_end is None:
+        row_end = image_height
 
-    xv, yv = np.meshgrid(x, y)
-    processed_data = process_xy_meshgrid(xv, yv, symmetry, trig, z1, z2)
+    processed_data = grid_cache.get(image_height, image_width, symmetry, trig, z1, z2, row_start, row_end, columns)
 
     if noise:
-        processed_data += torch.randn_like(processed_data) * noise_std
+        processed_data = processed_data + gaussian_noise(row_end - row_start, image_width, processed_data.size(-1), noise_std, generator)
 
     return processed_data
 
 
-def transform_colors(image: torch.Tensor, color_mode: str, alpha: bool) -> torch.Tensor:
+def quantize_image(image: torch.Tensor, out: Optional[torch.Tensor] = None) -> torch.Tensor:
     '''
-    Transform the colors of an image based on the specified color mode and alpha channel inclusion.
+    Clip an image to [0, 1] and quantize it to 8 bits per channel.
 
     Parameters
     ----------
     image : torch.Tensor
-        The image tensor to transform.
+        The floating point image tensor.
+    out : torch.Tensor, optional
+        A uint8 tensor of the same shape to write the result into.
+
+    Returns
+    -------
+    torch.Tensor
+        The quantized uint8 image tensor.
+    '''
+    scaled = image.clamp(0, 1).mul_(255)
+
+    if out is None:
+        return scaled.to(torch.uint8)
+
+    return out.copy_(scaled)
+
+
+def n_output_channels(channels: Sequence[Optional[int]]) -> int:
+    '''
+    Count the channels of an image laid out with the given channel positions.
+
+    Parameters
+    ----------
+    channels : Sequence[Optional[int]]
+        The positions of the red, green, blue and alpha channels, None for a dropped channel.
+
+    Returns
+    -------
+    int
+        The number of channels kept.
+    '''
+    return sum(position is not None for position in channels)
+
+
+def fold_constant_inputs(network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork], image_height: int, image_width: int,
+                         symmetry: bool, trig: bool, z1: float, z2: float) -> tuple[Union[FeedForwardNetwork, BatchedFeedForwardNetwork], tuple]:
+    '''
+    Fold the input columns that are constant over an image into the network's first layer.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork or BatchedFeedForwardNetwork
+        The network, or batched networks, to fold the constant columns into.
+    image_height : int
+        The height of the image.
+    image_width : int
+        The width of the image.
+    symmetry : bool
+        Apply symmetry by squaring the coordinates if True.
+    trig : bool
+        Apply trigonometric transformation using z1 and z2 as factors if True.
+    z1 : float
+        The z1 factor for cosine or constant multiplication.
+    z2 : float
+        The z2 factor for sine or constant multiplication.
+
+    Returns
+    -------
+    tuple
+        The folded network and the input columns it takes, in order.
+    '''
+    constants = constant_columns(image_height, image_width, symmetry, trig, z1, z2)
+    return (network.fold_constant_inputs(constants), tuple(column for column in INPUT_COLUMNS if column not in constants))
+
+
+def evaluated_network(network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork], precision: str = 'float32', use_gpu: bool = False,
+                      network_cache: Optional[CompiledNetworkCache] = None):
+    '''
+    Select how a network is evaluated: in reduced precision, through a compiled graph, or eagerly.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork or BatchedFeedForwardNetwork
+        The network, or batched networks, to evaluate.
+    precision : str, optional
+        The precision of the evaluation ('float32', 'bfloat16', 'float16', 'int8'). Default is 'float32'.
+    use_gpu : bool, optional
+        Whether the network is evaluated on a GPU. Default is False.
+    network_cache : CompiledNetworkCache, optional
+        The cache of compiled graphs to evaluate float32 networks with.
+
+    Returns
+    -------
+    FeedForwardNetwork or BatchedFeedForwardNetwork or CompiledNetwork or ReducedPrecisionNetwork
+        The object whose `inference` method evaluates the network.
+    '''
+    if precision != 'float32':
+        if use_gpu:
+            raise ValueError(f'Precision {precision} is only supported on the CPU')
+
+        return reduced_precision(network, precision)
+
+    if network_cache is not None:
+        return network_cache.wrap(network)
+
+    return network
+
+
+def check_precision(network: FeedForwardNetwork, precision: str, image_height: int = 256, image_width: int = 256,
+                    tolerance: int = 2, **kwargs) -> dict:
+    '''
+    Render an image in a reduced precision and in float32, and report the error after uint8 quantization.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork
+        The neural network model used to generate the image.
+    precision : str
+        The precision mode to check ('float32', 'bfloat16', 'float16', 'int8').
+    image_height : int, optional
+        The height of the checked image in pixels. Default is 256.
+    image_width : int, optional
+        The width of the checked image in pixels. Default is 256.
+    tolerance : int, optional
+        The largest per-channel error, in uint8 levels, still considered visually lossless. Default is 2.
+    **kwargs
+        Any other `create_image` parameter.
+
+    Returns
+    -------
+    dict
+        The per-channel error report of `precision_error`.
+    '''
+    kwargs.update(save=False, tile_rows=kwargs.get('tile_rows') or image_height)
+
+    reference = create_image(network, image_height, image_width, **kwargs)
+    image = create_image(network, image_height, image_width, precision=precision, **kwargs)
+
+    return precision_error(reference, image, tolerance)
+
+
+def render_tiles(network: FeedForwardNetwork,
+                 image_height: int,
+                 image_width: int,
+                 symmetry: bool,
+                 trig: bool,
+                 color_mode: str,
+                 alpha: bool,
+                 z1: float,
+                 z2: float,
+                 tile_rows: int,
+                 use_gpu: bool = False,
+                 with_noise: bool = False,
+                 noise_std: float = 0.01,
+                 generator: Optional[torch.Generator] = None,
+                 out: Optional[torch.Tensor] = None,
+                 columns: Sequence[int] = INPUT_COLUMNS,
+                 channels: Sequence[Optional[int]] = RGBA_CHANNELS) -> torch.Tensor:
+    '''
+    Render an image one band of rows at a time into a preallocated uint8 buffer.
+
+    Coordinates, network evaluation, color transformation and quantization are all done per band,
+    so peak memory scales with `tile_rows * image_width` instead of the image size.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork
+        The neural network model used to generate the image.
+    image_height : int
+        The height of the output image in pixels.
+    image_width : int
+        The width of the output image in pixels.
+    symmetry : bool
+        Whether to apply symmetry in the generation process.
+    trig : bool
+        Whether to use trigonometric functions in the input data initialization.
     color_mode : str
-        The color mode to use for transformation ('rgb', 'bw', 'cmyk', 'hsv', 'hsl').
+        The color mode to apply to the generated image ('rgb', 'bw', 'cmyk', 'hsv', 'hsl').
     alpha : bool
-        Include an alpha channel in the output if True.
+        Include an alpha channel in the output image.
+    z1 : float
+        First latent variable for input data initialization.
+    z2 : float
+        Second latent variable for input data initialization.
+    tile_rows : int
+        The number of image rows rendered per band.
+    use_gpu : bool, optional
+        Whether to perform computation on a GPU. Default is False.
+    with_noise : bool, optional
+        Whether to add noise to the input data. Default is False.
+    noise_std : float, optional
+        Standard deviation of the noise added to the input data if 'with_noise' is True. Default is 0.01.
+    generator : torch.Generator, optional
+        The generator to draw the noise from.
+    out : torch.Tensor, optional
+        A preallocated (image_height, image_width, n_channels) uint8 tensor to render into.
+    columns : Sequence[int], optional
+        The input columns the network takes, in order. Defaults to all five.
+    channels : Sequence[Optional[int]], optional
+        The positions of the red, green, blue and alpha channels in the image, None to drop a channel.
+        Defaults to RGBA.
 
     Returns
     -------
     torch.Tensor
-        The color-transformed image tensor.
+        The (image_height, image_width, n_channels) uint8 image tensor.
     '''
-    if alpha:
-        alpha_tensor = image[:, :, -1]
-        alpha_val = 1 - torch.abs(2 * alpha_tensor - 1)
-        alpha_val = 0.25 + 0.75 * alpha_val
-        a = alpha_val.unsqueeze(-1)
-    else:
-        a = torch.ones((image.size(0), image.size(1)),
-                       device=image.device).unsqueeze(-1)
-
-    if color_mode == 'rgb':
-        processed_image = image[:, :, 0:3]
-    elif color_mode == 'bw':
-        processed_image = torch.cat([image[:, :, 0].unsqueeze(-1)] * 3, dim=-1)
-    elif color_mode == 'cmyk':
-        r = (1 - image[:, :, 0]) * image[:, :, 3]
-        g = (1 - image[:, :, 1]) * image[:, :, 3]
-        b = (1 - image[:, :, 2]) * image[:, :, 3]
-        processed_image = torch.stack([r, g, b], dim=-1)
-    elif color_mode == 'hsv':
-        processed_image = hsv_to_rgb_torch(image)
-    elif color_mode == 'hsl':
-        h = image[:, :, 0].flatten()
-        s = image[:, :, 1].flatten()
-        l = image[:, :, 2].flatten()
-        processed_image = hsl_to_rgb_torch(h, s, l).view(image.size(
-            0), image.size(1), 3)
-    else:
-        raise ValueError(f'Non-supported color mode {color_mode}')
+    if tile_rows < 1:
+        raise ValueError(f'Tile rows must be positive, got {tile_rows}')
+
+    image = out if out is not None else torch.empty((image_height, image_width, n_output_channels(channels)), dtype=torch.uint8)
+
+    for row_start in range(0, image_height, tile_rows):
+        row_end = min(row_start + tile_rows, image_height)
+        pixels = (row_end - row_start) * image_width
+
+        with timed('grid', pixels):
+            input_data = init_data(image_height, image_width, symmetry, trig, z1, z2,
+                                   noise=with_noise, noise_std=noise_std, generator=generator,
+                                   row_start=row_start, row_end=row_end, columns=columns)
+
+        with timed('forward', pixels):
+            if use_gpu:
+                input_data = input_data.cuda()
+
+            with torch.no_grad():
+                tile = network.inference(input_data)
+
+            if use_gpu:
+                tile = tile.cpu()
+
+        with timed('color', pixels):
+            quantize_colors(tile.view(row_end - row_start, image_width, tile.size(-1)), color_mode, alpha,
+                            image[row_start:row_end], channels)
+
+    return image
+
+
+def render_symmetric(network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork],
+                     image_height: int,
+                     image_width: int,
+                     trig: bool,
+                     color_mode: str,
+                     alpha: bool,
+                     z1: float,
+                     z2: float,
+                     tile_rows: Optional[int] = None,
+                     use_gpu: bool = False,
+                     out: Optional[List[torch.Tensor]] = None,
+                     columns: Sequence[int] = INPUT_COLUMNS,
+                     channels: Sequence[Optional[int]] = RGBA_CHANNELS) -> List[torch.Tensor]:
+    '''
+    Render symmetric images by evaluating only the rows and columns with unique inputs and mirroring them.
 
-    return torch.cat([processed_image, a], dim=-1)
+    With symmetry and without noise, the inputs of mirrored pixels are identical, so the network is only
+    evaluated on the unique region, about a quarter of the image, and the result is gathered into place.
+    The images are identical to a full evaluation.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork or BatchedFeedForwardNetwork
+        The network, or batched networks, used to generate the images.
+    image_height : int
+        The height of the output images in pixels.
+    image_width : int
+        The width of the output images in pixels.
+    trig : bool
+        Whether to use trigonometric functions in the input data initialization.
+    color_mode : str
+        The color mode to apply to the generated images ('rgb', 'bw', 'cmyk', 'hsv', 'hsl').
+    alpha : bool
+        Include an alpha channel in the output images.
+    z1 : float
+        First latent variable for input data initialization.
+    z2 : float
+        Second latent variable for input data initialization.
+    tile_rows : int, optional
+        Evaluate the unique region in bands of this many rows and quantize the images to uint8. The region is
+        evaluated at once and the images are kept in floating point if None. Default is None.
+    use_gpu : bool, optional
+        Whether to perform computation on a GPU. Default is False.
+    out : List[torch.Tensor], optional
+        Preallocated (image_height, image_width, n_channels) uint8 tensors to render into when rendering in tiles.
+    columns : Sequence[int], optional
+        The input columns the network takes, in order. Defaults to all five.
+    channels : Sequence[Optional[int]], optional
+        The positions of the red, green, blue and alpha channels in quantized images, None to drop a channel.
+        Defaults to RGBA.
+
+    Returns
+    -------
+    List[torch.Tensor]
+        The generated images, one per network.
+    '''
+    with timed('grid', image_height * image_width):
+        input_data, row_index, column_index = grid_cache.get_mirrored(image_height, image_width, trig, z1, z2, columns)
+
+    n_columns = int(column_index.max()) + 1
+    n_rows = input_data.size(0) // n_columns
+
+    quantize = tile_rows is not None
+    if not quantize:
+        tile_rows = n_rows
+    elif tile_rows < 1:
+        raise ValueError(f'Tile rows must be positive, got {tile_rows}')
+
+    regions = None
+    for row_start in range(0, n_rows, tile_rows):
+        row_end = min(row_start + tile_rows, n_rows)
+        pixels = (row_end - row_start) * n_columns
+
+        band = input_data[row_start * n_columns:row_end * n_columns]
+
+        with timed('forward', pixels):
+            if use_gpu:
+                band = band.cuda()
+
+            with torch.no_grad():
+                tiles = network.inference(band)
+
+            if use_gpu:
+                tiles = tiles.cpu()
+
+        if tiles.dim() == 2:
+            tiles = tiles.unsqueeze(0)
+
+        if regions is None:
+            regions = [torch.empty((n_rows, n_columns, n_output_channels(channels)), dtype=torch.uint8) if quantize else None
+                       for _ in tiles]
+
+        for i, tile in enumerate(tiles):
+            with timed('color', pixels):
+                tile = tile.view(row_end - row_start, n_columns, tile.size(-1))
+                if quantize:
+                    quantize_colors(tile, color_mode, alpha, regions[i][row_start:row_end], channels)
+                else:
+                    regions[i] = transform_colors(tile, color_mode, alpha)
+
+    images = []
+    for i, region in enumerate(regions):
+        with timed('mirror', image_height * image_width):
+            rows = region.index_select(0, row_index)
+            if out is not None:
+                images.append(torch.index_select(rows, 1, column_index, out=out[i]))
+            else:
+                images.append(rows.index_select(1, column_index))
+
+    return images
 
 
 def create_image(network: FeedForwardNetwork,
@@ -157,7 +500,14 @@ def create_image(network: FeedForwardNetwork,
                  save: bool = True,
                  use_gpu: bool = False,
                  with_noise: bool = False,
-                 noise_std: float = 0.01) -> torch.Tensor:
+                 noise_std: float = 0.01,
+                 seed: Optional[int] = None,
+                 tile_rows: Optional[int] = None,
+                 out: Optional[torch.Tensor] = None,
+                 network_cache: Optional[CompiledNetworkCache] = None,
+                 fold_constants: bool = True,
+                 precision: str = 'float32',
+                 channels: Sequence[Optional[int]] = RGBA_CHANNELS) -> torch.Tensor:
     '''
     Generate and save an image using a specified neural network model and a set of parameters.
 
@@ -184,7 +534,9 @@ def create_image(network: FeedForwardNetwork,
     filename : str, optional
         The filename to save the generated image. Default is 'image'.
     file_format : str, optional
-        The file format to save the image (e.g., 'png', 'jpg'). Default is 'png'.
+        The file format to save the image (e.g., 'png', 'jpg'), or a raw array format: 'npy' for a uint8
+        array, which a tiled render writes straight into through a memory map, or 'npy-float' for a float32
+        array in [0, 1]. Default is 'png'.
     save : bool, optional
         Whether to save the generated image to disk. Default is True.
     use_gpu : bool, optional
@@ -193,42 +545,325 @@ def create_image(network: FeedForwardNetwork,
         Whether to add noise to the input data. Default is False.
     noise_std : float, optional
         Standard deviation of the noise added to the input data if 'with_noise' is True. Default is 0.01.
+    seed : int, optional
+        The generation seed the noise is drawn from. Defaults to the network's seed, so that the seed and
+        the parameters fully determine the image.
+    tile_rows : int, optional
+        Render the image in bands of this many rows, bounding peak memory by the band size instead of
+        the image size. The full image is rendered at once if None. Default is None.
+    out : torch.Tensor, optional
+        A preallocated (image_height, image_width, n_channels) uint8 tensor to render into when rendering in tiles.
+    network_cache : CompiledNetworkCache, optional
+        Evaluate the network through the cached compiled graph of its architecture. Evaluated eagerly if None.
+    fold_constants : bool, optional
+        Fold the input columns that are constant over the image into the first layer's bias instead of
+        building them, when there is no noise. Default is True.
+    precision : str, optional
+        The precision of the network evaluation ('float32', 'bfloat16', 'float16', 'int8'). Reduced
+        precision modes run on the CPU and bypass the network cache. Default is 'float32'.
+    channels : Sequence[Optional[int]], optional
+        The positions of the red, green, blue and alpha channels when rendering in tiles, None to drop a
+        channel, e.g. `BGR_CHANNELS` to render straight into OpenCV's channel order. Defaults to RGBA.
 
     Returns
     -------
     torch.Tensor
-        A tensor representing the generated image, returned as a NumPy array.
+        A tensor representing the generated image. When rendering in tiles, the image is already
+        clipped and quantized to a uint8 tensor.
 
     Notes
     -----
     This function handles device placement of tensors (CPU/GPU), noise addition, image generation,
     color transformation based on the specified mode, and optionally saves the image to a file.
     '''
-    input_data = init_data(image_height, image_width, symmetry,
-                           trig, z1, z2, noise=with_noise, noise_std=noise_std)
+    if seed is None:
+        seed = network.seed
+
+    generator = create_generator(seed, NOISE_STREAM)
+
+    # a tiled uint8 render is written band by band straight into the mapped file
+    mapped = save and file_format == 'npy' and tile_rows is not None and out is None
+    if mapped:
+        filename = array_filename(filename)
+        out = open_array(filename, (image_height, image_width, n_output_channels(channels)), ARRAY_FORMATS[file_format])
 
     if use_gpu:
-        input_data = input_data.cuda()
         network = network.cuda()
 
-    with torch.no_grad():
-        image = network(input_data)
+    columns = INPUT_COLUMNS
+    if fold_constants and not with_noise:
+        network, columns = fold_constant_inputs(network, image_height, image_width, symmetry, trig, z1, z2)
+
+    network = evaluated_network(network, precision, use_gpu, network_cache)
 
+    if symmetry and not with_noise:
+        image = render_symmetric(network, image_height, image_width, trig, color_mode, alpha, z1, z2,
+                                 tile_rows, use_gpu=use_gpu, out=[out] if out is not None else None, columns=columns,
+                                 channels=channels)[0]
+    elif tile_rows is not None:
+        image = render_tiles(network, image_height, image_width, symmetry, trig, color_mode, alpha, z1, z2,
+                             tile_rows, use_gpu=use_gpu, with_noise=with_noise, noise_std=noise_std, generator=generator, out=out,
+                             columns=columns, channels=channels)
+    else:
+        pixels = image_height * image_width
+
+        with timed('grid', pixels):
+            input_data = init_data(image_height, image_width, symmetry,
+                                   trig, z1, z2, noise=with_noise, noise_std=noise_std,
+                                   generator=generator, columns=columns)
+
+        with timed('forward', pixels):
+            if use_gpu:
+                input_data = input_data.cuda()
+
+            with torch.no_grad():
+                image = network.inference(input_data)
+
+            if use_gpu:
+                image = image.cpu()
+
+        with timed('color', pixels):
+            image = image.view(image_height, image_width, image.size(-1))
+            image = transform_colors(image, color_mode, alpha)
+
+    if save and not mapped:
+        save_image(image, filename, file_format, channels if image.dtype == torch.uint8 else RGBA_CHANNELS)
+
+    return image
+
+
+def create_images(networks: List[FeedForwardNetwork],
+                  image_height: int = 512,
+                  image_width: int = 512,
+                  symmetry: bool = False,
+                  trig: bool = True,
+                  color_mode: str = 'rgb',
+                  alpha: bool = True,
+                  z1: float = -0.618,
+                  z2: float = 0.618,
+                  use_gpu: bool = False,
+                  with_noise: bool = False,
+                  noise_std: float = 0.01,
+                  seeds: Optional[List[int]] = None,
+                  tile_rows: Optional[int] = None,
+                  out: Optional[List[torch.Tensor]] = None,
+                  network_cache: Optional[CompiledNetworkCache] = None,
+                  fold_constants: bool = True,
+                  precision: str = 'float32',
+                  channels: Sequence[Optional[int]] = RGBA_CHANNELS,
+                  batched: bool = False) -> List[torch.Tensor]:
+    '''
+    Generate one image per network.
+
+    By default each network is rendered exactly as a separate `create_image` call with the same
+    parameters, with the same kernels and bands, so an image's pixels depend only on its seed and
+    parameters, never on how many images are rendered with it. The coordinate grid comes from the
+    shared grid cache either way. With `batched`, the networks are instead evaluated together in one
+    batched forward pass, which is faster for many small images, but whose batched products round
+    differently from a single network's in some shapes (single-output layers, which a single network
+    computes as matrix-vector products, and very small products), and so occasionally quantize to a
+    different uint8 level. The server therefore always renders separately; batching is left to the CLI.
+
+    Parameters
+    ----------
+    networks : List[FeedForwardNetwork]
+        The same-shaped neural network models used to generate the images.
+    image_height : int, optional
+        The height of the output images in pixels. Default is 512.
+    image_width : int, optional
+        The width of the output images in pixels. Default is 512.
+    symmetry : bool, optional
+        Whether to apply symmetry in the generation process. Default is False.
+    trig : bool, optional
+        Whether to use trigonometric functions in the input data initialization. Default is True.
+    color_mode : str, optional
+        The color mode to apply to the generated images ('rgb', 'bw', 'cmyk', 'hsv', 'hsl'). Default is 'rgb'.
+    alpha : bool, optional
+        Include an alpha channel in the output images. Default is True.
+    z1 : float, optional
+        First latent variable for input data initialization. Default is -0.618.
+    z2 : float, optional
+        Second latent variable for input data initialization. Default is 0.618.
+    use_gpu : bool, optional
+        Whether to perform computation on a GPU. Default is False.
+    with_noise : bool, optional
+        Whether to add noise to the input data. Default is False.
+    noise_std : float, optional
+        Standard deviation of the noise added to the input data if 'with_noise' is True. Default is 0.01.
+    seeds : List[int], optional
+        The generation seeds the noise of each image is drawn from. Defaults to the networks' seeds.
+    tile_rows : int, optional
+        Render the images in bands of this many rows. The full images are rendered at once if None. Default is None.
+    out : List[torch.Tensor], optional
+        Preallocated (image_height, image_width, n_channels) uint8 tensors to render into when rendering in tiles.
+    network_cache : CompiledNetworkCache, optional
+        Evaluate the networks through the cached compiled graph of their architecture. Evaluated eagerly if None.
+    fold_constants : bool, optional
+        Fold the input columns that are constant over the images into the first layers' biases instead of
+        building them, when there is no noise. Default is True.
+    precision : str, optional
+        The precision of the network evaluation ('float32', 'bfloat16', 'float16', 'int8'). Default is 'float32'.
+    channels : Sequence[Optional[int]], optional
+        The positions of the red, green, blue and alpha channels when rendering in tiles, None to drop a
+        channel. Defaults to RGBA.
+    batched : bool, optional
+        Evaluate the networks together in a batched forward pass, trading bit-identical images for
+        throughput. Default is False.
+
+    Returns
+    -------
+    List[torch.Tensor]
+        The generated images, in the order of the networks. When rendering in tiles, the images are
+        already clipped and quantized to uint8 tensors.
+    '''
+    if seeds is None:
+        seeds = [network.seed for network in networks]
+
+    if not batched:
+        return [create_image(network, image_height, image_width, symmetry, trig, color_mode, alpha, z1, z2, save=False,
+                             use_gpu=use_gpu, with_noise=with_noise, noise_std=noise_std, seed=seed, tile_rows=tile_rows,
+                             out=out[i] if out is not None else None, network_cache=network_cache,
+                             fold_constants=fold_constants, precision=precision, channels=channels)
+                for i, (network, seed) in enumerate(zip(networks, seeds))]
+
+    generators = [create_generator(seed, NOISE_STREAM) for seed in seeds]
+
+    batched_network = BatchedFeedForwardNetwork(networks)
     if use_gpu:
-        image = image.cpu()
+        batched_network = batched_network.cuda()
+
+    columns = INPUT_COLUMNS
+    if fold_constants and not with_noise:
+        batched_network, columns = fold_constant_inputs(batched_network, image_height, image_width, symmetry, trig, z1, z2)
+
+    batched_network = evaluated_network(batched_network, precision, use_gpu, network_cache)
+
+    if symmetry and not with_noise:
+        return render_symmetric(batched_network, image_height, image_width, trig, color_mode, alpha, z1, z2,
+                                tile_rows, use_gpu=use_gpu, out=out, columns=columns, channels=channels)
+
+    quantize = tile_rows is not None
+    if quantize:
+        if tile_rows < 1:
+            raise ValueError(f'Tile rows must be positive, got {tile_rows}')
+
+        images = out if out is not None else [torch.empty((image_height, image_width, n_output_channels(channels)), dtype=torch.uint8)
+                                              for _ in networks]
+    else:
+        tile_rows = image_height
+        images = []
+
+    for row_start in range(0, image_height, tile_rows):
+        row_end = min(row_start + tile_rows, image_height)
+        pixels = (row_end - row_start) * image_width
+
+        with timed('grid', pixels * len(networks)):
+            input_data = init_data(image_height, image_width, symmetry, trig, z1, z2,
+                                   row_start=row_start, row_end=row_end, columns=columns)
+
+            if with_noise:
+                input_data = torch.stack([input_data + gaussian_noise(row_end - row_start, image_width, input_data.size(-1), noise_std, generator)
+                                          for generator in generators])
+
+        with timed('forward', pixels * len(networks)):
+            if use_gpu:
+                input_data = input_data.cuda()
+
+            with torch.no_grad():
+                tiles = batched_network.inference(input_data)
+
+            if use_gpu:
+                tiles = tiles.cpu()
+
+        for i, tile in enumerate(tiles):
+            with timed('color', pixels):
+                tile = tile.view(row_end - row_start, image_width, tile.size(-1))
+                if quantize:
+                    quantize_colors(tile, color_mode, alpha, images[i][row_start:row_end], channels)
+                else:
+                    images.append(transform_colors(tile, color_mode, alpha))
+
+    return images
+
+
+def preview_dimensions(image_height: int, image_width: int, long_side: int = 128) -> tuple[int, int]:
+    '''
+    Compute the size of a preview whose longest side is `long_side`, keeping the image's aspect ratio.
+
+    Parameters
+    ----------
+    image_height : int
+        The height of the full-size image in pixels.
+    image_width : int
+        The width of the full-size image in pixels.
+    long_side : int, optional
+        The length of the preview's longest side in pixels. Default is 128.
 
-    image = image.view(image_height, image_width, image.size(-1))
-    image = transform_colors(image, color_mode, alpha)
+    Returns
+    -------
+    tuple[int, int]
+        The preview height and width. Images already smaller than the preview keep their size.
+    '''
+    scale = min(1.0, long_side / max(image_height, image_width))
+    return (max(1, round(image_height * scale)), max(1, round(image_width * scale)))
 
-    if save:
-        if not filename.endswith(f'.{file_format}'):
-            filename += f'.{file_format}'
 
-        image_np = image.numpy()
+def array_filename(filename: str) -> str:
+    '''
+    Append the `.npy` extension to a filename if it is missing.
 
+    Parameters
+    ----------
+    filename : str
+        The filename of a raw array.
+
+    Returns
+    -------
+    str
+        The filename with its extension.
+    '''
+    return filename if filename.endswith('.npy') else f'{filename}.npy'
+
+
+def save_image(image: torch.Tensor, filename: str, file_format: str = 'png', channels: Sequence[Optional[int]] = RGBA_CHANNELS) -> str:
+    '''
+    Save an RGBA image tensor to disk.
+
+    Parameters
+    ----------
+    image : torch.Tensor
+        The image tensor, either floating point in [0, 1] or already quantized to uint8.
+    filename : str
+        The filename to save the image to. The format extension is appended if missing.
+    file_format : str, optional
+        The file format to save the image (e.g., 'png', 'jpg'), or a raw array format ('npy', 'npy-float'),
+        written as it is laid out in memory. Default is 'png'.
+    channels : Sequence[Optional[int]], optional
+        The channel positions of a uint8 image. Images rendered in RGBA are converted to BGR; images rendered
+        in another order, such as `BGR_CHANNELS`, are taken to be in OpenCV's order and written as they are.
+
+    Returns
+    -------
+    str
+        The filename the image was saved to.
+    '''
+    if file_format in ARRAY_FORMATS:
+        filename = array_filename(filename)
+        write_array(image, open_array(filename, tuple(image.shape), ARRAY_FORMATS[file_format]))
+        return filename
+
+    if not filename.endswith(f'.{file_format}'):
+        filename += f'.{file_format}'
+
+    image_np = image.numpy()
+
+    if image_np.dtype != np.uint8:
         image_np = np.clip(image_np, 0, 1)
         image_np = (image_np * 255).astype(np.uint8)
 
+    if tuple(channels) != RGBA_CHANNELS:
+        cv2.imwrite(filename, image_np)
+    else:
         cv2.imwrite(filename, cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR))
 
-    return image
+    return filename
@@ -0,0 +1,398 @@
+import numpy as np
+import os
+import threading
+import torch
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Sequence
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# the x, y, radius, z1 and z2 columns of the network input
+INPUT_COLUMNS = (0, 1, 2, 3, 4)
+
+
+def grid_axes(image_height: int, image_width: int, symmetry: bool,
+              row_start: int = 0, row_end: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Compute the x coordinates of a band of image rows and the y coordinates of the image columns.
+
+    Parameters
+    ----------
+    image_height : int
+        The height of the image.
+    image_width : int
+        The width of the image.
+    symmetry : bool
+        Apply symmetry by squaring the coordinates if True.
+    row_start : int, optional
+        The first image row of the band. Default is 0.
+    row_end : int, optional
+        The image row to stop at (exclusive). Defaults to the image height.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The float64 x coordinate of each row and y coordinate of each column.
+    '''
+    if row_end is None:
+        row_end = image_height
+
+    factor = min(image_height, image_width)
+
+    x = (np.arange(row_start, row_end, dtype=np.float64) / factor - 0.5) * 2
+    y = (np.arange(image_width, dtype=np.float64) / factor - 0.5) * 2
+
+    if symmetry:
+        x = x ** 2
+        y = y ** 2
+
+    return (x, y)
+
+
+def build_grid(image_height: int, image_width: int, symmetry: bool, trig: bool, z1: float, z2: float,
+               row_start: int = 0, row_end: Optional[int] = None, columns: Sequence[int] = INPUT_COLUMNS) -> torch.Tensor:
+    '''
+    Build the network input grid for a band of image rows directly into a float32 tensor.
+
+    The x, y, z1 and z2 columns only depend on the row or the column of a pixel, so they are computed
+    on the image axes and broadcast into place. Only the radius is computed per pixel. The values are
+    identical to the ones produced by `process_xy_meshgrid`.
+
+    Parameters
+    ----------
+    image_height : int
+        The height of the image.
+    image_width : int
+        The width of the image.
+    symmetry : bool
+        Apply symmetry by squaring the coordinates if True.
+    trig : bool
+        Apply trigonometric transformation using z1 and z2 as factors if True.
+    z1 : float
+        The z1 factor for cosine or constant multiplication.
+    z2 : float
+        The z2 factor for sine or constant multiplication.
+    row_start : int, optional
+        The first image row of the band. Default is 0.
+    row_end : int, optional
+        The image row to stop at (exclusive). Defaults to the image height.
+    columns : Sequence[int], optional
+        The input columns to build, in order. Defaults to all five.
+
+    Returns
+    -------
+    torch.Tensor
+        A ((row_end - row_start) * image_width, len(columns)) tensor with the requested columns among
+        the x, y, radius, z1 and z2 columns.
+    '''
+    x, y = grid_axes(image_height, image_width, symmetry, row_start, row_end)
+
+    grid = np.empty((x.size, image_width, len(columns)), dtype=np.float32)
+    for i, column in enumerate(columns):
+        if column == 0:
+            grid[:, :, i] = x[:, np.newaxis]
+        elif column == 1:
+            grid[:, :, i] = y[np.newaxis, :]
+        elif column == 2:
+            np.sqrt(np.add.outer(x ** 2, y ** 2), out=grid[:, :, i], casting='same_kind')
+        elif column == 3:
+            grid[:, :, i] = np.cos(z1 * x)[:, np.newaxis] if trig else np.float32(z1)
+        elif column == 4:
+            grid[:, :, i] = np.sin(z2 * y)[np.newaxis, :] if trig else np.float32(z2)
+
+    return torch.from_numpy(grid).view(x.size * image_width, len(columns))
+
+
+def constant_columns(image_height: int, image_width: int, symmetry: bool, trig: bool, z1: float, z2: float) -> Dict[int, float]:
+    '''
+    Find the input columns that hold the same value for every pixel of an image.
+
+    The z1 and z2 columns are constant without trig, and any column can be for degenerate sizes or
+    factors (a single row or column, a zero factor). Constant columns can be folded into the first
+    layer's bias instead of being built and multiplied for every pixel.
+
+    Parameters
+    ----------
+    image_height : int
+        The height of the image.
+    image_width : int
+        The width of the image.
+    symmetry : bool
+        Apply symmetry by squaring the coordinates if True.
+    trig : bool
+        Apply trigonometric transformation using z1 and z2 as factors if True.
+    z1 : float
+        The z1 factor for cosine or constant multiplication.
+    z2 : float
+        The z2 factor for sine or constant multiplication.
+
+    Returns
+    -------
+    Dict[int, float]
+        The float32 value of each constant column, by column index.
+    '''
+    x, y = grid_axes(image_height, image_width, symmetry)
+
+    values = {
+        0: x,
+        1: y,
+        3: np.cos(z1 * x) if trig else np.float64(z1),
+        4: np.sin(z2 * y) if trig else np.float64(z2)
+    }
+    # the radius depends on both coordinates, so it is only known to be constant when both are
+    if np.all(x == x[0]) and np.all(y == y[0]):
+        values[2] = np.sqrt(x[:1] ** 2 + y[:1] ** 2)
+
+    constants = {}
+    for column, value in sorted(values.items()):
+        value = np.asarray(value, dtype=np.float32).ravel()
+        if np.all(value == value[0]):
+            constants[column] = float(value[0])
+
+    return constants
+
+
+def _mirror_sources(grid: np.ndarray, factor: int, axis: int) -> np.ndarray:
+    # squared coordinates make line i mirror line factor - i; a pair is only merged when the two lines
+    # of the float32 grid are identical, as rounding breaks the symmetry for some image sizes
+    n_lines = grid.shape[axis]
+    sources = np.arange(n_lines)
+
+    mirrored = np.arange(factor // 2 + 1, min(factor, n_lines - 1) + 1)
+    if mirrored.size:
+        equal = (np.take(grid, mirrored, axis) == np.take(grid, factor - mirrored, axis)).all(axis=(1, 2) if axis == 0 else (0, 2))
+        sources[mirrored[equal]] = factor - mirrored[equal]
+
+    return sources
+
+
+def build_mirrored_grid(image_height: int, image_width: int, trig: bool, z1: float, z2: float,
+                        grid: Optional[torch.Tensor] = None, columns: Sequence[int] = INPUT_COLUMNS) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    '''
+    Build the network input grid of a symmetric image, keeping only the rows and columns whose inputs are unique.
+
+    With symmetry, the inputs of a pixel only depend on the squared coordinates, so most rows and columns
+    have a mirror with identical inputs. Evaluating the unique ones and gathering the result with the
+    returned indices reproduces the full image exactly.
+
+    Parameters
+    ----------
+    image_height : int
+        The height of the image.
+    image_width : int
+        The width of the image.
+    trig : bool
+        Apply trigonometric transformation using z1 and z2 as factors if True.
+    z1 : float
+        The z1 factor for cosine or constant multiplication.
+    z2 : float
+        The z2 factor for sine or constant multiplication.
+    grid : torch.Tensor, optional
+        The full symmetric input grid of the requested columns, if already built.
+    columns : Sequence[int], optional
+        The input columns to build, in order. Defaults to all five.
+
+    Returns
+    -------
+    tuple[torch.Tensor, torch.Tensor, torch.Tensor]
+        The (n_rows * n_columns, len(columns)) grid of the unique rows and columns, and for every image row and column,
+        the index of the unique row or column with the same inputs.
+    '''
+    if grid is None:
+        grid = build_grid(image_height, image_width, True, trig, z1, z2, columns=columns)
+
+    grid = grid.numpy().reshape(image_height, image_width, len(columns))
+    factor = min(image_height, image_width)
+
+    row_sources = _mirror_sources(grid, factor, 0)
+    column_sources = _mirror_sources(grid, factor, 1)
+
+    rows = np.flatnonzero(row_sources == np.arange(image_height))
+    unique_columns = np.flatnonzero(column_sources == np.arange(image_width))
+
+    mirrored_grid = np.ascontiguousarray(grid[rows][:, unique_columns]).reshape(rows.size * unique_columns.size, len(columns))
+
+    return (torch.from_numpy(mirrored_grid),
+            torch.from_numpy(np.searchsorted(rows, row_sources)),
+            torch.from_numpy(np.searchsorted(unique_columns, column_sources)))
+
+
+def _tensors(entry) -> tuple:
+    return entry if isinstance(entry, tuple) else (entry,)
+
+
+def _size(entry) -> int:
+    return sum(tensor.element_size() * tensor.nelement() for tensor in _tensors(entry))
+
+
+def _versions(entry) -> tuple:
+    # torch bumps a tensor's version counter on every in-place operation, through any of its views
+    return tuple(tensor._version for tensor in _tensors(entry))
+
+
+class GridCache:
+    '''
+    A process-wide LRU cache of network input grids, bounded by the total size of the cached tensors.
+
+    Grids only depend on the image size, the band and the coordinate transformations, so they can be
+    shared between renders. Returned tensors are shared with the cache and must not be modified in place;
+    a grid that was modified anyway is detected on its next lookup and rebuilt, so the change never reaches
+    another render.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        The maximum total size of the cached grids, in bytes.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups that built a new grid.
+    evictions : int
+        Number of grids evicted to stay under the size bound.
+    '''
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._grids = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, image_height: int, image_width: int, symmetry: bool, trig: bool, z1: float, z2: float,
+            row_start: int = 0, row_end: Optional[int] = None, columns: Sequence[int] = INPUT_COLUMNS) -> torch.Tensor:
+        '''
+        Return the input grid for a band of image rows, building and caching it on a miss.
+
+        Parameters
+        ----------
+        image_height : int
+            The height of the image.
+        image_width : int
+            The width of the image.
+        symmetry : bool
+            Apply symmetry by squaring the coordinates if True.
+        trig : bool
+            Apply trigonometric transformation using z1 and z2 as factors if True.
+        z1 : float
+            The z1 factor for cosine or constant multiplication.
+        z2 : float
+            The z2 factor for sine or constant multiplication.
+        row_start : int, optional
+            The first image row of the band. Default is 0.
+        row_end : int, optional
+            The image row to stop at (exclusive). Defaults to the image height.
+        columns : Sequence[int], optional
+            The input columns to build, in order. Defaults to all five.
+
+        Returns
+        -------
+        torch.Tensor
+            The shared, read-only input grid.
+        '''
+        if row_end is None:
+            row_end = image_height
+
+        columns = tuple(columns)
+        key = (image_height, image_width, bool(symmetry), bool(trig), float(z1), float(z2), row_start, row_end, columns)
+
+        return self._get_or_build(key, lambda: build_grid(image_height, image_width, symmetry, trig, z1, z2, row_start, row_end, columns))
+
+    def get_mirrored(self, image_height: int, image_width: int, trig: bool, z1: float, z2: float,
+                     columns: Sequence[int] = INPUT_COLUMNS) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        '''
+        Return the unique rows and columns of a symmetric input grid, building and caching them on a miss.
+
+        Parameters
+        ----------
+        image_height : int
+            The height of the image.
+        image_width : int
+            The width of the image.
+        trig : bool
+            Apply trigonometric transformation using z1 and z2 as factors if True.
+        z1 : float
+            The z1 factor for cosine or constant multiplication.
+        z2 : float
+            The z2 factor for sine or constant multiplication.
+        columns : Sequence[int], optional
+            The input columns to build, in order. Defaults to all five.
+
+        Returns
+        -------
+        tuple[torch.Tensor, torch.Tensor, torch.Tensor]
+            The shared, read-only result of `build_mirrored_grid`.
+        '''
+        columns = tuple(columns)
+        key = ('mirrored', image_height, image_width, bool(trig), float(z1), float(z2), columns)
+
+        # the omitted columns are constant, so they cannot make mirrored lines differ
+        return self._get_or_build(key, lambda: build_mirrored_grid(
+            image_height, image_width, trig, z1, z2, self.get(image_height, image_width, True, trig, z1, z2, columns=columns), columns))
+
+    def _get_or_build(self, key: tuple, build: Callable):
+        with self._lock:
+            cached = self._grids.get(key)
+            if cached is not None and _versions(cached[0]) != cached[1]:
+                del self._grids[key]
+                self._bytes -= _size(cached[0])
+                cached = None
+
+            if cached is not None:
+                self._grids.move_to_end(key)
+                self.hits += 1
+                return cached[0]
+
+            self.misses += 1
+
+        entry = build()
+        size = _size(entry)
+
+        with self._lock:
+            if size > self.max_bytes or key in self._grids:
+                return entry
+
+            self._grids[key] = (entry, _versions(entry))
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._grids.popitem(last=False)
+                self._bytes -= _size(evicted)
+                self.evictions += 1
+
+        return entry
+
+    def clear(self):
+        '''
+        Drop every cached grid. The counters are kept.
+        '''
+        with self._lock:
+            self._grids.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        '''
+        Report the cache counters and current size.
+
+        Returns
+        -------
+        dict
+            The hits, misses, evictions, number of entries and total bytes of the cache.
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._grids),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+grid_cache = GridCache(int(os.environ.get('GRID_CACHE_MAX_BYTES') or DEFAULT_MAX_BYTES))
@@ -1,5 +1,46 @@
 import numpy as np
+import secrets
 import torch
+from app.model import color
+
+# independent random streams derived from a single generation seed
+WEIGHTS_STREAM = 0
+NOISE_STREAM = 1
+
+
+def random_seed() -> int:
+    '''
+    Draw a fresh generation seed.
+
+    Seeds are kept to 32 bits so that they survive a round trip through JSON clients.
+
+    Returns
+    -------
+    int
+        A random non-negative seed.
+    '''
+    return secrets.randbits(32)
+
+
+def create_generator(seed: int, stream: int = WEIGHTS_STREAM) -> torch.Generator:
+    '''
+    Create a private random number generator for one stream of a generation seed.
+
+    Parameters
+    ----------
+    seed : int
+        The generation seed.
+    stream : int, optional
+        The stream identifier (e.g. weights or noise), so that streams of the same seed don't overlap.
+
+    Returns
+    -------
+    torch.Generator
+        A CPU generator seeded deterministically from the seed and stream.
+    '''
+    generator = torch.Generator()
+    generator.manual_seed((seed * 0x9E3779B97F4A7C15 + stream) % 2 ** 64)
+    return generator
 
 
 def hsv_to_rgb(hue: float, saturation: float, value: float) -> tuple:
@@ -49,26 +90,7 @@ def hsv_to_rgb_torch(image: torch.Tensor) -> torch.Tensor:
     torch.Tensor
         The image tensor in RGB format.
     '''
-    _h = image[:, :, 0].flatten().detach().numpy()
-    _s = image[:, :, 1].flatten().detach().numpy()
-    _v = image[:, :, 2].flatten().detach().numpy()
-
-    h = 6 * _h
-    i = np.floor(h)
-    f = h - i
-    p = _v * (1 - _s)
-    q = _v * (1 - f * _s)
-    t = _v * (1 - (1 - f) * _s)
-
-    mod = [int(a % 6) for a in i]
-    r_select = torch.tensor([[_v[i], q[i], p[i], p[i], t[i], _v[i]][m] for i, m in enumerate(
-        mod)]).view(image.size(0), image.size(1)).unsqueeze(-1)
-    g_select = torch.tensor([[t[i], _v[i], _v[i], q[i], p[i], p[i]][m] for i, m in enumerate(
-        mod)]).view(image.size(0), image.size(1)).unsqueeze(-1)
-    b_select = torch.tensor([[p[i], p[i], t[i], _v[i], _v[i], q[i]][m] for i, m in enumerate(
-        mod)]).view(image.size(0), image.size(1)).unsqueeze(-1)
-
-    return torch.cat([r_select, g_select, b_select], dim=-1)
+    return color.hsv_to_rgb(image[:, :, 0], image[:, :, 1], image[:, :, 2])
 
 
 def hsl_to_rgb_torch(h: torch.Tensor, s: torch.Tensor, l: torch.Tensor) -> torch.Tensor:
@@ -89,37 +111,4 @@ def hsl_to_rgb_torch(h: torch.Tensor, s: torch.Tensor, l: torch.Tensor) -> torch
     torch.Tensor
         The image tensor in RGB format.
     '''
-    c = (1 - torch.abs(2 * l - 1)) * s
-    x = c * (1 - torch.abs((h * 6) % 2 - 1))
-    m = l - c / 2
-
-    r = torch.zeros_like(h)
-    g = torch.zeros_like(h)
-    b = torch.zeros_like(h)
-
-    # red dominant segment segment
-    mask = (0 <= h) & (h < 1/6)
-    r[mask], g[mask], b[mask] = c[mask] + m[mask], x[mask] + m[mask], m[mask]
-
-    # yellow dominant segment
-    mask = (1/6 <= h) & (h < 1/3)
-    r[mask], g[mask], b[mask] = x[mask] + m[mask], c[mask] + m[mask], m[mask]
-
-    # green dominant segment
-    mask = (1/3 <= h) & (h < 1/2)
-    r[mask], g[mask], b[mask] = m[mask], c[mask] + m[mask], x[mask] + m[mask]
-
-    # cyan dominant segment
-    mask = (1/2 <= h) & (h < 2/3)
-    r[mask], g[mask], b[mask] = m[mask], x[mask] + m[mask], c[mask] + m[mask]
-
-    # blue dominant segment
-    mask = (2/3 <= h) & (h < 5/6)
-    r[mask], g[mask], b[mask] = x[mask] + m[mask], m[mask], c[mask] + m[mask]
-
-    # magenta dominant segment
-    mask = (5/6 <= h) & (h < 1)
-    r[mask], g[mask], b[mask] = c[mask] + m[mask], m[mask], x[mask] + m[mask]
-
-    rgb = torch.stack((r, g, b), dim=-1)
-    return rgb
+    return color.hsl_to_rgb(h, s, l)
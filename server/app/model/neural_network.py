@@ -1,9 +1,19 @@
+import threading
 import torch
 import torch.nn as nn
-from typing import List
+from functools import partial
+from typing import Dict, List, Optional
+from app.model.helper import create_generator, random_seed
 
+# pixels per chunk of the chunked inference; two chunks of ten float32 features fit in a typical L2 cache
+DEFAULT_CHUNK_ROWS = 8192
 
-def init_normal_weights(module: nn.Module):
+ACTIVATION_FUNCTIONS = ['tanh', 'sigmoid', 'relu', 'softsign', 'sin', 'cos']
+
+_buffers = threading.local()
+
+
+def init_normal_weights(module: nn.Module, generator: Optional[torch.Generator] = None):
     '''
     Initializes the weights of the module to a normal distribution.
 
@@ -14,6 +24,8 @@ def init_normal_weights(module: nn.Module):
     ----------
     module : nn.Module
         The neural network module whose weights and biases are to be initialized.
+    generator : torch.Generator, optional
+        The generator to draw the weights from. Uses the global torch generator if None.
 
     Returns
     -------
@@ -21,8 +33,8 @@ def init_normal_weights(module: nn.Module):
     '''
     classname = module.__class__.__name__
     if classname.find('Linear') != -1:
-        module.weight.data.normal_(0.0, 1.0)
-        module.bias.data.normal_(0.0, 0.1)
+        module.weight.data.normal_(0.0, 1.0, generator=generator)
+        module.bias.data.normal_(0.0, 0.1, generator=generator)
     return None
 
 
@@ -58,6 +70,69 @@ def get_activation_function(function: str):
         return nn.Tanh()
 
 
+def apply_activation_(function: str, x: torch.Tensor, scratch: torch.Tensor) -> torch.Tensor:
+    '''
+    Applies an activation function in place.
+
+    Parameters
+    ----------
+    function : str
+        The name of the activation function, as accepted by `get_activation_function`.
+    x : torch.Tensor
+        The tensor to transform in place.
+    scratch : torch.Tensor
+        A tensor of the same shape as `x` that may be overwritten, used by activations that need a temporary.
+
+    Returns
+    -------
+    torch.Tensor
+        The transformed `x`.
+    '''
+    if function == 'sigmoid':
+        return x.sigmoid_()
+    elif function == 'relu':
+        return x.relu_()
+    elif function == 'softsign':
+        # x / (1 + |x|), computed in the same order as nn.Softsign
+        return x.div_(torch.abs(x, out=scratch).add_(1))
+    elif function == 'sin':
+        return x.sin_()
+    elif function == 'cos':
+        return x.cos_()
+    else:
+        return x.tanh_()
+
+
+def ping_pong_buffers(numel: int, dtype: torch.dtype, device: torch.device) -> tuple[torch.Tensor, torch.Tensor]:
+    '''
+    Returns two flat buffers owned by the calling thread, reallocating them only when they are too small.
+
+    Parameters
+    ----------
+    numel : int
+        The minimum number of elements of each buffer.
+    dtype : torch.dtype
+        The data type of the buffers.
+    device : torch.device
+        The device of the buffers.
+
+    Returns
+    -------
+    tuple[torch.Tensor, torch.Tensor]
+        The two buffers.
+    '''
+    key = (dtype, device)
+    buffers = getattr(_buffers, 'buffers', {})
+
+    pair = buffers.get(key)
+    if pair is None or pair[0].numel() < numel:
+        pair = (torch.empty(numel, dtype=dtype, device=device), torch.empty(numel, dtype=dtype, device=device))
+        buffers[key] = pair
+        _buffers.buffers = buffers
+
+    return pair
+
+
 class FeedForwardNetwork(nn.Module):
     '''
     A feedforward neural network model using PyTorch.
@@ -72,6 +147,8 @@ class FeedForwardNetwork(nn.Module):
         The color mode of the network's output (e.g., 'rgb', 'hsv', 'cmyk', 'bw').
     alpha : bool
         Indicates whether an alpha channel should be included in the output.
+    seed : int, optional
+        The generation seed the weights are drawn from. A random seed is drawn if None.
 
     Attributes
     ----------
@@ -79,13 +156,16 @@ class FeedForwardNetwork(nn.Module):
         A list of linear layers in the network.
     activation : Callable
         The activation function to use between layers.
+    seed : int
+        The generation seed, which together with the network parameters fully determines the weights.
     '''
 
     def __init__(self,
                  layers_dimensions: List[int] = [10, 10, 10, 10, 10],
                  activation_function: str = 'tanh',
                  color_mode: str = 'rgb',
-                 alpha: bool = True):
+                 alpha: bool = True,
+                 seed: Optional[int] = None):
         super(FeedForwardNetwork, self).__init__()
 
         # processing the color_mode and alpha to determine the output nodes
@@ -111,7 +191,10 @@ class FeedForwardNetwork(nn.Module):
                                     )
 
         self.activation = get_activation_function(activation_function)
-        self.apply(init_normal_weights)
+        self.activation_name = activation_function.lower() if activation_function.lower() in ACTIVATION_FUNCTIONS else 'tanh'
+
+        self.seed = seed if seed is not None else random_seed()
+        self.apply(partial(init_normal_weights, generator=create_generator(self.seed)))
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         '''
@@ -136,3 +219,258 @@ class FeedForwardNetwork(nn.Module):
                 out = torch.sigmoid(out)
 
         return out
+
+    def fold_constant_inputs(self, constants: Dict[int, float]) -> 'FeedForwardNetwork':
+        '''
+        Returns a network that takes only the non-constant input columns, with the constant ones folded into the first layer's bias.
+
+        Parameters
+        ----------
+        constants : Dict[int, float]
+            The value of each constant input column, by column index.
+
+        Returns
+        -------
+        FeedForwardNetwork
+            A network sharing every layer but the first, or this network if there is nothing to fold.
+        '''
+        if not constants:
+            return self
+
+        first_layer = self.layers[0]
+        kept = [column for column in range(first_layer.in_features) if column not in constants]
+        folded_columns = sorted(constants)
+
+        with torch.no_grad():
+            weight = first_layer.weight.detach()
+            values = torch.tensor([constants[column] for column in folded_columns], dtype=weight.dtype, device=weight.device)
+
+            folded_layer = nn.utils.skip_init(nn.Linear, len(kept), first_layer.out_features, device=weight.device, dtype=weight.dtype)
+            folded_layer.weight.copy_(weight[:, kept])
+            folded_layer.bias.copy_(first_layer.bias.detach() + weight[:, folded_columns] @ values)
+
+        folded = FeedForwardNetwork.__new__(FeedForwardNetwork)
+        nn.Module.__init__(folded)
+        folded.layers = nn.ModuleList([folded_layer] + list(self.layers[1:]))
+        folded.activation = self.activation
+        folded.activation_name = self.activation_name
+        folded.seed = self.seed
+
+        return folded
+
+    def inference(self, x: torch.Tensor, chunk_rows: int = DEFAULT_CHUNK_ROWS, out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        '''
+        Runs the forward pass without intermediate allocations.
+
+        The pixels are processed in chunks of `chunk_rows` through every layer, alternating between two
+        thread-local buffers sized for one chunk, so the working set of a layer stays in cache. The bias
+        is fused into the matrix multiplication and the activations are applied in place. The result
+        matches `forward` within floating point tolerance.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            The (n_pixels, in_features) input tensor to the network.
+        chunk_rows : int, optional
+            The number of pixels processed through all layers at a time. Default is `DEFAULT_CHUNK_ROWS`.
+        out : torch.Tensor, optional
+            A preallocated (n_pixels, out_features) tensor to write the output into.
+
+        Returns
+        -------
+        torch.Tensor
+            The output tensor of the network.
+        '''
+        n_pixels = x.size(0)
+        weights = [layer.weight.detach().t() for layer in self.layers]
+        biases = [layer.bias.detach() for layer in self.layers]
+
+        if out is None:
+            out = torch.empty((n_pixels, weights[-1].size(1)), dtype=x.dtype, device=x.device)
+
+        chunk_rows = max(1, min(chunk_rows, n_pixels))
+        width = max(weight.size(1) for weight in weights[:-1])
+        current, scratch = ping_pong_buffers(chunk_rows * width, x.dtype, x.device)
+
+        with torch.no_grad():
+            for start in range(0, n_pixels, chunk_rows):
+                end = min(start + chunk_rows, n_pixels)
+                rows = end - start
+
+                chunk = x[start:end]
+                for weight, bias in zip(weights[:-1], biases[:-1]):
+                    features = weight.size(1)
+                    layer_out = current[:rows * features].view(rows, features)
+                    torch.addmm(bias, chunk, weight, out=layer_out)
+                    apply_activation_(self.activation_name, layer_out, scratch[:rows * features].view(rows, features))
+
+                    chunk = layer_out
+                    current, scratch = scratch, current
+
+                torch.addmm(biases[-1], chunk, weights[-1], out=out[start:end]).sigmoid_()
+
+        return out
+
+
+class BatchedFeedForwardNetwork(nn.Module):
+    '''
+    Several same-shaped feedforward networks evaluated together.
+
+    The weights of every network are stacked along a leading batch dimension, so each layer of all
+    networks is computed with a single batched matrix multiplication over a shared input.
+
+    Parameters
+    ----------
+    networks : List[FeedForwardNetwork]
+        The networks to evaluate. They must have the same layer shapes and activation function.
+
+    Attributes
+    ----------
+    weights : nn.ParameterList
+        The (n_networks, in_features, out_features) stacked and transposed weights of each layer.
+    biases : nn.ParameterList
+        The (n_networks, 1, out_features) stacked biases of each layer.
+    activation : Callable
+        The activation function to use between layers.
+    '''
+
+    def __init__(self, networks: List[FeedForwardNetwork]):
+        super(BatchedFeedForwardNetwork, self).__init__()
+
+        if not networks:
+            raise ValueError('At least one network is required')
+
+        reference = networks[0]
+        shapes = [layer.weight.shape for layer in reference.layers]
+        for network in networks[1:]:
+            if [layer.weight.shape for layer in network.layers] != shapes:
+                raise ValueError('Batched networks must have the same layer dimensions')
+            same_activation = network.activation is reference.activation or \
+                (isinstance(network.activation, nn.Module) and type(network.activation) is type(reference.activation))
+            if not same_activation:
+                raise ValueError('Batched networks must have the same activation function')
+
+        self.n_networks = len(networks)
+        self.weights = nn.ParameterList([
+            nn.Parameter(torch.stack([network.layers[i].weight.detach().t() for network in networks]), requires_grad=False)
+            for i in range(len(shapes))])
+        self.biases = nn.ParameterList([
+            nn.Parameter(torch.stack([network.layers[i].bias.detach().unsqueeze(0) for network in networks]), requires_grad=False)
+            for i in range(len(shapes))])
+        self.activation = reference.activation
+        self.activation_name = reference.activation_name
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        '''
+        Defines the batched forward pass of the networks.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            A (n_pixels, in_features) input shared by every network, or a (n_networks, n_pixels, in_features)
+            input with one slice per network.
+
+        Returns
+        -------
+        torch.Tensor
+            The (n_networks, n_pixels, out_features) outputs of the networks.
+        '''
+        out = x if x.dim() == 3 else x.unsqueeze(0).expand(self.n_networks, -1, -1)
+        for i, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+            out = torch.baddbmm(bias, out, weight)
+            if i < len(self.weights) - 1:
+                out = self.activation(out)
+            else:
+                out = torch.sigmoid(out)
+
+        return out
+
+    def fold_constant_inputs(self, constants: Dict[int, float]) -> 'BatchedFeedForwardNetwork':
+        '''
+        Returns batched networks that take only the non-constant input columns, with the constant ones folded into the first layer's biases.
+
+        Parameters
+        ----------
+        constants : Dict[int, float]
+            The value of each constant input column, by column index.
+
+        Returns
+        -------
+        BatchedFeedForwardNetwork
+            Batched networks sharing every layer but the first, or these networks if there is nothing to fold.
+        '''
+        if not constants:
+            return self
+
+        weight = self.weights[0].detach()
+        kept = [column for column in range(weight.size(1)) if column not in constants]
+        folded_columns = sorted(constants)
+
+        with torch.no_grad():
+            values = torch.tensor([constants[column] for column in folded_columns], dtype=weight.dtype, device=weight.device)
+            folded_weight = weight[:, kept].contiguous()
+            folded_bias = self.biases[0].detach() + torch.matmul(values, weight[:, folded_columns]).unsqueeze(1)
+
+        folded = BatchedFeedForwardNetwork.__new__(BatchedFeedForwardNetwork)
+        nn.Module.__init__(folded)
+        folded.n_networks = self.n_networks
+        folded.weights = nn.ParameterList([nn.Parameter(folded_weight, requires_grad=False)] + list(self.weights[1:]))
+        folded.biases = nn.ParameterList([nn.Parameter(folded_bias, requires_grad=False)] + list(self.biases[1:]))
+        folded.activation = self.activation
+        folded.activation_name = self.activation_name
+
+        return folded
+
+    def inference(self, x: torch.Tensor, chunk_rows: int = DEFAULT_CHUNK_ROWS, out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        '''
+        Runs the batched forward pass without intermediate allocations.
+
+        Works like `FeedForwardNetwork.inference`, with the chunk of every network processed together.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            A (n_pixels, in_features) input shared by every network, or a (n_networks, n_pixels, in_features)
+            input with one slice per network.
+        chunk_rows : int, optional
+            The number of pixels of each network processed through all layers at a time.
+        out : torch.Tensor, optional
+            A preallocated (n_networks, n_pixels, out_features) tensor to write the outputs into.
+
+        Returns
+        -------
+        torch.Tensor
+            The (n_networks, n_pixels, out_features) outputs of the networks.
+        '''
+        x = x if x.dim() == 3 else x.unsqueeze(0).expand(self.n_networks, -1, -1)
+        n_pixels = x.size(1)
+        out_features = self.weights[-1].size(2)
+
+        if out is None:
+            out = torch.empty((self.n_networks, n_pixels, out_features), dtype=x.dtype, device=x.device)
+
+        chunk_rows = max(1, min(chunk_rows, n_pixels))
+        width = max(weight.size(2) for weight in self.weights)
+        current, scratch = ping_pong_buffers(self.n_networks * chunk_rows * width, x.dtype, x.device)
+
+        with torch.no_grad():
+            for start in range(0, n_pixels, chunk_rows):
+                end = min(start + chunk_rows, n_pixels)
+                size = self.n_networks * (end - start)
+
+                chunk = x[:, start:end]
+                for weight, bias in zip(self.weights[:-1], self.biases[:-1]):
+                    shape = (self.n_networks, end - start, weight.size(2))
+                    layer_out = current[:size * weight.size(2)].view(shape)
+                    torch.baddbmm(bias, chunk, weight, out=layer_out)
+                    apply_activation_(self.activation_name, layer_out, scratch[:size * weight.size(2)].view(shape))
+
+                    chunk = layer_out
+                    current, scratch = scratch, current
+
+                # a chunk of the output is strided across networks, so the last layer goes through the free buffer
+                layer_out = current[:size * out_features].view(self.n_networks, end - start, out_features)
+                torch.baddbmm(self.biases[-1], chunk, self.weights[-1], out=layer_out)
+                out[:, start:end] = layer_out.sigmoid_()
+
+        return out
@@ -0,0 +1,299 @@
+import csv
+import io
+import itertools
+import numpy as np
+import zipfile
+from typing import Iterator, Optional, Tuple
+
+# the color strategy of each particle type, unknown types count as rgb
+PARTICLE_COLORS = {
+    'proton': 'bw',
+    'kaon': 'rgb',
+    'pion': 'cmyk',
+    'electron': 'hsv'
+}
+
+# the order ties between color totals are broken in, first wins
+COLOR_MODES = ['bw', 'rgb', 'hsv', 'cmyk']
+
+MAX_VELOCITY = 0.0299792458
+
+PARTICLE_FORMATS = ['csv', 'npz', 'parquet']
+
+DEFAULT_CHUNK_ROWS = 65536
+
+
+class ParticleAggregator:
+    '''
+    Accumulate the priority-weighted velocity totals of a stream of particle chunks.
+
+    The result is exactly that of `SignatureService._get_signature_color_mode` on the same particles:
+    velocities and priorities are clamped the same way and the totals are accumulated one particle at a
+    time, in order, through a cumulative sum carrying the previous chunks' total.
+
+    Parameters
+    ----------
+    n_particles : int
+        The total number of particles, which the default priority of each particle depends on.
+    '''
+
+    def __init__(self, n_particles: int):
+        self.n_particles = n_particles
+        self.index = 0
+        self.combined_velocity = 0.0
+        self.color_totals = {color_mode: 0.0 for color_mode in COLOR_MODES}
+
+    def update(self, particle_types: Optional[np.ndarray], velocities: Optional[np.ndarray], priorities: Optional[np.ndarray],
+               n_rows: int):
+        '''
+        Add a chunk of particles.
+
+        Parameters
+        ----------
+        particle_types : np.ndarray, optional
+            The particle type names, with empty strings for missing types. All electrons if None.
+        velocities : np.ndarray, optional
+            The velocities, with NaN for missing values, which count as 0. All 0 if None.
+        priorities : np.ndarray, optional
+            The priorities, with NaN for missing values, which get the default priority of their position.
+            All default if None.
+        n_rows : int
+            The number of particles in the chunk.
+        '''
+        if velocities is None:
+            velocities = np.zeros(n_rows)
+        else:
+            velocities = np.asarray(velocities, dtype=np.float64)
+            velocities = np.where(np.isnan(velocities), 0.0, velocities)
+            velocities = np.where(velocities < 0, 0.0, np.where(velocities > MAX_VELOCITY, MAX_VELOCITY, velocities))
+
+        default_priorities = (self.n_particles - self.index - np.arange(n_rows)).astype(np.float64)
+        if priorities is None:
+            priorities = default_priorities
+        else:
+            priorities = np.asarray(priorities, dtype=np.float64)
+            priorities = np.where(np.isnan(priorities), default_priorities, priorities)
+            priorities = np.where(priorities < 0, 0.0, priorities)
+
+        weighted_velocities = velocities * priorities
+        self.combined_velocity = self._accumulate(self.combined_velocity, weighted_velocities)
+
+        if particle_types is None:
+            self.color_totals['hsv'] = self._accumulate(self.color_totals['hsv'], weighted_velocities)
+        else:
+            particle_types = np.asarray(particle_types).astype(str)
+            particle_types = np.where(particle_types == '', 'electron', particle_types)
+            colors = np.full(n_rows, 'rgb', dtype=object)
+            for particle_type, color_mode in PARTICLE_COLORS.items():
+                colors[particle_types == particle_type] = color_mode
+
+            for color_mode in COLOR_MODES:
+                self.color_totals[color_mode] = self._accumulate(self.color_totals[color_mode], weighted_velocities[colors == color_mode])
+
+        self.index += n_rows
+
+    def result(self) -> Tuple[float, str]:
+        '''
+        Return the combined velocity and the color strategy of the particles added so far.
+
+        Returns
+        -------
+        Tuple[float, str]
+            The combined velocity, scaled by the number of particles, and the dominant color mode.
+        '''
+        if self.n_particles == 0:
+            return (0, 'rgb')
+
+        return (self.combined_velocity * self.n_particles, max(self.color_totals, key=self.color_totals.get))
+
+    @staticmethod
+    def _accumulate(total: float, values: np.ndarray) -> float:
+        if values.size == 0:
+            return total
+
+        # a sequential cumulative sum, unlike np.sum's pairwise summation, adds in the same order as a Python loop
+        return float(np.cumsum(np.concatenate([[total], values]))[-1])
+
+
+def _csv_columns(rows: list, header: list) -> Tuple[Optional[np.ndarray], Optional[np.ndarray], Optional[np.ndarray]]:
+    columns = {name: i for i, name in enumerate(header)}
+
+    def column(name: str, numeric: bool) -> Optional[np.ndarray]:
+        if name not in columns:
+            return None
+
+        values = np.array([row[columns[name]] if columns[name] < len(row) else '' for row in rows])
+        if not numeric:
+            return values
+
+        missing = values == ''
+        return np.where(missing, np.nan, np.where(missing, '0', values).astype(np.float64))
+
+    return (column('particle', False), column('velocity', True), column('priority', True))
+
+
+def _read_csv(file: io.IOBase, chunk_rows: int) -> Iterator[tuple]:
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    try:
+        reader = csv.reader(text)
+        header = [name.strip() for name in next(reader, [])]
+
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                return
+
+            yield (*_csv_columns(rows, header), len(rows))
+    finally:
+        # detaching keeps the wrapper from closing the caller's file
+        text.detach()
+
+
+def _read_npy_header(member: io.IOBase) -> tuple:
+    version = np.lib.format.read_magic(member)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(member)
+
+    return np.lib.format.read_array_header_2_0(member)
+
+
+def _read_npy_member(archive: zipfile.ZipFile, name: str, chunk_rows: int) -> Iterator[np.ndarray]:
+    with archive.open(name) as member:
+        shape, _, dtype = _read_npy_header(member)
+        if dtype.hasobject or len(shape) != 1:
+            raise ValueError(f'{name} must be a one-dimensional array without objects')
+
+        # read straight from the (possibly compressed) archive member, one chunk of rows at a time
+        for start in range(0, shape[0], chunk_rows):
+            count = min(chunk_rows, shape[0] - start)
+            yield np.frombuffer(member.read(count * dtype.itemsize), dtype=dtype, count=count)
+
+
+def _npz_length(archive: zipfile.ZipFile) -> int:
+    names = set(archive.namelist())
+    for name in ['particle', 'velocity', 'priority']:
+        if f'{name}.npy' in names:
+            with archive.open(f'{name}.npy') as member:
+                shape = _read_npy_header(member)[0]
+            if len(shape) != 1:
+                raise ValueError(f'{name} must be a one-dimensional array')
+
+            return shape[0]
+
+    return 0
+
+
+def _read_npz(file: io.IOBase, chunk_rows: int) -> Iterator[tuple]:
+    with zipfile.ZipFile(file) as archive:
+        names = set(archive.namelist())
+        n_particles = _npz_length(archive)
+
+        # a shorter column would run out in the middle of the stream
+        for name in ['particle', 'velocity', 'priority']:
+            if f'{name}.npy' in names:
+                with archive.open(f'{name}.npy') as member:
+                    shape = _read_npy_header(member)[0]
+                if shape != (n_particles,):
+                    raise ValueError(f'{name} has shape {shape}, but the archive holds {n_particles} particles')
+
+        columns = [_read_npy_member(archive, f'{name}.npy', chunk_rows) if f'{name}.npy' in names else None
+                   for name in ['particle', 'velocity', 'priority']]
+
+        for start in range(0, n_particles, chunk_rows):
+            chunk = [next(column) if column is not None else None for column in columns]
+            yield (*chunk, min(chunk_rows, n_particles - start))
+
+
+def _read_parquet(file: io.IOBase, chunk_rows: int) -> Iterator[tuple]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError('Parquet input requires the pyarrow package')
+
+    parquet_file = pq.ParquetFile(file)
+    names = set(parquet_file.schema_arrow.names)
+    columns = [name for name in ['particle', 'velocity', 'priority'] if name in names]
+
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+        def column(name: str, numeric: bool) -> Optional[np.ndarray]:
+            if name not in columns:
+                return None
+
+            values = batch.column(name)
+            return values.to_numpy(zero_copy_only=False).astype(np.float64) if numeric else values.fill_null('').to_numpy(zero_copy_only=False)
+
+        yield (column('particle', False), column('velocity', True), column('priority', True), batch.num_rows)
+
+
+def count_particles(file: io.IOBase, file_format: str) -> int:
+    '''
+    Count the particles of a columnar file, from its metadata when the format has any.
+
+    Parameters
+    ----------
+    file : io.IOBase
+        The seekable binary file.
+    file_format : str
+        The file format ('csv', 'npz', 'parquet').
+
+    Returns
+    -------
+    int
+        The number of particles.
+    '''
+    if file_format == 'npz':
+        with zipfile.ZipFile(file) as archive:
+            return _npz_length(archive)
+
+    if file_format == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError('Parquet input requires the pyarrow package')
+
+        return pq.ParquetFile(file).metadata.num_rows
+
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    try:
+        return max(0, sum(1 for _ in csv.reader(text)) - 1)
+    finally:
+        text.detach()
+
+
+def summarize_particles(file: io.IOBase, file_format: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Tuple[int, float, str]:
+    '''
+    Compute the particle count, combined velocity and color strategy of a columnar particle file in
+    streaming chunks, with memory bounded by the chunk size.
+
+    The file has the columns (or, in an NPZ archive, the one-dimensional arrays) `particle`, `velocity`
+    and `priority`, each optional, with the defaults of the JSON particles: missing types are electrons,
+    missing velocities are 0 and missing priorities count down from the number of particles.
+
+    Parameters
+    ----------
+    file : io.IOBase
+        The seekable binary file.
+    file_format : str
+        The file format ('csv', 'npz', 'parquet').
+    chunk_rows : int, optional
+        The number of particles processed at a time.
+
+    Returns
+    -------
+    Tuple[int, float, str]
+        The number of particles, the combined velocity and the color mode, as computed from the same
+        particles given as JSON.
+    '''
+    if file_format not in PARTICLE_FORMATS:
+        raise ValueError(f'Non-supported particle format {file_format}')
+
+    # default priorities depend on the total count, so it is known before the first chunk
+    n_particles = count_particles(file, file_format)
+    file.seek(0)
+
+    reader = {'csv': _read_csv, 'npz': _read_npz, 'parquet': _read_parquet}[file_format]
+    aggregator = ParticleAggregator(n_particles)
+    for particle_types, velocities, priorities, n_rows in reader(file, chunk_rows):
+        aggregator.update(particle_types, velocities, priorities, n_rows)
+
+    return (n_particles, *aggregator.result())
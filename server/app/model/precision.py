@@ -0,0 +1,178 @@
+import torch
+import torch.nn as nn
+from typing import List, Optional, Union
+from app.model.neural_network import DEFAULT_CHUNK_ROWS, BatchedFeedForwardNetwork, FeedForwardNetwork, apply_activation_
+
+PRECISIONS = ['float32', 'bfloat16', 'float16', 'int8']
+
+FLOAT_DTYPES = {
+    'bfloat16': torch.bfloat16,
+    'float16': torch.float16
+}
+
+
+def _quantized_layers(weights: List[torch.Tensor], biases: List[torch.Tensor]) -> nn.ModuleList:
+    layers = nn.ModuleList()
+    for weight, bias in zip(weights, biases):
+        layer = nn.utils.skip_init(nn.Linear, weight.size(1), weight.size(0))
+        with torch.no_grad():
+            layer.weight.copy_(weight)
+            layer.bias.copy_(bias)
+        layers.append(layer)
+
+    # int8 weights, with the activations quantized on the fly per chunk
+    return torch.ao.quantization.quantize_dynamic(layers, {nn.Linear}, dtype=torch.qint8)
+
+
+class ReducedPrecisionNetwork:
+    '''
+    A network evaluated in reduced precision on the CPU.
+
+    With 'bfloat16' and 'float16', the weights and activations are cast and every layer is computed in
+    that type. With 'int8', the linear layers are dynamically quantized: their weights are stored as int8
+    and each chunk of activations is quantized on the fly. The output is always float32 in [0, 1].
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork or BatchedFeedForwardNetwork
+        The float32 network to evaluate.
+    precision : str
+        The precision mode ('bfloat16', 'float16', 'int8').
+
+    Attributes
+    ----------
+    seed : int, optional
+        The generation seed of the wrapped network, if it has one.
+    '''
+
+    def __init__(self, network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork], precision: str):
+        if precision not in FLOAT_DTYPES and precision != 'int8':
+            raise ValueError(f'Non-supported precision {precision}')
+
+        self.network = network
+        self.precision = precision
+        self.seed = getattr(network, 'seed', None)
+        self.activation_name = network.activation_name
+        self.batched = isinstance(network, BatchedFeedForwardNetwork)
+
+        if self.batched:
+            weights = [[weight[i].detach().t() for weight in network.weights] for i in range(network.n_networks)]
+            biases = [[bias[i, 0].detach() for bias in network.biases] for i in range(network.n_networks)]
+        else:
+            weights = [[layer.weight.detach() for layer in network.layers]]
+            biases = [[layer.bias.detach() for layer in network.layers]]
+
+        if precision == 'int8':
+            self.layers = [_quantized_layers(network_weights, network_biases) for network_weights, network_biases in zip(weights, biases)]
+        else:
+            dtype = FLOAT_DTYPES[precision]
+            self.weights = [[weight.t().to(dtype) for weight in network_weights] for network_weights in weights]
+            self.biases = [[bias.to(dtype) for bias in network_biases] for network_biases in biases]
+
+    def inference(self, x: torch.Tensor, chunk_rows: int = DEFAULT_CHUNK_ROWS, out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        '''
+        Evaluate the network in chunks of pixels.
+
+        Parameters
+        ----------
+        x : torch.Tensor
+            The float32 input tensor, shaped as for the wrapped network's `inference`.
+        chunk_rows : int, optional
+            The number of pixels evaluated through all layers at a time.
+        out : torch.Tensor, optional
+            A preallocated float32 output tensor.
+
+        Returns
+        -------
+        torch.Tensor
+            The float32 output of the network.
+        '''
+        n_networks = self.network.n_networks if self.batched else 1
+        inputs = x.unsqueeze(0) if x.dim() == 2 else x
+        n_pixels = inputs.size(1)
+
+        if out is None:
+            out_features = self.layers[0][-1].out_features if self.precision == 'int8' else self.weights[0][-1].size(1)
+            out = torch.empty((n_networks, n_pixels, out_features) if self.batched else (n_pixels, out_features), dtype=torch.float32)
+
+        outputs = out if self.batched else out.unsqueeze(0)
+
+        with torch.no_grad():
+            for i in range(n_networks):
+                network_input = inputs[i if inputs.size(0) > 1 else 0]
+
+                for start in range(0, n_pixels, chunk_rows):
+                    end = min(start + chunk_rows, n_pixels)
+                    outputs[i, start:end] = self._evaluate(i, network_input[start:end])
+
+        return out
+
+    def _evaluate(self, i: int, chunk: torch.Tensor) -> torch.Tensor:
+        if self.precision == 'int8':
+            layers = [(layer, None) for layer in self.layers[i]]
+        else:
+            dtype = FLOAT_DTYPES[self.precision]
+            chunk = chunk.to(dtype)
+            layers = list(zip(self.weights[i], self.biases[i]))
+
+        for j, (weight, bias) in enumerate(layers):
+            chunk = weight(chunk) if bias is None else torch.addmm(bias, chunk, weight)
+
+            if j < len(layers) - 1:
+                apply_activation_(self.activation_name, chunk, torch.empty_like(chunk) if self.activation_name == 'softsign' else chunk)
+            else:
+                chunk = chunk.sigmoid_()
+
+        return chunk
+
+
+def reduced_precision(network: Union[FeedForwardNetwork, BatchedFeedForwardNetwork], precision: str) -> Union[FeedForwardNetwork, BatchedFeedForwardNetwork, ReducedPrecisionNetwork]:
+    '''
+    Wrap a network to evaluate it in the given precision.
+
+    Parameters
+    ----------
+    network : FeedForwardNetwork or BatchedFeedForwardNetwork
+        The float32 network.
+    precision : str
+        The precision mode ('float32', 'bfloat16', 'float16', 'int8').
+
+    Returns
+    -------
+    FeedForwardNetwork or BatchedFeedForwardNetwork or ReducedPrecisionNetwork
+        The network itself for 'float32', the wrapped network otherwise.
+    '''
+    if precision == 'float32':
+        return network
+
+    return ReducedPrecisionNetwork(network, precision)
+
+
+def precision_error(reference: torch.Tensor, image: torch.Tensor, tolerance: int = 2) -> dict:
+    '''
+    Compare an image rendered in reduced precision against its float32 reference, after uint8 quantization.
+
+    Parameters
+    ----------
+    reference : torch.Tensor
+        The (height, width, channels) uint8 image rendered in float32.
+    image : torch.Tensor
+        The (height, width, channels) uint8 image rendered in reduced precision.
+    tolerance : int, optional
+        The largest per-channel error, in uint8 levels, still considered visually lossless. Default is 2.
+
+    Returns
+    -------
+    dict
+        The max and mean absolute error of each channel, the share of differing values, and whether the
+        image is within the tolerance.
+    '''
+    errors = (reference.to(torch.int16) - image.to(torch.int16)).abs().view(-1, reference.size(-1))
+
+    max_errors = errors.max(dim=0).values.tolist()
+    return {
+        'max': max_errors,
+        'mean': errors.float().mean(dim=0).tolist(),
+        'changed': errors.ne(0).float().mean().item(),
+        'lossless': max(max_errors) <= tolerance
+    }
@@ -0,0 +1,51 @@
+import cProfile
+import os
+import threading
+import time
+from flask import Request, Response
+from typing import Optional
+
+
+class RequestProfiler:
+    '''
+    An opt-in cProfile hook for single requests.
+
+    When enabled, a request carrying a `profile` query parameter or an `X-Profile` header is profiled and
+    its stats are dumped to `<output_dir>/<timestamp>-<endpoint>.prof`, which can be opened with `pstats`
+    or snakeviz. The worker pid and native thread id are returned in headers, so that a sampling
+    profiler such as py-spy (`py-spy record --pid <pid> --native`) can be pointed at the same worker.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether requests are allowed to ask for profiling.
+    output_dir : str
+        The directory the profiles are written to.
+    '''
+
+    def __init__(self, enabled: bool, output_dir: str = 'profiles'):
+        self.enabled = enabled
+        self.output_dir = output_dir
+
+    def start(self, request: Request) -> Optional[cProfile.Profile]:
+        if not self.enabled or not (request.args.get('profile') or request.headers.get('X-Profile')):
+            return None
+
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: Optional[cProfile.Profile], request: Request, response: Response):
+        if profile is None:
+            return
+
+        profile.disable()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        endpoint = (request.endpoint or 'unknown').replace('/', '-')
+        filename = os.path.join(self.output_dir, f'{time.strftime("%Y-%m-%d-%H-%M-%S")}-{endpoint}-{threading.get_native_id()}.prof')
+        profile.dump_stats(filename)
+
+        response.headers['X-Profile-File'] = filename
+        response.headers['X-Profile-Pid'] = str(os.getpid())
+        response.headers['X-Profile-Thread'] = str(threading.get_native_id())
@@ -1,18 +1,62 @@
+import contextvars
 import os
-from supabase import create_client, Client
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Optional
+from app.metrics import timed
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 
 class BucketRepository:
-    def __init__(self):
-        url: str = os.environ.get('SUPABASE_URL')
-        key: str = os.environ.get('SUPABASE_KEY')
-        self.supabase: Client = create_client(url, key)
+    def __init__(self, max_concurrent_uploads: int = 4):
+        # uploads run on a bounded pool sharing one client, so rendering can continue while they are in flight
+        self._uploads = ThreadPoolExecutor(max_workers=max_concurrent_uploads, thread_name_prefix='upload')
+        self._connect()
+
+    def _connect(self):
+        self._url: str = os.environ.get('SUPABASE_URL')
+        self._key: str = os.environ.get('SUPABASE_KEY')
+        self._client: Optional['Client'] = None
+        self._client_lock = threading.Lock()
+        self.public_url_base = f'{self._url.rstrip("/")}/storage/v1/object/public/signatures'
+
+    @property
+    def supabase(self) -> 'Client':
+        # the supabase package takes about a second to import, so it is only loaded by the first upload
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(self._url, self._key)
+
+        return self._client
+
+    def warmup(self):
+        self.supabase
 
     def upload_signature(self, name: str, binary: bytes, content_type: str = 'text/plain') -> str:
+        with timed('storage_upload', n_bytes=len(binary)):
+            self._store(name, binary, content_type)
+
+        with timed('uploads_insert'):
+            self._record(name)
+
+        return self.get_public_url(name)
+
+    def upload_signature_async(self, name: str, binary: bytes, content_type: str = 'text/plain') -> Future:
+        # running in a copy of the caller's context reports the upload timings to the caller's request
+        return self._uploads.submit(contextvars.copy_context().run, self.upload_signature, name, binary, content_type)
+
+    def get_public_url(self, name: str) -> str:
+        # the public url of a public bucket is deterministic, so it is built locally instead of fetched
+        return f'{self.public_url_base}/{name}'
+
+    def _store(self, name: str, binary: bytes, content_type: str):
         self.supabase.storage.from_('signatures').upload(
             name, binary, file_options={'content-type': content_type})
 
+    def _record(self, name: str):
         self.supabase.table('uploads').insert(
             {'name': name, 'type': 'signature'}).execute()
-
-        return self.supabase.storage.from_('signatures').get_public_url(name)
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+FINISHED_STATUSES = {'done', 'failed'}
+
+
+class JobRepository:
+    # how often a waiting reader looks for changes made by other processes, None when only this process makes any
+    poll_interval: Optional[float] = None
+
+    def __init__(self, max_finished_jobs: int = 1024):
+        self.max_finished_jobs = max_finished_jobs
+
+        self._jobs: Dict[str, dict] = OrderedDict()
+        self._claimed = set()
+        # notified on every status change, so long-polling readers wake up as soon as a job finishes
+        self._changed = threading.Condition()
+
+    def create(self, job: dict) -> dict:
+        with self._changed:
+            self._jobs[job['id']] = job
+            self._save(job)
+            self._evict()
+
+        return dict(job)
+
+    def update(self, job_id: str, **fields) -> dict:
+        with self._changed:
+            job = self._jobs[job_id]
+            job.update(fields)
+            self._save(job)
+
+            if job['status'] in FINISHED_STATUSES:
+                self._evict()
+
+            self._changed.notify_all()
+            return dict(job)
+
+    def claim(self, job_id: str) -> Optional[dict]:
+        # a job runs once: an unfinished job is claimed by a single worker, which releases it when done
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED_STATUSES or job_id in self._claimed:
+                return None
+
+            self._claimed.add(job_id)
+            return dict(job)
+
+    def release(self, job_id: str):
+        with self._changed:
+            self._claimed.discard(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._changed:
+            self._refresh(job_id)
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+
+        with self._changed:
+            while True:
+                self._refresh(job_id)
+                job = self._jobs.get(job_id)
+                if job is None or job['status'] in FINISHED_STATUSES:
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                self._changed.wait(remaining if self.poll_interval is None else min(remaining, self.poll_interval))
+
+            return dict(job) if job is not None else None
+
+    def unfinished(self) -> List[dict]:
+        with self._changed:
+            return [dict(job) for job in self._jobs.values() if job['status'] not in FINISHED_STATUSES]
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        with self._changed:
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+
+        return counts
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+            self._delete(job_id)
+
+    def _refresh(self, job_id: str):
+        pass
+
+    def _save(self, job: dict):
+        pass
+
+    def _delete(self, job_id: str):
+        pass
@@ -0,0 +1,40 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+from app.repository.bucket_repository import BucketRepository
+
+
+class LocalBucketRepository(BucketRepository):
+    '''
+    A filesystem-backed stand-in for the Supabase bucket, used to run the whole pipeline offline.
+
+    Signatures are written to `<root>/signatures/<name>` and uploads are appended to `<root>/uploads.jsonl`.
+    '''
+
+    def __init__(self, root: str, base_url: Optional[str] = None, max_concurrent_uploads: int = 4):
+        self.root = root
+        self.base_url = base_url
+        self._uploads_lock = threading.Lock()
+        super().__init__(max_concurrent_uploads)
+
+    def _connect(self):
+        os.makedirs(os.path.join(self.root, 'signatures'), exist_ok=True)
+
+        if self.base_url:
+            self.public_url_base = f'{self.base_url.rstrip("/")}/signatures'
+        else:
+            self.public_url_base = (Path(self.root).resolve() / 'signatures').as_uri()
+
+    def warmup(self):
+        pass
+
+    def _store(self, name: str, binary: bytes, content_type: str):
+        with open(os.path.join(self.root, 'signatures', name), 'wb') as f:
+            f.write(binary)
+
+    def _record(self, name: str):
+        with self._uploads_lock:
+            with open(os.path.join(self.root, 'uploads.jsonl'), 'a') as f:
+                f.write(json.dumps({'name': name, 'type': 'signature'}) + '\n')
@@ -0,0 +1,111 @@
+import fcntl
+import json
+import os
+import re
+from typing import Optional
+from app.repository.job_repository import FINISHED_STATUSES, JobRepository
+
+# job ids are uuid4 hex digests, which keeps them from naming any file outside the root
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class LocalJobRepository(JobRepository):
+    '''
+    A job repository persisted to `<root>/<job id>.json`, so jobs survive a restart of the server.
+
+    Jobs found on disk are loaded on startup; the ones that had not finished can then be queued again.
+    Several processes may share a root, e.g. the workers of one server: the files are the source of
+    truth for every read, and a job is claimed through an exclusive lock on `<root>/<job id>.lock`, so
+    each job runs in a single process. The lock is released when its process exits, letting a process
+    started later resume a job whose worker died.
+    '''
+
+    poll_interval = 0.25
+
+    def __init__(self, root: str, max_finished_jobs: int = 1024):
+        self.root = root
+        super().__init__(max_finished_jobs)
+
+        self._locks = {}
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    def claim(self, job_id: str) -> Optional[dict]:
+        job = super().claim(job_id)
+        if job is None:
+            return None
+
+        lock = open(os.path.join(self.root, f'{job_id}.lock'), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            super().release(job_id)
+            return None
+
+        # another process may have finished the job since it was loaded
+        with self._changed:
+            self._refresh(job_id)
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in FINISHED_STATUSES:
+                lock.close()
+                self._claimed.discard(job_id)
+                return None
+
+            self._locks[job_id] = lock
+            return dict(job)
+
+    def release(self, job_id: str):
+        with self._changed:
+            lock = self._locks.pop(job_id, None)
+
+        # the lock file stays until the job is evicted, so every process locks the same file
+        if lock is not None:
+            lock.close()
+
+        super().release(job_id)
+
+    def _load(self):
+        jobs = []
+        for filename in os.listdir(self.root):
+            if filename.endswith('.json'):
+                job = self._read(filename[:-len('.json')])
+                if job is not None:
+                    jobs.append(job)
+
+        for job in sorted(jobs, key=lambda job: job['created_at']):
+            self._jobs[job['id']] = job
+
+    def _read(self, job_id: str) -> Optional[dict]:
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+
+        try:
+            with open(os.path.join(self.root, f'{job_id}.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self, job_id: str):
+        job = self._read(job_id)
+        if job is not None:
+            self._jobs[job_id] = job
+        else:
+            # evicted by another process, or never created
+            self._jobs.pop(job_id, None)
+
+    def _save(self, job: dict):
+        # written to a temporary file first so a crash never leaves a truncated job behind
+        path = os.path.join(self.root, f'{job["id"]}.json')
+        with open(f'{path}.{os.getpid()}.tmp', 'w') as f:
+            json.dump(job, f)
+
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+    def _delete(self, job_id: str):
+        for extension in ['json', 'lock']:
+            try:
+                os.remove(os.path.join(self.root, f'{job_id}.{extension}'))
+            except FileNotFoundError:
+                pass
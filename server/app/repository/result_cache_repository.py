@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# request keys are sha256 hex digests, which keeps them from naming any file outside `keys`
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class ResultCacheRepository:
+    '''
+    Caches serialized results in memory, in an LRU bounded by bytes, in front of an optional
+    content-addressed store under `root`: each result is written once to `objects/<hash[:2]>/<hash>.json`, named by
+    the hash of its content, and `keys/<key>` points a request key to it. The content hash is the ETag.
+    '''
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, root: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.root = root
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if self.root:
+            os.makedirs(os.path.join(self.root, 'objects'), exist_ok=True)
+            os.makedirs(os.path.join(self.root, 'keys'), exist_ok=True)
+
+    def get(self, key: str) -> Optional[tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        entry = self._read(key)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(key, entry)
+
+        return entry
+
+    def put(self, key: str, content: bytes) -> str:
+        etag = hashlib.sha256(content).hexdigest()
+        entry = (etag, content)
+
+        self._write(key, entry)
+
+        with self._lock:
+            self._remember(key, entry)
+
+        return etag
+
+    def invalidate(self, key: Optional[str] = None) -> int:
+        if key is not None and not KEY_PATTERN.fullmatch(key):
+            raise ValueError(f'Invalid result cache key {key!r}')
+
+        invalidated = set()
+
+        with self._lock:
+            keys = list(self._entries) if key is None else [key]
+            for name in keys:
+                entry = self._entries.pop(name, None)
+                if entry is not None:
+                    self._bytes -= len(entry[1])
+                    invalidated.add(name)
+
+        # objects are left on disk, they are only reachable through a key and may be shared by several keys
+        if self.root:
+            keys = os.listdir(os.path.join(self.root, 'keys')) if key is None else [key]
+            for name in keys:
+                # temporary files of concurrent writes are left to their writers
+                if not KEY_PATTERN.fullmatch(name):
+                    continue
+
+                try:
+                    os.remove(self._key_path(name))
+                    invalidated.add(name)
+                except FileNotFoundError:
+                    pass
+
+        return len(invalidated)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def _remember(self, key: str, entry: tuple[str, bytes]):
+        size = len(entry[1])
+        if size > self.max_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous[1])
+
+        self._entries[key] = entry
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _key_path(self, key: str) -> str:
+        if not KEY_PATTERN.fullmatch(key):
+            raise ValueError(f'Invalid result cache key {key!r}')
+
+        keys = os.path.realpath(os.path.join(self.root, 'keys'))
+        path = os.path.realpath(os.path.join(keys, key))
+        if os.path.dirname(path) != keys:
+            raise ValueError(f'Invalid result cache key {key!r}')
+
+        return path
+
+    def _object_path(self, etag: str) -> str:
+        return os.path.join(self.root, 'objects', etag[:2], f'{etag}.json')
+
+    def _read(self, key: str) -> Optional[tuple[str, bytes]]:
+        if not self.root:
+            return None
+
+        try:
+            with open(self._key_path(key)) as f:
+                etag = f.read().strip()
+            if not KEY_PATTERN.fullmatch(etag):
+                return None
+            with open(self._object_path(etag), 'rb') as f:
+                return (etag, f.read())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, entry: tuple[str, bytes]):
+        if not self.root:
+            return
+
+        etag, content = entry
+        path = self._object_path(etag)
+
+        # files are written to a temporary name first so readers never see a partial result
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f'{path}.{threading.get_ident()}.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(f'{path}.{threading.get_ident()}.tmp', path)
+
+        key_path = self._key_path(key)
+        with open(f'{key_path}.{threading.get_ident()}.tmp', 'w') as f:
+            f.write(etag)
+        os.replace(f'{key_path}.{threading.get_ident()}.tmp', key_path)
+
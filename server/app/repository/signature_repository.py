@@ -1,43 +1,126 @@
 import base64
-import cv2
 import hashlib
 import numpy as np
 import os
-from typing import List
-from app.model.generator import create_image
+import torch
+from typing import Iterator, List, Optional
+from app.metrics import timed
+from app.model.compiled import CompiledNetworkCache
+from app.model.encoder import ImageEncoder
+from app.model.generator import create_image, create_images, preview_dimensions
 from app.model.neural_network import FeedForwardNetwork
 
 
 class SignatureRepository:
+    def __init__(self, tile_rows: Optional[int] = 256, encoder: Optional[ImageEncoder] = None, legacy_seed: bool = True,
+                 network_cache: Optional[CompiledNetworkCache] = None, fold_constants: bool = True):
+        self.tile_rows = tile_rows
+        self.network_cache = network_cache
+        # folding constant inputs changes the float summation order, so it can be turned off to reproduce earlier seeds
+        self.fold_constants = fold_constants
+        self.encoder = encoder if encoder is not None else ImageEncoder()
+        # hashing the base64 text of the image keeps seeds identical to the ones issued before
+        self.legacy_seed = legacy_seed
+
+    @property
+    def file_extension(self) -> str:
+        return self.encoder.extension
+
+    @property
+    def content_type(self) -> str:
+        return self.encoder.content_type
+
+    @property
+    def render_settings(self) -> dict:
+        # everything besides the request parameters that changes the bytes or seeds of a signature
+        return {
+            'encoding': self.encoder.file_format,
+            'encoding_parameters': list(self.encoder.parameters),
+            'legacy_seed': self.legacy_seed,
+            'tile_rows': self.tile_rows,
+            'fold_constants': self.fold_constants
+        }
+
     def create_signature(self, layer_dimensions: List[int], color_mode: str, image_height: int, image_width: int, symmetry: bool,
-                         trig: bool, alpha: bool, noise: bool, activation: str) -> tuple[str, bytes]:
+                         trig: bool, alpha: bool, noise: bool, activation: str, generator_seed: int,
+                         precision: str = 'float32') -> tuple[str, bytes]:
         network = FeedForwardNetwork(layers_dimensions=layer_dimensions,
                                      activation_function=activation,
                                      color_mode=color_mode,
-                                     alpha=alpha)
+                                     alpha=alpha,
+                                     seed=generator_seed)
+
+        buffer = self._generate_image(network=network, image_height=image_height, image_width=image_width,
+                                      symmetry=symmetry, trig=trig, alpha=alpha, noise=noise, color_mode=color_mode,
+                                      precision=precision)
+
+        return (self._hash_image(buffer), buffer.tobytes())
 
-        base64_image, image_bytes = self._generate_image(network=network, image_height=image_height, image_width=image_width,
-                                                         symmetry=symmetry, trig=trig, alpha=alpha, noise=noise, color_mode=color_mode)
+    def create_signatures(self, layer_dimensions: List[int], color_mode: str, image_height: int, image_width: int, symmetry: bool,
+                          trig: bool, alpha: bool, noise: bool, activation: str, generator_seeds: List[int],
+                          precision: str = 'float32') -> Iterator[tuple[str, bytes]]:
+        # a seed gets the pixels of a render of its own, whatever the number of images requested with it; the batched
+        # kernel is not bit-identical to it, and is no faster for the five images a request has at most
+        for generator_seed in generator_seeds:
+            network = FeedForwardNetwork(layers_dimensions=layer_dimensions,
+                                         activation_function=activation,
+                                         color_mode=color_mode,
+                                         alpha=alpha,
+                                         seed=generator_seed)
 
-        m = hashlib.sha512()
-        m.update(base64_image.encode('utf-8'))
-        seed = m.hexdigest()
+            buffer = self._generate_image(network=network, image_height=image_height, image_width=image_width,
+                                          symmetry=symmetry, trig=trig, alpha=alpha, noise=noise, color_mode=color_mode,
+                                          precision=precision)
 
-        return (seed, image_bytes)
+            # each signature is yielded as soon as it is encoded, before the next image is rendered, so callers
+            # upload it while the next one renders
+            yield (self._hash_image(buffer), buffer.tobytes())
+
+    def create_previews(self, layer_dimensions: List[int], color_mode: str, image_height: int, image_width: int, symmetry: bool,
+                        trig: bool, alpha: bool, noise: bool, activation: str, generator_seeds: List[int], long_side: int,
+                        precision: str = 'float32') -> List[str]:
+        networks = [FeedForwardNetwork(layers_dimensions=layer_dimensions,
+                                       activation_function=activation,
+                                       color_mode=color_mode,
+                                       alpha=alpha,
+                                       seed=generator_seed) for generator_seed in generator_seeds]
+
+        # the same seeds evaluated on a coarser grid, so previews show exactly what the full render will be
+        preview_height, preview_width = preview_dimensions(image_height, image_width, long_side)
+        image_tensors = create_images(
+            networks, image_height=preview_height, image_width=preview_width, symmetry=symmetry,
+            trig=trig, alpha=alpha, with_noise=noise, color_mode=color_mode, tile_rows=preview_height,
+            network_cache=self.network_cache, fold_constants=self.fold_constants, precision=precision)
+
+        previews = []
+        for image_tensor in image_tensors:
+            buffer = self._encode_image(image_tensor)
+            previews.append(f'data:{self.encoder.content_type};base64,{base64.b64encode(memoryview(buffer)).decode("ascii")}')
+
+        return previews
 
     def _generate_image(self, network: FeedForwardNetwork, image_height: int, image_width: int,
-                        symmetry: bool, trig: bool, alpha: bool, noise: bool, color_mode: str) -> tuple[str, bytes]:
+                        symmetry: bool, trig: bool, alpha: bool, noise: bool, color_mode: str, precision: str = 'float32') -> np.ndarray:
+        out = self.encoder.buffers(1, (image_height, image_width, 4))[0] if self.tile_rows is not None else None
+
         image_tensor = create_image(
             network, image_height=image_height, image_width=image_width, symmetry=symmetry,
-            trig=trig, alpha=alpha, with_noise=noise, color_mode=color_mode, save=False)
+            trig=trig, alpha=alpha, with_noise=noise, color_mode=color_mode, save=False, tile_rows=self.tile_rows, out=out,
+            network_cache=self.network_cache, fold_constants=self.fold_constants, precision=precision)
 
-        image_np = image_tensor.numpy()
+        return self._encode_image(image_tensor)
 
-        image_np = np.clip(image_np, 0, 1)
-        image_np = (image_np * 255).astype(np.uint8)
+    def _encode_image(self, image_tensor: torch.Tensor) -> np.ndarray:
+        with timed('encode', image_tensor.size(0) * image_tensor.size(1)) as stage:
+            buffer = self.encoder.encode(image_tensor)
+            stage.bytes = buffer.nbytes
 
-        _, buffer = cv2.imencode('.png', image_np)
+        return buffer
 
-        base64_image = base64.b64encode(buffer).decode('utf-8')
+    def _hash_image(self, buffer: np.ndarray) -> str:
+        with timed('hash', n_bytes=buffer.nbytes):
+            data = memoryview(buffer)
+            if self.legacy_seed:
+                data = base64.b64encode(data)
 
-        return (base64_image, buffer.tobytes())
+            return hashlib.sha512(data).hexdigest()
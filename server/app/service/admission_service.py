@@ -0,0 +1,112 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+from app.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionService:
+    def __init__(self, max_flops: float = 1e11, max_bytes: int = 2 * 1024 ** 3, max_queued: int = 16, max_wait: float = 10):
+        self.max_flops = max_flops
+        self.max_bytes = max_bytes
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+        self._in_flight = 0
+        self._in_flight_flops = 0
+        self._in_flight_bytes = 0
+        self._waiting = 0
+        # realized flops per second of a single request, smoothed over recent requests
+        self._throughput: Optional[float] = None
+        self._changed = threading.Condition()
+
+    @contextmanager
+    def admit(self, cost: Dict):
+        flops = cost['flops']
+        n_bytes = cost['bytes']
+
+        # a request larger than the whole budget is not rejected, it waits until it can run alone
+        with timed('admission_wait'):
+            with self._changed:
+                if not self._fits(flops, n_bytes):
+                    if self._waiting >= self.max_queued:
+                        self.rejected += 1
+                        raise AdmissionRejected('Too many requests are waiting', self._retry_after())
+
+                    self._waiting += 1
+                    self.queued += 1
+                    try:
+                        fits = self._changed.wait_for(lambda: self._fits(flops, n_bytes), timeout=self.max_wait)
+                    finally:
+                        self._waiting -= 1
+
+                    if not fits:
+                        self.rejected += 1
+                        raise AdmissionRejected('The compute budget is exhausted', self._retry_after())
+
+                self.admitted += 1
+                self._in_flight += 1
+                self._in_flight_flops += flops
+                self._in_flight_bytes += n_bytes
+                throughput = self._throughput
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+
+            with self._changed:
+                self._in_flight -= 1
+                self._in_flight_flops -= flops
+                self._in_flight_bytes -= n_bytes
+                if seconds > 0:
+                    realized = flops / seconds
+                    self._throughput = realized if self._throughput is None else 0.8 * self._throughput + 0.2 * realized
+                self._changed.notify_all()
+
+            # the estimated against the realized duration, to calibrate the cost model
+            logger.info('admission cost: pixels=%d flops=%.3g bytes=%d estimated_seconds=%s realized_seconds=%.3f',
+                        cost.get('pixels', 0), flops, n_bytes, f'{flops / throughput:.3f}' if throughput else 'unknown', seconds)
+
+    def stats(self) -> dict:
+        with self._changed:
+            return {
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'in_flight': self._in_flight,
+                'in_flight_flops': self._in_flight_flops,
+                'in_flight_bytes': self._in_flight_bytes,
+                'waiting': self._waiting,
+                'max_flops': self.max_flops,
+                'max_bytes': self.max_bytes,
+                'throughput': self._throughput or 0.0
+            }
+
+    def _fits(self, flops: float, n_bytes: int) -> bool:
+        # a request always runs alone, whatever its cost, so the budget never deadlocks
+        if self._in_flight == 0:
+            return True
+
+        return self._in_flight_flops + flops <= self.max_flops and self._in_flight_bytes + n_bytes <= self.max_bytes
+
+    def _retry_after(self) -> int:
+        if not self._throughput:
+            return 1
+
+        return max(1, math.ceil(self._in_flight_flops / self._throughput))
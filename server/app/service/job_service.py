@@ -0,0 +1,117 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+from app.metrics import Stage, metrics
+from app.repository.job_repository import JobRepository
+from app.service.signature_service import SignatureService
+
+logger = logging.getLogger(__name__)
+
+
+class JobService:
+    def __init__(self, signature_service: SignatureService, job_repository: JobRepository, workers: int = 2):
+        self.signature_service = signature_service
+        self.job_repository = job_repository
+
+        # ordered by descending priority, then by submission order
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+
+        self._wait_lock = threading.Lock()
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._last_wait_seconds = 0.0
+
+        # every process sharing the repository queues the unfinished jobs, the one that claims a job first runs it
+        for job in self.job_repository.unfinished():
+            self._enqueue(job['id'], job['priority'])
+
+        self._workers = [threading.Thread(target=self._work, name=f'render-job-{i}', daemon=True) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, parameters: Dict, priority: int = 0) -> dict:
+        job = self.job_repository.create({
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'priority': priority,
+            'parameters': parameters,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None
+        })
+        self._enqueue(job['id'], priority)
+
+        return job
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[dict]:
+        if wait > 0:
+            return self.job_repository.wait(job_id, wait)
+
+        return self.job_repository.get(job_id)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._wait_lock:
+            waits, wait_seconds, last_wait_seconds = self._waits, self._wait_seconds, self._last_wait_seconds
+
+        counts = self.job_repository.count_by_status()
+
+        return {
+            'depth': self.queue_depth(),
+            'running': counts['running'],
+            'retained_done': counts['done'],
+            'retained_failed': counts['failed'],
+            'workers': len(self._workers),
+            'started_total': waits,
+            'wait_seconds_total': wait_seconds,
+            'last_wait_seconds': last_wait_seconds
+        }
+
+    def _enqueue(self, job_id: str, priority: int):
+        self._queue.put((-priority, next(self._sequence), job_id))
+
+    def _work(self):
+        while True:
+            _, _, job_id = self._queue.get()
+
+            try:
+                self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job_id: str):
+        job = self.job_repository.claim(job_id)
+        if job is None:
+            return
+
+        try:
+            started_at = time.time()
+            job = self.job_repository.update(job_id, status='running', started_at=started_at)
+            self._record_wait(started_at - job['created_at'])
+
+            try:
+                result = self.signature_service.create_signatures(**job['parameters'])
+            except Exception as error:
+                logger.exception('render job %s failed', job_id)
+                self.job_repository.update(job_id, status='failed', finished_at=time.time(), error=str(error))
+            else:
+                self.job_repository.update(job_id, status='done', finished_at=time.time(), result=result)
+        finally:
+            self.job_repository.release(job_id)
+
+    def _record_wait(self, seconds: float):
+        metrics.observe(Stage('queue_wait'), seconds)
+
+        with self._wait_lock:
+            self._waits += 1
+            self._wait_seconds += seconds
+            self._last_wait_seconds = seconds
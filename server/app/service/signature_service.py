@@ -1,35 +1,304 @@
-from typing import Dict, List
+import contextvars
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+from app.metrics import timed
+from app.model.architecture import DEFAULT_MAX_DEPTH, DEFAULT_MAX_WIDTH, map_architecture, multiply_adds
+from app.model.helper import random_seed
+from app.model.particles import summarize_particles
 from app.repository.signature_repository import SignatureRepository
 from app.repository.bucket_repository import BucketRepository
+from app.repository.result_cache_repository import ResultCacheRepository
+
+logger = logging.getLogger(__name__)
+
+# bumped whenever a change to the renderer changes the images produced for the same parameters and render settings
+RESULT_CACHE_VERSION = 2
+
+
+class RenderFailed(Exception):
+    pass
 
 
 class SignatureService:
-    def __init__(self, signature_repository: SignatureRepository, bucket_repository: BucketRepository):
+    def __init__(self, signature_repository: SignatureRepository, bucket_repository: BucketRepository,
+                 max_progressive_renders: int = 256, result_cache: Optional[ResultCacheRepository] = None,
+                 cache_unseeded: bool = False, batch_workers: int = 2, batch_chunk_size: int = 8,
+                 architecture: str = 'bounded', max_depth: int = DEFAULT_MAX_DEPTH, max_width: int = DEFAULT_MAX_WIDTH):
         self.signature_repository = signature_repository
         self.bucket_repository = bucket_repository
+        self.architecture = architecture
+        self.max_depth = max_depth
+        self.max_width = max_width
+        self.result_cache = result_cache
+        self.cache_unseeded = cache_unseeded
+
+        # full-size renders of progressive requests run in the background, one at a time
+        self._background_renders = ThreadPoolExecutor(max_workers=1, thread_name_prefix='progressive-render')
+        self._progressive_renders = OrderedDict()
+        self._progressive_renders_lock = threading.Lock()
+        self.max_progressive_renders = max_progressive_renders
+
+        # batches are split into chunks of consecutive images, each rendered one image at a time on a shared pool
+        self._batch_renders = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='batch-render')
+        self.batch_workers = batch_workers
+        self.batch_chunk_size = batch_chunk_size
 
     def create_signatures(self, particles: List[Dict], n_images: int,
                           image_height: int, image_width: int, symmetry: bool,
-                          trig: bool, alpha: bool, noise: bool, activation: str, save: bool) -> tuple[List[int], int, str, List]:
-        signatures = []
+                          trig: bool, alpha: bool, noise: bool, activation: str, save: bool,
+                          generator_seed: Optional[int] = None, precision: str = 'float32',
+                          particle_summary: Optional[tuple] = None, architecture: Optional[str] = None) -> tuple[List[int], int, str, List]:
+        if generator_seed is None:
+            generator_seed = random_seed()
+
+        n_particles, combined_velocity, color_mode = self._summarize(particles, particle_summary)
+        layer_dimensions = self.layer_dimensions(n_particles, architecture)
+
+        generator_seeds = [generator_seed + i for i in range(n_images)]
+        signatures = self._render_signatures(layer_dimensions, color_mode, image_height, image_width, symmetry,
+                                             trig, alpha, noise, activation, save, generator_seeds, precision)
+
+        return (layer_dimensions, combined_velocity, color_mode, signatures)
+
+    def warmup(self, image_size: int = 64) -> tuple[List[int], int, str, List]:
+        # one tiny unsaved render goes through every stage of the pipeline, so the first request pays none of its setup
+        self.bucket_repository.warmup()
+
+        return self.create_signatures(particles=[], n_images=1, image_height=image_size, image_width=image_size, symmetry=False,
+                                      trig=False, alpha=False, noise=False, activation='tanh', save=False, generator_seed=0)
+
+    def layer_dimensions(self, n_particles: int, architecture: Optional[str] = None) -> List[int]:
+        return map_architecture(n_particles, architecture or self.architecture, self.max_depth, self.max_width)
+
+    def estimate_cost(self, parameters: Dict) -> Dict:
+        n_particles, _, color_mode = self._summarize(parameters['particles'], parameters.get('particle_summary'))
+        layer_dimensions = self.layer_dimensions(n_particles, parameters.get('architecture'))
+        out_nodes = {'bw': 1, 'cmyk': 4}.get(color_mode, 3) + int(parameters['alpha'])
+
+        n_images = parameters['n_images']
+        pixels = parameters['image_height'] * parameters['image_width']
+        # symmetric images are evaluated on their unique quarter and mirrored
+        evaluated_pixels = pixels // 4 if parameters['symmetry'] and not parameters['noise'] else pixels
+
+        flops = 2 * multiply_adds(layer_dimensions, out_nodes) * evaluated_pixels * n_images
+
+        # the float32 grid, the float32 network output and the uint8 image with its encoding, per image
+        n_bytes = evaluated_pixels * 5 * 4 + n_images * pixels * (out_nodes * 4 + 2 * max(out_nodes, 3))
+
+        return {'layer_dimensions': layer_dimensions, 'pixels': pixels * n_images, 'flops': flops, 'bytes': n_bytes}
+
+    def estimate_batch_cost(self, events: List[Dict], parameters: Dict) -> Dict:
+        costs = [self.estimate_cost(dict(parameters, particles=event['particles'], n_images=1)) for event in events]
+        n_images = len(events) * parameters['n_images']
+
+        # every image is computed, but only the one each batch worker is rendering is held in memory at once
+        in_memory = min(n_images, self.batch_workers)
+
+        return {
+            'pixels': sum(cost['pixels'] for cost in costs) * parameters['n_images'],
+            'flops': sum(cost['flops'] for cost in costs) * parameters['n_images'],
+            'bytes': max(cost['bytes'] for cost in costs) * in_memory
+        }
+
+    def result_key(self, parameters: Dict) -> Optional[str]:
+        if self.result_cache is None:
+            return None
+
+        # without a seed every request is a new random render, which a cache would freeze
+        if parameters.get('generator_seed') is None and not self.cache_unseeded:
+            return None
+
+        # the architecture the request maps to depends on the configured mapping as well as its parameters
+        n_particles = self._summarize(parameters['particles'], parameters.get('particle_summary'))[0]
+        key = dict(parameters, version=RESULT_CACHE_VERSION, render_settings=self.signature_repository.render_settings,
+                   layer_dimensions=self.layer_dimensions(n_particles, parameters.get('architecture')))
+        return hashlib.sha256(json.dumps(key, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    def get_cached_signatures(self, key: str) -> Optional[tuple[str, tuple]]:
+        entry = self.result_cache.get(key)
+        if entry is None:
+            return None
+
+        etag, content = entry
+        return (etag, tuple(json.loads(content)))
+
+    def cache_signatures(self, key: str, result: tuple) -> str:
+        return self.result_cache.put(key, json.dumps(result, separators=(',', ':')).encode('utf-8'))
+
+    def invalidate_cached_signatures(self, key: Optional[str] = None) -> int:
+        if self.result_cache is None:
+            return 0
+
+        return self.result_cache.invalidate(key)
 
-        combined_velocity, color_mode = self._get_signature_color_mode(
-            particles)
-        layer_dimensions = [10] * (len(particles) + 2)
+    def create_progressive_signatures(self, particles: List[Dict], n_images: int,
+                                      image_height: int, image_width: int, symmetry: bool,
+                                      trig: bool, alpha: bool, noise: bool, activation: str, save: bool,
+                                      generator_seed: Optional[int] = None, preview_size: int = 128,
+                                      precision: str = 'float32', particle_summary: Optional[tuple] = None,
+                                      architecture: Optional[str] = None,
+                                      on_rendered: Optional[Callable[[], None]] = None) -> tuple[List[int], int, str, str, List]:
+        if generator_seed is None:
+            generator_seed = random_seed()
 
-        for _ in range(n_images):
-            seed, image_bytes = self.signature_repository.create_signature(layer_dimensions, color_mode, image_height, image_width, symmetry,
-                                                                           trig, alpha, noise, activation)
+        n_particles, combined_velocity, color_mode = self._summarize(particles, particle_summary)
+        layer_dimensions = self.layer_dimensions(n_particles, architecture)
 
+        generator_seeds = [generator_seed + i for i in range(n_images)]
+        previews = self.signature_repository.create_previews(layer_dimensions, color_mode, image_height, image_width, symmetry,
+                                                             trig, alpha, noise, activation, generator_seeds, preview_size, precision)
+
+        render = self._background_renders.submit(self._render_signatures, layer_dimensions, color_mode, image_height, image_width,
+                                                 symmetry, trig, alpha, noise, activation, save, generator_seeds, precision)
+        render_id = uuid.uuid4().hex
+        if on_rendered is not None:
+            render.add_done_callback(lambda _: on_rendered())
+
+        with self._progressive_renders_lock:
+            self._progressive_renders[render_id] = render
+            # the oldest finished renders are evicted first; a pending render is kept until it can be fetched
+            while len(self._progressive_renders) > self.max_progressive_renders:
+                evicted = next((evicted_id for evicted_id, evicted in self._progressive_renders.items() if evicted.done()), None)
+                if evicted is None:
+                    break
+                del self._progressive_renders[evicted]
+
+        return (layer_dimensions, combined_velocity, color_mode, render_id, list(zip(generator_seeds, previews)))
+
+    def create_signature_batch(self, events: List[Dict], n_images: int, image_height: int, image_width: int, symmetry: bool,
+                               trig: bool, alpha: bool, noise: bool, activation: str, save: bool,
+                               precision: str = 'float32', architecture: Optional[str] = None) -> Iterator[Dict]:
+        start_time = time.perf_counter()
+        finished = queue.Queue()
+
+        chunks = [[]]
+        for event_index, event in enumerate(events):
+            generator_seed = event.get('generator_seed')
+            if generator_seed is None:
+                generator_seed = random_seed()
+
+            combined_velocity, color_mode = self._get_signature_color_mode(event['particles'])
+            layer_dimensions = self.layer_dimensions(len(event['particles']), architecture)
+            signature = {'event': event_index, 'layerDimensions': layer_dimensions, 'combinedVelocity': combined_velocity,
+                         'strategy': color_mode}
+
+            for image_generator_seed in range(generator_seed, generator_seed + n_images):
+                if len(chunks[-1]) == self.batch_chunk_size:
+                    chunks.append([])
+                chunks[-1].append((image_generator_seed, signature))
+
+        renders = [self._batch_renders.submit(contextvars.copy_context().run, self._render_batch_chunk, finished, image_height,
+                                              image_width, symmetry, trig, alpha, noise, activation, save, chunk, precision)
+                   for chunk in chunks]
+
+        n_signatures = len(events) * n_images
+        n_failed = 0
+
+        try:
+            for _ in range(n_signatures):
+                signature = finished.get()
+                n_failed += int('error' in signature)
+                yield signature
+        finally:
+            # a client that disconnects leaves nothing queued behind it
+            for render in renders:
+                render.cancel()
+
+        seconds = time.perf_counter() - start_time
+        yield {'summary': {
+            'events': len(events),
+            'signatures': n_signatures - n_failed,
+            'failed': n_failed,
+            'seconds': seconds,
+            'signaturesPerSecond': (n_signatures - n_failed) / seconds if seconds > 0 else 0.0,
+            'pixelsPerSecond': (n_signatures - n_failed) * image_height * image_width / seconds if seconds > 0 else 0.0
+        }}
+
+    def get_progressive_signatures(self, render_id: str) -> Optional[List]:
+        with self._progressive_renders_lock:
+            render = self._progressive_renders.get(render_id)
+
+        if render is None:
+            raise KeyError(render_id)
+
+        if not render.done():
+            return None
+
+        error = render.exception()
+        if error is not None:
+            # a failed render is reported once, then forgotten
+            logger.error('progressive render %s failed', render_id, exc_info=error)
+            with self._progressive_renders_lock:
+                self._progressive_renders.pop(render_id, None)
+            raise RenderFailed(str(error)) from error
+
+        return render.result()
+
+    def _render_signatures(self, layer_dimensions: List[int], color_mode: str, image_height: int, image_width: int, symmetry: bool,
+                           trig: bool, alpha: bool, noise: bool, activation: str, save: bool, generator_seeds: List[int],
+                           precision: str = 'float32') -> List:
+        signatures = []
+
+        created_signatures = self.signature_repository.create_signatures(layer_dimensions, color_mode, image_height, image_width, symmetry,
+                                                                         trig, alpha, noise, activation, generator_seeds, precision)
+
+        for image_generator_seed, (seed, image_bytes) in zip(generator_seeds, created_signatures):
             if save:
-                image_path = self.bucket_repository.upload_signature(
-                    f'{seed}.png', image_bytes, 'image/png')
+                upload = self.bucket_repository.upload_signature_async(
+                    f'{seed}{self.signature_repository.file_extension}', image_bytes, self.signature_repository.content_type)
 
-                signatures.append((seed, image_path))
+                signatures.append((seed, image_generator_seed, upload))
             else:
-                signatures.append((seed, ''))
+                signatures.append((seed, image_generator_seed, ''))
 
-        return (layer_dimensions, combined_velocity, color_mode, signatures)
+        with timed('upload_wait'):
+            return [(seed, image_generator_seed, upload.result() if save else upload)
+                    for seed, image_generator_seed, upload in signatures]
+
+    def _render_batch_chunk(self, finished: queue.Queue, image_height: int, image_width: int, symmetry: bool, trig: bool,
+                            alpha: bool, noise: bool, activation: str, save: bool, chunk: List[tuple[int, Dict]], precision: str):
+        def upload_finished(signature: Dict, upload: Future):
+            error = upload.exception()
+            finished.put(dict(signature, error=str(error)) if error is not None else dict(signature, image=upload.result()))
+
+        # each image is rendered as by a single request, so a seed gets the same signature from either endpoint
+        for generator_seed, signature in chunk:
+            try:
+                seed, image_bytes = self.signature_repository.create_signature(
+                    signature['layerDimensions'], signature['strategy'], image_height, image_width, symmetry, trig, alpha, noise,
+                    activation, generator_seed, precision)
+            except Exception as error:
+                finished.put(dict(signature, generatorSeed=generator_seed, error=str(error)))
+                continue
+
+            signature = dict(signature, seed=seed, generatorSeed=generator_seed)
+
+            # each signature is reported once its upload is done, independently of the rest of the chunk
+            if save:
+                upload = self.bucket_repository.upload_signature_async(
+                    f'{seed}{self.signature_repository.file_extension}', image_bytes, self.signature_repository.content_type)
+                upload.add_done_callback(lambda upload, signature=signature: upload_finished(signature, upload))
+            else:
+                finished.put(dict(signature, image=''))
+
+    def summarize_particles(self, file, file_format: str) -> tuple[int, float, str]:
+        with timed('particles'):
+            return summarize_particles(file, file_format)
+
+    def _summarize(self, particles: List[Dict], particle_summary: Optional[tuple] = None) -> tuple[int, float, str]:
+        # a summary of a particle file stands in for the particles themselves
+        if particle_summary is not None:
+            return tuple(particle_summary)
+
+        return (len(particles), *self._get_signature_color_mode(particles))
 
     def _get_signature_color_mode(self, particles: List[Dict]) -> tuple[int, str]:
         if not particles:
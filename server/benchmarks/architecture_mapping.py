@@ -0,0 +1,58 @@
+import argparse
+from app.model.architecture import DEFAULT_MAX_DEPTH, DEFAULT_MAX_WIDTH, map_architecture, multiply_adds
+from app.model.generator import init_data
+from app.model.neural_network import FeedForwardNetwork
+from benchmarks.common import time_call
+
+
+def check_legacy_compatibility(max_depth: int, max_width: int) -> bool:
+    # events that fit within the depth cap keep the legacy architecture, hence their signatures
+    compatible = all(map_architecture(n_particles, 'bounded', max_depth, max_width) == map_architecture(n_particles, 'legacy')
+                     for n_particles in range(max_depth - 1))
+    print(f'bounded vs legacy up to {max_depth - 2} particles: {"identical" if compatible else "DIFFERENT"}')
+    return compatible
+
+
+def benchmark(particle_counts: list, image_height: int, image_width: int, max_depth: int, max_width: int, repeat: int):
+    input_data = init_data(image_height, image_width)
+
+    print(f'{"particles":>9} {"mode":>8} {"depth":>6} {"width":>6} {"MACs/pixel":>11} {"render ms":>10}')
+    for n_particles in particle_counts:
+        for mode in ['legacy', 'bounded']:
+            layer_dimensions = map_architecture(n_particles, mode, max_depth, max_width)
+            network = FeedForwardNetwork(layer_dimensions, color_mode='rgb', alpha=True, seed=0)
+
+            seconds = time_call(lambda: network.inference(input_data), repeat=repeat)
+            print(f'{n_particles:>9} {mode:>8} {len(layer_dimensions):>6} {layer_dimensions[0]:>6} '
+                  f'{multiply_adds(layer_dimensions, 4):>11} {seconds * 1000:>10.2f}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Render cost of the legacy and bounded particle to architecture mappings.')
+
+    parser.add_argument('--particles', type=str, default='0,5,14,50,200,2000',
+                        help='Comma separated particle counts.')
+    parser.add_argument('--image-height', type=int, default=256,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=256,
+                        help='Image width.')
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_MAX_DEPTH,
+                        help='Maximum number of hidden layers of the bounded mapping.')
+    parser.add_argument('--max-width', type=int, default=DEFAULT_MAX_WIDTH,
+                        help='Maximum width of the hidden layers of the bounded mapping.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per case.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    check_legacy_compatibility(args.max_depth, args.max_width)
+    benchmark([int(n_particles) for n_particles in args.particles.split(',')], args.image_height, args.image_width,
+              args.max_depth, args.max_width, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
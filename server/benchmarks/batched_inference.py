@@ -0,0 +1,76 @@
+import argparse
+import torch
+from app.model.generator import create_image, create_images
+from app.model.neural_network import FeedForwardNetwork
+from benchmarks.common import time_call
+
+
+def build_networks(n_networks: int, n_depth: int, color_mode: str, alpha: bool) -> list:
+    return [FeedForwardNetwork(layers_dimensions=[10] * n_depth, color_mode=color_mode, alpha=alpha, seed=seed)
+            for seed in range(n_networks)]
+
+
+def check_equivalence(image_height: int, image_width: int, n_depth: int, color_mode: str):
+    networks = build_networks(5, n_depth, color_mode, alpha=True)
+
+    separate = [create_image(network, image_height, image_width, color_mode=color_mode, save=False, tile_rows=64)
+                for network in networks]
+    exact = create_images(networks, image_height, image_width, color_mode=color_mode, tile_rows=64)
+    batched = create_images(networks, image_height, image_width, color_mode=color_mode, tile_rows=64, batched=True)
+
+    # the default path must match exactly, the batched kernel is only expected to be close
+    identical = all(torch.equal(a, b) for a, b in zip(separate, exact))
+    print(f'create_images vs separate: {"identical" if identical else "DIFFERENT"}')
+
+    max_error = max((a.int() - b.int()).abs().max().item() for a, b in zip(separate, batched))
+    print(f'batched kernel vs separate: max uint8 difference {max_error}')
+
+    return identical
+
+
+def benchmark(image_height: int, image_width: int, n_depth: int, color_mode: str, max_networks: int, repeat: int):
+    print(f'{"N":>3} {"separate img/s":>15} {"batched img/s":>14} {"speedup":>8}')
+
+    n_networks = 1
+    while n_networks <= max_networks:
+        networks = build_networks(n_networks, n_depth, color_mode, alpha=True)
+
+        separate_seconds = time_call(lambda: [create_image(network, image_height, image_width, color_mode=color_mode, save=False)
+                                              for network in networks], repeat=repeat)
+        batched_seconds = time_call(lambda: create_images(networks, image_height, image_width, color_mode=color_mode, batched=True),
+                                    repeat=repeat)
+
+        print(f'{n_networks:>3} {n_networks / separate_seconds:>15.2f} {n_networks / batched_seconds:>14.2f} '
+              f'{separate_seconds / batched_seconds:>7.2f}x')
+
+        n_networks *= 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Batched multi-network inference benchmark.')
+
+    parser.add_argument('--image-height', type=int, default=256,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=256,
+                        help='Image width.')
+    parser.add_argument('--n-depth', type=int, default=5,
+                        help='Number of hidden layers in each network.')
+    parser.add_argument('--color-mode', type=str, default='rgb', choices=[
+                        'bw', 'rgb', 'cmyk', 'hsv', 'hsl'], help='Color mode for image generation.')
+    parser.add_argument('--max-networks', type=int, default=32,
+                        help='Largest batch size to benchmark (batch sizes double from 1).')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per batch size.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    check_equivalence(128, 128, args.n_depth, args.color_mode)
+    benchmark(args.image_height, args.image_width, args.n_depth, args.color_mode, args.max_networks, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import torch
+from app.model.generator import init_data
+from app.model.neural_network import ACTIVATION_FUNCTIONS, BatchedFeedForwardNetwork, FeedForwardNetwork
+from benchmarks.common import measure_peak_memory, time_call
+
+
+def check_equivalence(image_height: int, image_width: int, depths: list, chunk_rows: int, tolerance: float = 1e-5) -> bool:
+    input_data = init_data(image_height, image_width)
+    matches = True
+
+    for activation in ACTIVATION_FUNCTIONS:
+        for depth in depths:
+            networks = [FeedForwardNetwork([10] * depth, activation_function=activation, color_mode=color_mode, seed=0)
+                        for color_mode in ['rgb', 'cmyk']]
+
+            with torch.no_grad():
+                errors = [(network(input_data) - network.inference(input_data, chunk_rows)).abs().max().item() for network in networks]
+
+                batched_network = BatchedFeedForwardNetwork([FeedForwardNetwork([10] * depth, activation_function=activation, seed=seed)
+                                                             for seed in range(3)])
+                errors.append((batched_network(input_data) - batched_network.inference(input_data, chunk_rows)).abs().max().item())
+
+            max_error = max(errors)
+            matches = matches and max_error <= tolerance
+            print(f'{activation:<9} depth {depth:>3}: max difference {max_error:.2e} {"ok" if max_error <= tolerance else "MISMATCH"}')
+
+    return matches
+
+
+def benchmark(image_height: int, image_width: int, depths: list, activation: str, chunk_sizes: list, repeat: int):
+    input_data = init_data(image_height, image_width)
+    n_pixels = image_height * image_width
+
+    print(f'{"depth":>5} {"mode":>16} {"ms":>10} {"MP/s":>8} {"peak MiB":>9}')
+
+    for depth in depths:
+        network = FeedForwardNetwork([10] * depth, activation_function=activation, seed=0)
+
+        def forward():
+            with torch.no_grad():
+                network(input_data)
+
+        cases = [('forward', forward)] + [(f'inference {chunk_rows}', lambda chunk_rows=chunk_rows: network.inference(input_data, chunk_rows))
+                                          for chunk_rows in chunk_sizes]
+
+        for mode, function in cases:
+            seconds = time_call(function, repeat=repeat)
+            peak_bytes = measure_peak_memory(function)
+            print(f'{depth:>5} {mode:>16} {seconds * 1000:>10.2f} {n_pixels / seconds / 1e6:>8.2f} {peak_bytes / 2 ** 20:>9.1f}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Chunked in-place inference versus the eager forward pass.')
+
+    parser.add_argument('--image-height', type=int, default=1920,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=2048,
+                        help='Image width.')
+    parser.add_argument('--depths', type=str, default='4,12,32',
+                        help='Comma separated network depths.')
+    parser.add_argument('--activation', type=str, default='tanh', choices=ACTIVATION_FUNCTIONS,
+                        help='Activation function of the benchmarked networks.')
+    parser.add_argument('--chunk-sizes', type=str, default='1024,4096,8192,32768',
+                        help='Comma separated chunk sizes, in pixels.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per case.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    depths = [int(depth) for depth in args.depths.split(',')]
+
+    check_equivalence(97, 131, depths, chunk_rows=1000)
+    benchmark(args.image_height, args.image_width, depths, args.activation,
+              [int(chunk_rows) for chunk_rows in args.chunk_sizes.split(',')], args.repeat)
+
+
+if __name__ == '__main__':
+    main()
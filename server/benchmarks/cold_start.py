@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# each scenario runs in a fresh interpreter and prints the seconds elapsed at each milestone, from its own start
+SCENARIOS = {
+    # everything imported and built at import time, as app.main did before the rendering stack became lazy
+    'eager': '''
+import app.main
+app.main.preload()
+app.main.rendering_controllers()
+mark('ready')
+first_image()
+''',
+    # nothing rendering-related is loaded until the first request needs it
+    'lazy': '''
+import app.main
+mark('ready')
+first_image()
+''',
+    # the first request arrives right away, while the warmup thread is still loading the stack
+    'warmup': '''
+import app.main
+mark('ready')
+first_image()
+''',
+    # the first request arrives once the warmup thread is done, its first image is counted from the request
+    'warmed': '''
+import app.main, threading
+for thread in threading.enumerate():
+    if thread.name == 'warmup':
+        thread.join()
+mark('ready')
+first_image(time.perf_counter())
+''',
+    # a parent imports the stack once, then a forked worker serves the first request
+    'fork': '''
+import app.main
+app.main.preload()
+mark('parent_ready')
+fork_time = time.perf_counter()
+child = os.fork()
+if child == 0:
+    app.main.start()
+    mark('ready', fork_time)
+    first_image(fork_time)
+    os._exit(0)
+os.waitpid(child, 0)
+''',
+}
+
+PRELUDE = '''
+import json, os, sys, time
+start_time = time.perf_counter()
+
+def mark(name, since=None):
+    print(json.dumps({name: time.perf_counter() - (start_time if since is None else since)}), flush=True)
+
+def first_image(since=None):
+    import app.main
+    response = app.main.app.test_client().post('/signatures/create', json={
+        'particles': [{'particle': 'pion', 'velocity': 0.01}], 'height': %(size)d, 'width': %(size)d, 'save': False})
+    assert response.status_code in {200, 201}, response.status_code
+    mark('first_image', since)
+'''
+
+
+def run_scenario(name: str, image_size: int) -> dict:
+    environment = dict(os.environ, LOCAL_STORAGE_PATH=tempfile.mkdtemp(), RESULT_CACHE='false', LOG_LEVEL='WARNING',
+                       WARMUP_RENDER='true' if name in {'warmup', 'warmed'} else 'false', APP_PRELOADED='true' if name == 'fork' else 'false')
+    environment.pop('JOB_STORAGE_PATH', None)
+
+    start_time = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PRELUDE % {'size': image_size} + SCENARIOS[name]], env=environment,
+                            capture_output=True, text=True, check=True).stdout
+    wall_seconds = time.perf_counter() - start_time
+
+    milestones = {}
+    for line in output.splitlines():
+        milestones.update(json.loads(line))
+    milestones['wall'] = wall_seconds
+
+    return milestones
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Cold start and time to first image of the server, by startup mode.')
+
+    parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS),
+                        help='Comma separated scenarios among eager, lazy, warmup, warmed and fork.')
+    parser.add_argument('--image-size', type=int, default=512,
+                        help='Height and width of the first image.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs per scenario, the fastest is reported.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print(f'{"scenario":>9} {"ready s":>8} {"first image s":>14} {"process s":>10}')
+    for name in args.scenarios.split(','):
+        runs = [run_scenario(name, args.image_size) for _ in range(args.repeat)]
+        best = min(runs, key=lambda milestones: milestones['first_image'])
+
+        # for fork, ready and first image are counted from the fork, the parent's own import is in parent_ready;
+        # for warmed, the first image is counted from the request
+        print(f'{name:>9} {best["ready"]:>8.3f} {best["first_image"]:>14.3f} {best["wall"]:>10.3f}'
+              + (f'  (parent import {best["parent_ready"]:.3f} s)' if 'parent_ready' in best else ''))
+
+
+if __name__ == '__main__':
+    main()
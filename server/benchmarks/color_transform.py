@@ -0,0 +1,48 @@
+import argparse
+import torch
+from app.model.color import transform_colors
+from benchmarks.common import time_call
+from tests.test_color import COLOR_MODES, legacy_transform_colors, random_network_output
+
+
+def benchmark(image_height: int, image_width: int, repeat: int, include_legacy: bool):
+    megapixels = image_height * image_width / 1e6
+
+    for color_mode in COLOR_MODES:
+        image = random_network_output(image_height, image_width, color_mode, alpha=True)
+
+        seconds = time_call(lambda: transform_colors(image, color_mode, True), repeat=repeat)
+        line = f'{color_mode:>4}: {megapixels / seconds:10.2f} MP/s'
+
+        if include_legacy:
+            legacy_seconds = time_call(lambda: legacy_transform_colors(image, color_mode, True), repeat=1, warmup=0)
+            line += f' (legacy {megapixels / legacy_seconds:8.2f} MP/s, {legacy_seconds / seconds:.1f}x)'
+
+        print(line)
+
+
+def parse_args():
+    # the parity with the legacy implementation is checked by tests/test_color.py
+    parser = argparse.ArgumentParser(description='Color transform throughput benchmark.')
+
+    parser.add_argument('--image-height', type=int, default=1920,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=2048,
+                        help='Image width.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed runs per mode.')
+    parser.add_argument('--legacy', action='store_true',
+                        help='Also time the legacy per-pixel implementation (slow).')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(0)
+
+    benchmark(args.image_height, args.image_width, args.repeat, args.legacy)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import time
+from typing import Callable, Optional
+
+
+def time_call(function: Callable, repeat: int = 5, warmup: int = 1) -> float:
+    '''
+    Time a callable and return its best wall time.
+
+    Parameters
+    ----------
+    function : Callable
+        The zero-argument callable to time.
+    repeat : int, optional
+        The number of timed runs. Default is 5.
+    warmup : int, optional
+        The number of untimed runs made before timing. Default is 1.
+
+    Returns
+    -------
+    float
+        The fastest of the timed runs, in seconds.
+    '''
+    for _ in range(warmup):
+        function()
+
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+
+    return best
+
+
+def _read_status_kilobytes(field: str) -> Optional[int]:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return None
+
+
+def reset_peak_memory() -> bool:
+    '''
+    Reset the peak resident set size of the process, where the platform allows it (Linux).
+
+    Returns
+    -------
+    bool
+        True if the peak was reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_memory() -> int:
+    '''
+    Read the peak resident set size of the process.
+
+    Returns
+    -------
+    int
+        The peak resident set size in bytes.
+    '''
+    peak = _read_status_kilobytes('VmHWM')
+    if peak is not None:
+        return peak * 1024
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_memory() -> int:
+    '''
+    Read the current resident set size of the process.
+
+    Returns
+    -------
+    int
+        The resident set size in bytes, or 0 if unavailable.
+    '''
+    current = _read_status_kilobytes('VmRSS')
+    return current * 1024 if current is not None else 0
+
+
+def measure_peak_memory(function: Callable) -> int:
+    '''
+    Measure how far a callable raises the resident set size of the process above its current size.
+
+    The peak can only be reset on Linux; elsewhere the result is the process-wide peak.
+
+    Parameters
+    ----------
+    function : Callable
+        The zero-argument callable to measure.
+
+    Returns
+    -------
+    int
+        The peak memory used by the call, in bytes.
+    '''
+    reset = reset_peak_memory()
+    baseline = current_memory() if reset else 0
+
+    function()
+
+    return max(0, peak_memory() - baseline)
@@ -0,0 +1,90 @@
+import argparse
+import time
+import torch
+from app.model.compiled import CompiledNetworkCache
+from app.model.generator import init_data
+from app.model.neural_network import ACTIVATION_FUNCTIONS, BatchedFeedForwardNetwork, FeedForwardNetwork
+from benchmarks.common import time_call
+
+
+def check_equivalence(cache: CompiledNetworkCache, depths: list, tolerance: float = 1e-5) -> bool:
+    input_data = init_data(61, 83)
+    matches = True
+
+    for activation in ACTIVATION_FUNCTIONS:
+        for depth in depths:
+            networks = [FeedForwardNetwork([10] * depth, activation_function=activation, color_mode='cmyk', seed=seed)
+                        for seed in range(3)]
+            batched_network = BatchedFeedForwardNetwork(networks)
+
+            with torch.no_grad():
+                errors = [(network(input_data) - cache.wrap(network).inference(input_data, chunk_rows=1000)).abs().max().item()
+                          for network in networks]
+                errors.append((batched_network(input_data) - cache.wrap(batched_network).inference(input_data)).abs().max().item())
+
+            max_error = max(errors)
+            matches = matches and max_error <= tolerance
+            print(f'{activation:<9} depth {depth:>3}: max difference {max_error:.2e} {"ok" if max_error <= tolerance else "MISMATCH"}')
+
+    return matches
+
+
+def benchmark(cache: CompiledNetworkCache, resolutions: list, depths: list, activation: str, n_networks: int, repeat: int):
+    print(f'{"resolution":>10} {"depth":>5} {"eager ms":>9} {"chunked ms":>11} {"compiled ms":>12} {"speedup":>8}')
+
+    for image_height, image_width in resolutions:
+        input_data = init_data(image_height, image_width)
+
+        for depth in depths:
+            batched_network = BatchedFeedForwardNetwork([FeedForwardNetwork([10] * depth, activation_function=activation, seed=seed)
+                                                         for seed in range(n_networks)])
+
+            def eager():
+                with torch.no_grad():
+                    batched_network(input_data)
+
+            eager_seconds = time_call(eager, repeat=repeat)
+            chunked_seconds = time_call(lambda: batched_network.inference(input_data), repeat=repeat)
+            # wrapping is part of the timed call, as it is for every request
+            compiled_seconds = time_call(lambda: cache.wrap(batched_network).inference(input_data), repeat=repeat)
+
+            print(f'{image_height:>4}x{image_width:<5} {depth:>5} {eager_seconds * 1000:>9.2f} {chunked_seconds * 1000:>11.2f} '
+                  f'{compiled_seconds * 1000:>12.2f} {eager_seconds / compiled_seconds:>7.2f}x')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Compiled network graphs versus eager and chunked inference.')
+
+    parser.add_argument('--resolutions', type=str, default='64x64,128x128,512x512,1024x1024',
+                        help='Comma separated HEIGHTxWIDTH resolutions.')
+    parser.add_argument('--depths', type=str, default='3,7,12',
+                        help='Comma separated network depths.')
+    parser.add_argument('--activation', type=str, default='tanh', choices=ACTIVATION_FUNCTIONS,
+                        help='Activation function of the benchmarked networks.')
+    parser.add_argument('--networks', type=int, default=5,
+                        help='Number of batched networks.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed runs per case.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    depths = [int(depth) for depth in args.depths.split(',')]
+    resolutions = [tuple(int(side) for side in resolution.lower().split('x')) for resolution in args.resolutions.split(',')]
+
+    cache = CompiledNetworkCache()
+
+    start_time = time.perf_counter()
+    compiled = cache.warmup([[10] * depth for depth in depths], activations=[args.activation])
+    print(f'warmup: {compiled} graphs in {time.perf_counter() - start_time:.2f} s')
+
+    check_equivalence(cache, depths)
+    benchmark(cache, resolutions, depths, args.activation, args.networks, args.repeat)
+
+    print(cache.stats())
+
+
+if __name__ == '__main__':
+    main()
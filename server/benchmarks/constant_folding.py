@@ -0,0 +1,87 @@
+import argparse
+import torch
+from app.model.generator import create_image, fold_constant_inputs, init_data
+from app.model.grid import grid_cache
+from app.model.neural_network import ACTIVATION_FUNCTIONS, BatchedFeedForwardNetwork, FeedForwardNetwork
+from benchmarks.common import measure_peak_memory, time_call
+
+
+def check_equivalence(depths: list, tolerance: float = 1e-5) -> bool:
+    matches = True
+
+    for image_height, image_width, symmetry, trig in [(97, 131, False, False), (64, 64, True, False), (1, 40, False, True), (40, 1, True, True)]:
+        for activation in ACTIVATION_FUNCTIONS:
+            for depth in depths:
+                network = FeedForwardNetwork([10] * depth, activation_function=activation, color_mode='cmyk', seed=depth)
+                batched_network = BatchedFeedForwardNetwork([FeedForwardNetwork([10] * depth, activation_function=activation, seed=seed)
+                                                             for seed in range(3)])
+
+                input_data = init_data(image_height, image_width, symmetry, trig)
+                folded_network, columns = fold_constant_inputs(network, image_height, image_width, symmetry, trig, -0.618, 0.618)
+                folded_batched_network, _ = fold_constant_inputs(batched_network, image_height, image_width, symmetry, trig, -0.618, 0.618)
+                folded_input = init_data(image_height, image_width, symmetry, trig, columns=columns)
+
+                with torch.no_grad():
+                    max_error = max((network(input_data) - folded_network.inference(folded_input)).abs().max().item(),
+                                    (batched_network(input_data) - folded_batched_network.inference(folded_input)).abs().max().item())
+
+                matches = matches and max_error <= tolerance
+                if max_error > tolerance:
+                    print(f'{image_height}x{image_width} symmetry={symmetry} trig={trig} {activation} depth {depth}: '
+                          f'MISMATCH (max difference {max_error:.2e})')
+
+        print(f'{image_height}x{image_width} symmetry={symmetry} trig={trig}: folded columns '
+              f'{sorted(set(range(5)) - set(columns))}')
+
+    print(f'folded vs unfolded: {"within tolerance" if matches else "MISMATCH"}')
+    return matches
+
+
+def benchmark(image_height: int, image_width: int, depths: list, tile_rows: int, repeat: int):
+    print(f'{"depth":>5} {"unfolded ms":>12} {"folded ms":>10} {"speedup":>8} {"unfolded MiB":>13} {"folded MiB":>11} {"uint8 diffs":>12}')
+
+    for depth in depths:
+        network = FeedForwardNetwork([10] * depth, seed=0)
+
+        def render(fold_constants: bool):
+            grid_cache.clear()
+            return create_image(network, image_height, image_width, trig=False, save=False, tile_rows=tile_rows,
+                                fold_constants=fold_constants)
+
+        unfolded_seconds = time_call(lambda: render(False), repeat=repeat)
+        folded_seconds = time_call(lambda: render(True), repeat=repeat)
+        unfolded_bytes = measure_peak_memory(lambda: render(False))
+        folded_bytes = measure_peak_memory(lambda: render(True))
+        differences = int((render(False).int() - render(True).int()).ne(0).sum())
+
+        print(f'{depth:>5} {unfolded_seconds * 1000:>12.2f} {folded_seconds * 1000:>10.2f} {unfolded_seconds / folded_seconds:>7.2f}x '
+              f'{unfolded_bytes / 2 ** 20:>13.1f} {folded_bytes / 2 ** 20:>11.1f} {differences:>12}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Constant input column folding versus the unfolded input.')
+
+    parser.add_argument('--image-height', type=int, default=1920,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=2048,
+                        help='Image width.')
+    parser.add_argument('--depths', type=str, default='3,7,12',
+                        help='Comma separated network depths.')
+    parser.add_argument('--tile-rows', type=int, default=256,
+                        help='Band height of the renders.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per case.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    depths = [int(depth) for depth in args.depths.split(',')]
+
+    check_equivalence(depths)
+    benchmark(args.image_height, args.image_width, depths, args.tile_rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import cv2
+import torch
+from torch.profiler import ProfilerActivity, profile
+from app.model.color import BGR_CHANNELS, RGBA_CHANNELS, quantize_colors, transform_colors
+from app.model.generator import n_output_channels, quantize_image
+from app.model.neural_network import FeedForwardNetwork
+from benchmarks.common import time_call
+from benchmarks.pipeline import COLOR_MODES, network_output
+
+
+def legacy_stage(output: torch.Tensor, color_mode: str, alpha: bool, out: torch.Tensor, bgr: bool):
+    image = quantize_image(transform_colors(output, color_mode, alpha), out=out)
+    # what the save path did next: a full RGB to BGR copy before writing
+    return cv2.cvtColor(image.numpy(), cv2.COLOR_RGB2BGR) if bgr else image
+
+
+def fused_stage(output: torch.Tensor, color_mode: str, alpha: bool, out: torch.Tensor, bgr: bool):
+    return quantize_colors(output, color_mode, alpha, out, BGR_CHANNELS if bgr else RGBA_CHANNELS)
+
+
+def allocated_bytes(function) -> int:
+    # every tensor allocation made by torch, plus the arrays OpenCV returns
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as profiler:
+        result = function()
+
+    allocated = sum(event.cpu_memory_usage for event in profiler.events() if event.cpu_memory_usage > 0 and not event.cpu_children)
+    return allocated + (result.nbytes if not isinstance(result, torch.Tensor) else 0)
+
+
+def check_equivalence(image_height: int, image_width: int) -> bool:
+    identical = True
+
+    for color_mode in COLOR_MODES:
+        for alpha in [False, True]:
+            output = network_output(FeedForwardNetwork(color_mode=color_mode, alpha=alpha, seed=1), image_height, image_width)
+
+            for bgr in [False, True]:
+                channels = n_output_channels(BGR_CHANNELS if bgr else RGBA_CHANNELS)
+                legacy = legacy_stage(output, color_mode, alpha, torch.empty((image_height, image_width, 4), dtype=torch.uint8), bgr)
+                fused = fused_stage(output, color_mode, alpha, torch.empty((image_height, image_width, channels), dtype=torch.uint8), bgr)
+
+                equal = torch.equal(torch.as_tensor(legacy), fused)
+                identical = identical and equal
+                if not equal:
+                    print(f'{color_mode} alpha={alpha} {"bgr" if bgr else "rgba"}: DIFFERENT')
+
+    print(f'fused vs legacy output stage: {"identical" if identical else "DIFFERENT"}')
+    return identical
+
+
+def benchmark(image_height: int, image_width: int, repeat: int):
+    print(f'{"color mode":>10} {"order":>5} {"legacy ms":>10} {"fused ms":>9} {"legacy MiB":>11} {"fused MiB":>10}')
+
+    for color_mode in COLOR_MODES:
+        output = network_output(FeedForwardNetwork(color_mode=color_mode, seed=0), image_height, image_width)
+
+        for bgr in [False, True]:
+            legacy_out = torch.empty((image_height, image_width, 4), dtype=torch.uint8)
+            fused_out = torch.empty((image_height, image_width, n_output_channels(BGR_CHANNELS if bgr else RGBA_CHANNELS)), dtype=torch.uint8)
+
+            legacy_seconds = time_call(lambda: legacy_stage(output, color_mode, True, legacy_out, bgr), repeat=repeat)
+            fused_seconds = time_call(lambda: fused_stage(output, color_mode, True, fused_out, bgr), repeat=repeat)
+            legacy_bytes = allocated_bytes(lambda: legacy_stage(output, color_mode, True, legacy_out, bgr))
+            fused_bytes = allocated_bytes(lambda: fused_stage(output, color_mode, True, fused_out, bgr))
+
+            print(f'{color_mode:>10} {"bgr" if bgr else "rgba":>5} {legacy_seconds * 1000:>10.2f} {fused_seconds * 1000:>9.2f} '
+                  f'{legacy_bytes / 2 ** 20:>11.1f} {fused_bytes / 2 ** 20:>10.1f}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Fused color transform and quantization versus the separate stages.')
+
+    parser.add_argument('--image-height', type=int, default=1920,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=2048,
+                        help='Image width.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of timed runs per case.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    check_equivalence(97, 131)
+    benchmark(args.image_height, args.image_width, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
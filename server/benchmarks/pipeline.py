@@ -0,0 +1,258 @@
+import argparse
+import json
+import platform
+import time
+import torch
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from app.model.color import transform_colors
+from app.model.encoder import ImageEncoder
+from app.model.generator import check_precision, create_image, init_data, quantize_image
+from app.model.grid import build_grid, grid_cache
+from app.model.neural_network import FeedForwardNetwork
+from app.model.precision import PRECISIONS
+from app.repository.signature_repository import SignatureRepository
+from app.service.signature_service import SignatureService
+from benchmarks.common import measure_peak_memory, time_call
+
+COLOR_MODES = ['rgb', 'bw', 'cmyk', 'hsv', 'hsl']
+ACTIVATIONS = ['tanh', 'sigmoid', 'relu', 'softsign', 'sin', 'cos']
+RESOLUTIONS = [(64, 64), (256, 256), (512, 512), (1024, 1024), (1920, 2048)]
+DEPTHS = [4, 12, 32]
+
+
+class StubBucketRepository:
+    '''
+    A bucket repository that drops uploads, so the request path can be benchmarked offline.
+    '''
+
+    def upload_signature(self, name: str, binary: bytes, content_type: str = 'text/plain') -> str:
+        return f'stub://signatures/{name}'
+
+    def upload_signature_async(self, name: str, binary: bytes, content_type: str = 'text/plain') -> Future:
+        future = Future()
+        future.set_result(self.upload_signature(name, binary, content_type))
+        return future
+
+
+def parse_resolution(resolution: str) -> tuple[int, int]:
+    height, width = resolution.lower().split('x')
+    return (int(height), int(width))
+
+
+def network_output(network: FeedForwardNetwork, image_height: int, image_width: int) -> torch.Tensor:
+    with torch.no_grad():
+        output = network(init_data(image_height, image_width))
+
+    return output.view(image_height, image_width, output.size(-1))
+
+
+class PipelineBenchmark:
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, stage: str, parameters: dict, pixels: int, function: Callable, extra: Optional[dict] = None):
+        seconds = time_call(function, repeat=self.repeat)
+        peak_bytes = measure_peak_memory(function)
+
+        result = {
+            'stage': stage,
+            'parameters': parameters,
+            'seconds': seconds,
+            'pixels_per_second': pixels / seconds if seconds > 0 else None,
+            'peak_bytes': peak_bytes
+        }
+        if extra:
+            result.update(extra)
+        self.results.append(result)
+
+        described = ' '.join(f'{key}={value}' for key, value in parameters.items())
+        print(f'{stage:<12} {described:<60} {seconds * 1000:10.2f} ms {pixels / seconds / 1e6:10.2f} MP/s '
+              f'{peak_bytes / 2 ** 20:9.1f} MiB' + (' ' + ' '.join(f'{key}={value}' for key, value in extra.items()) if extra else ''))
+
+    def grid(self, resolutions: List[tuple]):
+        for image_height, image_width in resolutions:
+            for trig in [False, True]:
+                pixels = image_height * image_width
+                self.run('grid', {'resolution': f'{image_height}x{image_width}', 'trig': trig, 'cache': 'cold'}, pixels,
+                         lambda: build_grid(image_height, image_width, False, trig, -0.618, 0.618))
+
+                grid_cache.get(image_height, image_width, False, trig, -0.618, 0.618)
+                self.run('grid', {'resolution': f'{image_height}x{image_width}', 'trig': trig, 'cache': 'warm'}, pixels,
+                         lambda: init_data(image_height, image_width, False, trig))
+
+    def forward(self, resolutions: List[tuple], activations: List[str], depths: List[int]):
+        for image_height, image_width in resolutions:
+            input_data = init_data(image_height, image_width)
+
+            for activation in activations:
+                for depth in depths:
+                    network = FeedForwardNetwork([10] * depth, activation_function=activation, seed=0)
+
+                    def forward():
+                        with torch.no_grad():
+                            network(input_data)
+
+                    self.run('forward', {'resolution': f'{image_height}x{image_width}', 'activation': activation, 'depth': depth},
+                             image_height * image_width, forward)
+
+    def color(self, resolutions: List[tuple], color_modes: List[str]):
+        for image_height, image_width in resolutions:
+            for color_mode in color_modes:
+                network = FeedForwardNetwork(color_mode=color_mode, seed=0)
+                output = network_output(network, image_height, image_width)
+
+                self.run('color', {'resolution': f'{image_height}x{image_width}', 'color_mode': color_mode},
+                         image_height * image_width, lambda: transform_colors(output, color_mode, True))
+
+    def encode(self, resolutions: List[tuple], encodings: List[str]):
+        for image_height, image_width in resolutions:
+            network = FeedForwardNetwork(seed=0)
+            image = quantize_image(transform_colors(network_output(network, image_height, image_width), 'rgb', True))
+
+            for encoding in encodings:
+                encoder = ImageEncoder(encoding)
+                self.run('encode', {'resolution': f'{image_height}x{image_width}', 'encoding': encoding},
+                         image_height * image_width, lambda: encoder.encode(image))
+
+    def create_image(self, resolutions: List[tuple], color_modes: List[str], tile_rows: int):
+        for image_height, image_width in resolutions:
+            for color_mode in color_modes:
+                network = FeedForwardNetwork(color_mode=color_mode, seed=0)
+
+                for tiles in [None, tile_rows]:
+                    self.run('create_image', {'resolution': f'{image_height}x{image_width}', 'color_mode': color_mode, 'tile_rows': tiles},
+                             image_height * image_width,
+                             lambda: create_image(network, image_height, image_width, color_mode=color_mode, save=False, tile_rows=tiles))
+
+    def precision(self, resolutions: List[tuple], precisions: List[str], depths: List[int], tile_rows: int):
+        for image_height, image_width in resolutions:
+            for depth in depths:
+                network = FeedForwardNetwork([10] * depth, seed=0)
+
+                for precision in precisions:
+                    error = check_precision(network, precision, image_height, image_width, tile_rows=tile_rows)
+                    self.run('precision', {'resolution': f'{image_height}x{image_width}', 'depth': depth, 'precision': precision},
+                             image_height * image_width,
+                             lambda: create_image(network, image_height, image_width, save=False, tile_rows=tile_rows, precision=precision),
+                             {'max_error': max(error['max']), 'mean_error': round(max(error['mean']), 4), 'lossless': error['lossless']})
+
+    def request(self, resolutions: List[tuple], n_particles: int, n_images: int):
+        service = SignatureService(SignatureRepository(), StubBucketRepository())
+        particles = [{'particle': 'electron', 'velocity': 0.02, 'priority': i} for i in range(n_particles)]
+
+        for image_height, image_width in resolutions:
+            self.run('request', {'resolution': f'{image_height}x{image_width}', 'particles': n_particles, 'images': n_images},
+                     image_height * image_width * n_images,
+                     lambda: service.create_signatures(particles, n_images, image_height, image_width, False, False, True, False,
+                                                       'tanh', True, generator_seed=0))
+
+
+def compare(results: List[dict], baseline_path: str, threshold: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def key(result):
+        return (result['stage'], json.dumps(result['parameters'], sort_keys=True))
+
+    baseline_seconds = {key(result): result['seconds'] for result in baseline['results']}
+    regressions = 0
+
+    for result in results:
+        previous = baseline_seconds.get(key(result))
+        if previous is None:
+            continue
+
+        change = result['seconds'] / previous - 1
+        if change > threshold:
+            regressions += 1
+            print(f'REGRESSION {result["stage"]} {result["parameters"]}: {previous * 1000:.2f} ms -> '
+                  f'{result["seconds"] * 1000:.2f} ms ({change:+.0%})')
+        elif change < -threshold:
+            print(f'improvement {result["stage"]} {result["parameters"]}: {previous * 1000:.2f} ms -> '
+                  f'{result["seconds"] * 1000:.2f} ms ({change:+.0%})')
+
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark every stage of the generation pipeline.')
+
+    parser.add_argument('--stages', type=str, default='grid,forward,color,encode,create_image,precision,request',
+                        help='Comma separated stages to run.')
+    parser.add_argument('--resolutions', type=str, default=','.join(f'{h}x{w}' for h, w in RESOLUTIONS),
+                        help='Comma separated HEIGHTxWIDTH resolutions.')
+    parser.add_argument('--color-modes', type=str, default=','.join(COLOR_MODES),
+                        help='Comma separated color modes.')
+    parser.add_argument('--activations', type=str, default=','.join(ACTIVATIONS),
+                        help='Comma separated activation functions.')
+    parser.add_argument('--depths', type=str, default=','.join(str(depth) for depth in DEPTHS),
+                        help='Comma separated network depths.')
+    parser.add_argument('--encodings', type=str, default='png,webp,jpeg',
+                        help='Comma separated encodings.')
+    parser.add_argument('--precisions', type=str, default=','.join(PRECISIONS),
+                        help='Comma separated precision modes.')
+    parser.add_argument('--tile-rows', type=int, default=256,
+                        help='Band height of the tiled create_image runs.')
+    parser.add_argument('--particles', type=int, default=5,
+                        help='Number of particles in the end-to-end request.')
+    parser.add_argument('--images', type=int, default=5,
+                        help='Number of images in the end-to-end request.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per case.')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Compare the results against a previous JSON result file.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown reported as a regression when comparing.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    stages = args.stages.split(',')
+    resolutions = [parse_resolution(resolution) for resolution in args.resolutions.split(',')]
+    color_modes = args.color_modes.split(',')
+    activations = args.activations.split(',')
+    depths = [int(depth) for depth in args.depths.split(',')]
+
+    benchmark = PipelineBenchmark(args.repeat)
+
+    if 'grid' in stages:
+        benchmark.grid(resolutions)
+    if 'forward' in stages:
+        benchmark.forward(resolutions, activations, depths)
+    if 'color' in stages:
+        benchmark.color(resolutions, color_modes)
+    if 'encode' in stages:
+        benchmark.encode(resolutions, args.encodings.split(','))
+    if 'create_image' in stages:
+        benchmark.create_image(resolutions, color_modes, args.tile_rows)
+    if 'precision' in stages:
+        benchmark.precision(resolutions, args.precisions.split(','), depths, args.tile_rows)
+    if 'request' in stages:
+        benchmark.request(resolutions, args.particles, args.images)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'torch': torch.__version__,
+                'threads': torch.get_num_threads(),
+                'results': benchmark.results
+            }, f, indent=2)
+
+    if args.compare:
+        regressions = compare(benchmark.results, args.compare, args.threshold)
+        if regressions:
+            raise SystemExit(f'{regressions} regression(s) above {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import torch
+from app.model.generator import create_image, render_tiles
+from app.model.neural_network import FeedForwardNetwork
+from benchmarks.common import time_call
+
+SIZES = [(64, 64), (100, 100), (97, 131), (131, 97), (255, 300), (513, 64), (512, 512), (1000, 1000)]
+
+
+def full_render(network: FeedForwardNetwork, image_height: int, image_width: int, trig: bool, color_mode: str, tile_rows: int) -> torch.Tensor:
+    # render_tiles evaluates every pixel, which is what the symmetric path must reproduce
+    return render_tiles(network, image_height, image_width, True, trig, color_mode, True, -0.618, 0.618, tile_rows)
+
+
+def check_equivalence(color_modes: list, tile_rows: int) -> bool:
+    identical = True
+
+    for image_height, image_width in SIZES:
+        for trig in [False, True]:
+            for color_mode in color_modes:
+                network = FeedForwardNetwork([10] * 6, color_mode=color_mode, seed=image_height * image_width)
+
+                full = full_render(network, image_height, image_width, trig, color_mode, tile_rows)
+                mirrored = create_image(network, image_height, image_width, symmetry=True, trig=trig, color_mode=color_mode,
+                                        save=False, tile_rows=tile_rows)
+
+                equal = torch.equal(full, mirrored)
+                identical = identical and equal
+                if not equal:
+                    differences = (full.int() - mirrored.int()).abs()
+                    print(f'{image_height}x{image_width} trig={trig} {color_mode}: DIFFERENT in {int((differences > 0).sum())} values '
+                          f'(max {int(differences.max())})')
+
+    print(f'symmetric vs full evaluation: {"identical" if identical else "DIFFERENT"}')
+    return identical
+
+
+def benchmark(image_height: int, image_width: int, depths: list, tile_rows: int, repeat: int):
+    print(f'{"depth":>5} {"full ms":>9} {"mirrored ms":>12} {"speedup":>8}')
+
+    for depth in depths:
+        network = FeedForwardNetwork([10] * depth, seed=0)
+
+        full_seconds = time_call(lambda: full_render(network, image_height, image_width, False, 'rgb', tile_rows), repeat=repeat)
+        mirrored_seconds = time_call(lambda: create_image(network, image_height, image_width, symmetry=True, trig=False,
+                                                          save=False, tile_rows=tile_rows), repeat=repeat)
+
+        print(f'{depth:>5} {full_seconds * 1000:>9.2f} {mirrored_seconds * 1000:>12.2f} {full_seconds / mirrored_seconds:>7.2f}x')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Symmetric rendering of the unique region versus full evaluation.')
+
+    parser.add_argument('--image-height', type=int, default=1920,
+                        help='Image height.')
+    parser.add_argument('--image-width', type=int, default=2048,
+                        help='Image width.')
+    parser.add_argument('--depths', type=str, default='4,12',
+                        help='Comma separated network depths.')
+    parser.add_argument('--color-modes', type=str, default='rgb,bw,cmyk,hsv,hsl',
+                        help='Comma separated color modes checked for equivalence.')
+    parser.add_argument('--tile-rows', type=int, default=256,
+                        help='Band height of the renders.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs per case.')
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    check_equivalence(args.color_modes.split(','), args.tile_rows)
+    benchmark(args.image_height, args.image_width, [int(depth) for depth in args.depths.split(',')], args.tile_rows, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,18 +3,25 @@ import sys
 import time
 import json
 import argparse
+import multiprocessing
+import numpy as np
+import torch
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.configuration import FALSE_VALUES, TRUE_VALUES
+from app.model.arrays import ARRAY_FORMATS, STACK_FORMATS, create_image_stack, open_array, open_image_stack, write_array
+from app.model.color import BGR_CHANNELS, RGBA_CHANNELS
 from app.model.neural_network import FeedForwardNetwork
-from app.model.generator import create_image
+from app.model.generator import check_precision, create_image, create_images, save_image
+from app.model.helper import random_seed
+from app.model.precision import PRECISIONS
 
 
 def str_to_bool(string: str) -> bool:
-    true_values = {'true', 'yes', 'y', 't', '1'}
-    false_values = {'false', 'no', 'n', 'f', '0'}
-
     lower_string = string.lower()
-    if lower_string in true_values:
+    if lower_string in TRUE_VALUES:
         return True
-    elif lower_string in false_values:
+    elif lower_string in FALSE_VALUES:
         return False
     else:
         raise ValueError(
@@ -54,14 +61,148 @@ def parse_args():
                         help='Whether to use a symmetry in the network.')
     parser.add_argument('--gpu', type=str_to_bool, default=False,
                         help='Whether to use GPU acceleration.')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Number of images rendered together by a worker.')
+    parser.add_argument('--batched', type=str_to_bool, default=False,
+                        help='Evaluate the networks of a batch in one batched forward pass. Faster, but pixels may differ '
+                             'by one level from the same seed rendered alone.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes rendering images in parallel.')
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='Number of torch threads per worker. Defaults to the CPU count divided by the number of workers.')
+    parser.add_argument('--tile-rows', type=int, default=None,
+                        help='Render images in bands of this many rows to bound memory usage. Whole image at once if not given.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Generation seed of the first image (image i uses seed + i). Random if not given.')
+    parser.add_argument('--precision', type=str, default='float32', choices=PRECISIONS,
+                        help='Precision of the network evaluation. Reduced precisions only run on the CPU.')
+    parser.add_argument('--fold-constants', type=str_to_bool, default=True,
+                        help='Whether to fold constant inputs into the first layer. Faster, but pixels may differ by one level '
+                             'from renders made before folding was introduced; disable to reproduce them.')
+    parser.add_argument('--check-precision', type=str_to_bool, default=True,
+                        help='Whether to report the uint8 error of a reduced precision against float32 before rendering.')
     parser.add_argument('--format', type=str, default='png', choices=[
-                        'png', 'jpg', 'svg', 'pdf'], help='File format for saving the images.')
+                        'png', 'jpg', 'svg', 'pdf', *ARRAY_FORMATS, *STACK_FORMATS],
+                        help='File format for saving the images. npy and npy-float write one uint8 or float32 array per image, '
+                             'stack and stack-float a single memory-mapped file of all images (see app.model.arrays).')
 
     return parser.parse_args()
 
 
+def init_worker(threads: int):
+    # each worker gets its own share of the cores instead of one torch thread per core
+    torch.set_num_threads(threads)
+
+
+def output_array(args: argparse.Namespace, i: int) -> torch.Tensor:
+    if args.format in STACK_FORMATS:
+        stack, _ = open_image_stack(os.path.join(args.generation_dir, 'images.stack'), mode='r+')
+        return torch.from_numpy(stack[i])
+
+    return open_array(os.path.join(args.generation_dir, f'image-{i + 1}.npy'), (args.image_height, args.image_width, 4),
+                      ARRAY_FORMATS[args.format])
+
+
+def render_batch(args: argparse.Namespace, layer_dimensions: list, indices: list) -> tuple[list, float]:
+    start_time = time.time()
+
+    raw = args.format in ARRAY_FORMATS or args.format in STACK_FORMATS
+    float_output = raw and {**ARRAY_FORMATS, **STACK_FORMATS}[args.format] != np.uint8
+
+    # rendering straight into OpenCV's channel order leaves the writer nothing to convert, one band is the whole image;
+    # raw uint8 arrays are rendered straight into their memory-mapped files instead, and float arrays at once
+    tile_rows = None if float_output else args.tile_rows or args.image_height
+    channels = RGBA_CHANNELS if raw else BGR_CHANNELS
+    out = [output_array(args, i) for i in indices] if raw and not float_output else None
+
+    networks = [FeedForwardNetwork(layers_dimensions=layer_dimensions,
+                                   activation_function=args.activation,
+                                   color_mode=args.color_mode,
+                                   alpha=args.alpha,
+                                   seed=args.seed + i) for i in indices]
+
+    if len(networks) == 1:
+        images = [create_image(networks[0], args.image_height, args.image_width,
+                               symmetry=args.symmetry, trig=args.trig,
+                               color_mode=args.color_mode, alpha=args.alpha,
+                               z1=args.z1, z2=args.z2,
+                               save=False, use_gpu=args.gpu,
+                               with_noise=args.noise, noise_std=args.noise_std,
+                               tile_rows=tile_rows, out=out[0] if out is not None else None,
+                               fold_constants=args.fold_constants, precision=args.precision, channels=channels)]
+    else:
+        images = create_images(networks, args.image_height, args.image_width,
+                               symmetry=args.symmetry, trig=args.trig,
+                               color_mode=args.color_mode, alpha=args.alpha,
+                               z1=args.z1, z2=args.z2, use_gpu=args.gpu,
+                               with_noise=args.noise, noise_std=args.noise_std,
+                               tile_rows=tile_rows, out=out, fold_constants=args.fold_constants, precision=args.precision,
+                               channels=channels, batched=args.batched)
+
+    if raw:
+        if float_output:
+            for i, image in zip(indices, images):
+                write_array(image, output_array(args, i))
+
+        # the images are already in their files, nothing is sent back to the main process
+        return (None, time.time() - start_time)
+
+    # the images are sent back to the main process at 8 bits per channel
+    images = [image.numpy() for image in images]
+
+    return (images, time.time() - start_time)
+
+
+def write_batch(args: argparse.Namespace, indices: list, images: list, render_time: float, generation_dir: str):
+    if images is None:
+        for i in indices:
+            location = f'images.stack[{i}]' if args.format in STACK_FORMATS else f'image-{i + 1}.npy'
+            print(f'Image {i + 1} saved in {os.path.join(generation_dir, location)} ({render_time:.2f} s)')
+        return
+
+    for i, image in zip(indices, images):
+        filename = save_image(torch.from_numpy(image), os.path.join(generation_dir, f'image-{i + 1}'), args.format, BGR_CHANNELS)
+        print(f'Image {i + 1} saved in {filename} ({render_time:.2f} s)')
+
+
+def render_batches(args: argparse.Namespace, layer_dimensions: list, batches: list):
+    if args.workers == 1:
+        init_worker(args.threads_per_worker)
+
+        for indices in batches:
+            if len(indices) == 1:
+                print(f'Generating image {indices[0] + 1}...')
+            else:
+                print(f'Generating images {indices[0] + 1} to {indices[-1] + 1}...')
+
+            yield (indices, *render_batch(args, layer_dimensions, indices))
+        return
+
+    # spawned workers don't inherit the parent's torch thread pools, which are not fork-safe
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_worker, initargs=(args.threads_per_worker,)) as renderer:
+        pending = deque()
+        next_batch = 0
+
+        while next_batch < len(batches) or pending:
+            # keeping a bounded number of batches in flight bounds the memory held by finished images
+            while next_batch < len(batches) and len(pending) < 2 * args.workers:
+                indices = batches[next_batch]
+                pending.append((indices, renderer.submit(render_batch, args, layer_dimensions, indices)))
+                next_batch += 1
+
+            indices, future = pending.popleft()
+            yield (indices, *future.result())
+
+
 def main():
     args = parse_args()
+    if args.seed is None:
+        args.seed = random_seed()
+    args.batch_size = max(1, args.batch_size)
+    args.workers = max(1, args.workers)
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
 
     if not os.path.exists('images'):
         os.makedirs('images')
@@ -77,26 +218,46 @@ def main():
 
     layer_dimensions = [args.n_size] * args.n_depth
 
-    for i in range(args.n_images):
-        print(f'Generating image {i + 1}...')
-        start_time = time.time()
-        filename = os.path.join(generation_dir, f'image-{i + 1}.{args.format}')
-
-        network = FeedForwardNetwork(layers_dimensions=layer_dimensions,
-                                     activation_function=args.activation,
-                                     color_mode=args.color_mode,
-                                     alpha=args.alpha)
-
-        create_image(network, args.image_height, args.image_width,
-                     symmetry=args.symmetry, trig=args.trig,
-                     color_mode=args.color_mode, alpha=args.alpha,
-                     z1=args.z1, z2=args.z2,
-                     filename=filename, file_format=args.format,
-                     save=True, use_gpu=args.gpu,
-                     with_noise=args.noise, noise_std=args.noise_std)
-
-        print(
-            f'Image {i + 1} saved in {filename} ({time.time() - start_time:.2f} s)')
+    # workers write raw formats straight into files under the generation directory
+    args.generation_dir = generation_dir
+    if args.format in STACK_FORMATS:
+        create_image_stack(os.path.join(generation_dir, 'images.stack'), args.n_images, args.image_height, args.image_width, 4,
+                           STACK_FORMATS[args.format], metadata={
+                               'channels': 'rgba',
+                               'seeds': [args.seed + i for i in range(args.n_images)],
+                               'parameters': {key: value for key, value in vars(args).items() if key != 'generation_dir'}
+                           })
+
+    if args.precision != 'float32' and args.check_precision:
+        network = FeedForwardNetwork(layers_dimensions=layer_dimensions, activation_function=args.activation,
+                                     color_mode=args.color_mode, alpha=args.alpha, seed=args.seed)
+        error = check_precision(network, args.precision, symmetry=args.symmetry, trig=args.trig,
+                                color_mode=args.color_mode, alpha=args.alpha, z1=args.z1, z2=args.z2,
+                                with_noise=args.noise, noise_std=args.noise_std, fold_constants=args.fold_constants)
+        print(f'{args.precision} vs float32 on a 256x256 check image: max error per channel {error["max"]}, '
+              f'mean {[round(mean, 3) for mean in error["mean"]]} ({"visually lossless" if error["lossless"] else "VISIBLE ERRORS"})')
+    batches = [list(range(batch_start, min(batch_start + args.batch_size, args.n_images)))
+               for batch_start in range(0, args.n_images, args.batch_size)]
+
+    start_time = time.time()
+
+    # a single writer thread encodes and writes the images in order while the next ones render
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        writes = deque()
+
+        for indices, images, render_time in render_batches(args, layer_dimensions, batches):
+            # waiting on old writes bounds the number of finished images held in memory
+            while len(writes) > args.workers:
+                writes.popleft().result()
+
+            writes.append(writer.submit(write_batch, args, indices, images, render_time, generation_dir))
+
+        while writes:
+            writes.popleft().result()
+
+    total_time = time.time() - start_time
+    print(f'{args.n_images} images generated in {total_time:.2f} s ({args.n_images / total_time:.2f} images/s, '
+          f'{args.workers} workers x {args.threads_per_worker} threads)')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,13 @@
+import os
+from app.configuration import env_bool
+
+# the parent imports torch and the rendering stack once, and forks workers that start with it loaded
+preload_app = env_bool('PRELOAD_APP')
+if preload_app:
+    os.environ['APP_PRELOADED'] = 'true'
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.main import start
+        start()
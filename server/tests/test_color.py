@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+import torch
+from app.model.color import transform_colors
+
+COLOR_MODES = ['rgb', 'bw', 'cmyk', 'hsv', 'hsl']
+OUT_NODES = {'rgb': 3, 'hsv': 3, 'hsl': 3, 'cmyk': 4, 'bw': 1}
+
+
+def legacy_hsv_to_rgb_torch(image: torch.Tensor) -> torch.Tensor:
+    # per-pixel reference implementation the vectorized engine replaced
+    _h = image[:, :, 0].flatten().detach().numpy()
+    _s = image[:, :, 1].flatten().detach().numpy()
+    _v = image[:, :, 2].flatten().detach().numpy()
+
+    h = 6 * _h
+    i = np.floor(h)
+    f = h - i
+    p = _v * (1 - _s)
+    q = _v * (1 - f * _s)
+    t = _v * (1 - (1 - f) * _s)
+
+    mod = [int(a % 6) for a in i]
+    r_select = torch.tensor([[_v[i], q[i], p[i], p[i], t[i], _v[i]][m] for i, m in enumerate(
+        mod)]).view(image.size(0), image.size(1)).unsqueeze(-1)
+    g_select = torch.tensor([[t[i], _v[i], _v[i], q[i], p[i], p[i]][m] for i, m in enumerate(
+        mod)]).view(image.size(0), image.size(1)).unsqueeze(-1)
+    b_select = torch.tensor([[p[i], p[i], t[i], _v[i], _v[i], q[i]][m] for i, m in enumerate(
+        mod)]).view(image.size(0), image.size(1)).unsqueeze(-1)
+
+    return torch.cat([r_select, g_select, b_select], dim=-1)
+
+
+def legacy_hsl_to_rgb_torch(h: torch.Tensor, s: torch.Tensor, l: torch.Tensor) -> torch.Tensor:
+    # boolean-mask scatter reference implementation the vectorized engine replaced
+    c = (1 - torch.abs(2 * l - 1)) * s
+    x = c * (1 - torch.abs((h * 6) % 2 - 1))
+    m = l - c / 2
+
+    r = torch.zeros_like(h)
+    g = torch.zeros_like(h)
+    b = torch.zeros_like(h)
+
+    for low, high, (r_value, g_value, b_value) in [(0, 1/6, (c + m, x + m, m)),
+                                                   (1/6, 1/3, (x + m, c + m, m)),
+                                                   (1/3, 1/2, (m, c + m, x + m)),
+                                                   (1/2, 2/3, (m, x + m, c + m)),
+                                                   (2/3, 5/6, (x + m, m, c + m)),
+                                                   (5/6, 1, (c + m, m, x + m))]:
+        mask = (low <= h) & (h < high)
+        r[mask], g[mask], b[mask] = r_value[mask], g_value[mask], b_value[mask]
+
+    return torch.stack((r, g, b), dim=-1)
+
+
+def legacy_transform_colors(image: torch.Tensor, color_mode: str, alpha: bool) -> torch.Tensor:
+    if alpha:
+        alpha_tensor = image[:, :, -1]
+        alpha_val = 1 - torch.abs(2 * alpha_tensor - 1)
+        alpha_val = 0.25 + 0.75 * alpha_val
+        a = alpha_val.unsqueeze(-1)
+    else:
+        a = torch.ones((image.size(0), image.size(1)),
+                       device=image.device).unsqueeze(-1)
+
+    if color_mode == 'rgb':
+        processed_image = image[:, :, 0:3]
+    elif color_mode == 'bw':
+        processed_image = torch.cat([image[:, :, 0].unsqueeze(-1)] * 3, dim=-1)
+    elif color_mode == 'cmyk':
+        r = (1 - image[:, :, 0]) * image[:, :, 3]
+        g = (1 - image[:, :, 1]) * image[:, :, 3]
+        b = (1 - image[:, :, 2]) * image[:, :, 3]
+        processed_image = torch.stack([r, g, b], dim=-1)
+    elif color_mode == 'hsv':
+        processed_image = legacy_hsv_to_rgb_torch(image)
+    elif color_mode == 'hsl':
+        h = image[:, :, 0].flatten()
+        s = image[:, :, 1].flatten()
+        l = image[:, :, 2].flatten()
+        processed_image = legacy_hsl_to_rgb_torch(h, s, l).view(image.size(
+            0), image.size(1), 3)
+
+    return torch.cat([processed_image, a], dim=-1)
+
+
+def random_network_output(image_height: int, image_width: int, color_mode: str, alpha: bool) -> torch.Tensor:
+    # sigmoid outputs, including the saturated 0 and 1 edges and the hsl sector boundaries
+    channels = OUT_NODES[color_mode] + int(alpha)
+    image = torch.sigmoid(torch.randn(image_height, image_width, channels) * 4)
+
+    edges = torch.tensor([0.0, 1.0, 1/6, 1/3, 1/2, 2/3, 5/6])
+    image.view(-1, channels)[:edges.numel(), 0] = edges
+
+    return image
+
+
+@pytest.mark.parametrize('alpha', [True, False])
+@pytest.mark.parametrize('color_mode', COLOR_MODES)
+def test_transform_colors_matches_legacy_implementation(color_mode, alpha):
+    torch.manual_seed(0)
+    image = random_network_output(64, 64, color_mode, alpha)
+
+    assert torch.equal(transform_colors(image, color_mode, alpha), legacy_transform_colors(image, color_mode, alpha))
@@ -0,0 +1,32 @@
+import torch
+from app.model.grid import GridCache, build_grid
+
+
+def test_in_place_write_does_not_leak_into_next_get():
+    cache = GridCache()
+
+    grid = cache.get(64, 48, False, True, -0.618, 0.618)
+    grid.add_(1.0)
+
+    assert torch.equal(cache.get(64, 48, False, True, -0.618, 0.618), build_grid(64, 48, False, True, -0.618, 0.618))
+    assert cache.misses == 2
+
+
+def test_in_place_write_to_mirrored_grid_does_not_leak_into_next_get():
+    cache = GridCache()
+
+    grid, row_index, column_index = cache.get_mirrored(64, 48, True, -0.618, 0.618)
+    expected = (grid.clone(), row_index.clone(), column_index.clone())
+    row_index[:2].zero_()
+
+    for cached, built in zip(cache.get_mirrored(64, 48, True, -0.618, 0.618), expected):
+        assert torch.equal(cached, built)
+
+
+def test_unmodified_grid_is_shared():
+    cache = GridCache()
+
+    grid = cache.get(64, 48, True, False, -0.618, 0.618, row_start=16, row_end=32)
+
+    assert cache.get(64, 48, True, False, -0.618, 0.618, row_start=16, row_end=32) is grid
+    assert cache.hits == 1
@@ -13,6 +13,8 @@ type CreateSignaturesBody = {
   noise: boolean
   activation: string
   particles: ParticleData[]
+  generatorSeed?: number
+  precision?: 'float32' | 'bfloat16' | 'float16' | 'int8'
 }
 
 export type Signatures = {
@@ -21,6 +23,7 @@ export type Signatures = {
   signatures: {
     image: string
     seed: string
+    generatorSeed: number
   }[]
   strategy: string
 }